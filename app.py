@@ -1,17 +1,20 @@
 import streamlit as st
-import time
-from io import BytesIO
+import hashlib
+import json
+import uuid
 from datetime import datetime
-import os
-import tempfile
 
-from openai import OpenAI
-from docx import Document
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
 
-from summarizer import generate_report
+from backends import get_backend
+from exports import safe_str
+from export_cache import MIME_TYPES, get_export_cache
+from report_cache import get_report_cache
+from consultation_store import get_consultation_store
+from state_backend import get_state_backend
+from jobs import ACTIVE, get_job_manager, submit_report, submit_transcription
+from audio_upload import upload_filename
+from summarizer import pre_extract_transcript, refresh_stock_status
+from telemetry import init_telemetry
 
 
 # =========================
@@ -23,17 +26,8 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="collapsed"
 )
-
-
-# =========================
-#   OPENAI CLIENT
-# =========================
-try:
-    api_key = st.secrets.get("OPENAI_API_KEY", "")
-except:
-    api_key = os.getenv("OPENAI_API_KEY", "")
-
-client = OpenAI(api_key=api_key) if api_key else None
+# Starts the metrics endpoint / JSON span log if configured (once per process)
+init_telemetry()
 
 
 # =========================
@@ -148,199 +142,348 @@ st.markdown("""
 # =========================
 #   SESSION STATE
 # =========================
-if "report" not in st.session_state:
-    st.session_state.report = None
-if "full_transcript" not in st.session_state:
-    st.session_state.full_transcript = ""
+def open_consultation(consultation: dict = None):
+    """Load a stored consultation into the session, or start a blank one"""
+    consultation = consultation or {}
+    state = consultation.get("state", {})
+    st.session_state.consultation_id = consultation.get("id") or uuid.uuid4().hex
+    st.session_state.full_transcript = consultation.get("transcript", "")
+    # Stock levels may have changed since the report was saved
+    st.session_state.report = refresh_stock_status(consultation.get("report"))
+    # (language, transcript length) the current report was built from
+    st.session_state.report_cursor = tuple(state["report_cursor"]) if state.get("report_cursor") else None
+    st.session_state.generation_timings = state.get("timings", {})
+    st.session_state.transcription_jobs = state.get("transcription_jobs", [])
+    st.session_state.transcribed = state.get("transcribed", 0)  # leading jobs already appended to the transcript
+    st.session_state.report_job = state.get("report_job")
+    st.session_state.report_applied = state.get("report_applied")
+    st.session_state.job_errors = {}
+
+
 if "report_language" not in st.session_state:
     st.session_state.report_language = "english"
 if "doctor_name" not in st.session_state:
     st.session_state.doctor_name = "Dr. Nayef"
+if "consultation_id" not in st.session_state:
+    # A fresh session (a browser refresh, a restarted worker or another replica) picks its
+    # consultation back up from the URL: the shared live state first, then the store
+    consultation_id = st.query_params.get("c")
+    consultation = None
+    if consultation_id:
+        consultation = get_state_backend().get(consultation_id) or get_consultation_store().get(consultation_id)
+    if consultation:
+        st.session_state.doctor_name = consultation.get("doctor") or st.session_state.doctor_name
+        st.session_state.report_language = consultation.get("language") or st.session_state.report_language
+    open_consultation(consultation)
+if "recorder_round" not in st.session_state:
+    # Bumped after each submission so the recorder is cleared for the next segment
+    st.session_state.recorder_round = 0
 
 
 # =========================
 #   HELPER FUNCTIONS
 # =========================
-def safe_str(value, default="—"):
-    if value is None or (isinstance(value, str) and not value.strip()):
-        return default
-    return str(value)
-
-
-def transcribe_audio(audio_file) -> str:
-    """Transcribe audio using OpenAI Whisper"""
-    if not client:
-        return "OpenAI API key not configured"
-    
-    try:
-        # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-            tmp_file.write(audio_file.read())
-            tmp_path = tmp_file.name
-        
-        # Transcribe with Whisper
-        with open(tmp_path, "rb") as audio:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio,
-                language="ar"  # Auto-detect works too, but specifying helps
+LIVE_SECTION_TITLES = {
+    "conversation_overview": "💬 Conversation Overview",
+    "patient_name": "👤 Patient",
+    "chief_complaint": "Chief Complaint",
+    "history_of_present_illness": "History of Present Illness",
+    "vital_signs": "📊 Vital Signs",
+    "physical_examination": "Physical Examination",
+    "clinical_assessment": "🎯 Clinical Assessment",
+    "recommended_workup": "🔬 Recommended Workup",
+    "medication_plan": "💊 Medication Plan",
+    "safety_checks": "⚠️ Safety Checks",
+    "follow_up": "📅 Follow-up",
+    "patient_report": "🧑‍⚕️ Patient Summary",
+}
+
+
+def render_live_section(section: str, value):
+    """Show one report section while the rest of the report is still streaming"""
+    title = LIVE_SECTION_TITLES.get(section)
+    if not title or not value:
+        return
+    
+    st.markdown(f"**{title}:**")
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if v and not isinstance(v, (dict, list)):
+                st.write(f"**{k.replace('_', ' ').title()}:** {v}")
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                stock = item.get('stock_status', {})
+                mark = "" if stock.get('in_stock', True) else " ❌"
+                st.write(f"• {safe_str(item.get('name'))} {safe_str(item.get('dose'), '')}{mark}")
+            else:
+                st.write(f"• {item}")
+    else:
+        st.write(safe_str(value))
+
+
+def current_consultation() -> dict:
+    """The open consultation, shaped like ConsultationStore.get() so open_consultation takes either"""
+    return {
+        "id": st.session_state.consultation_id,
+        "doctor": st.session_state.doctor_name,
+        "transcript": st.session_state.full_transcript,
+        "report": st.session_state.report,
+        "language": st.session_state.report_language,
+        "state": {
+            "report_cursor": st.session_state.report_cursor,
+            "timings": st.session_state.generation_timings,
+            "transcription_jobs": st.session_state.transcription_jobs,
+            "transcribed": st.session_state.transcribed,
+            "report_job": st.session_state.report_job,
+            "report_applied": st.session_state.report_applied,
+        },
+    }
+
+
+def save_consultation():
+    """Share the live state with other replicas, queue it for the store, and keep its id in the URL"""
+    consultation = current_consultation()
+    # Written through, so a reconnect to any replica sees this change at once
+    get_state_backend().set(consultation["id"], consultation)
+    get_consultation_store().save(
+        consultation["id"],
+        consultation["doctor"],
+        consultation["transcript"],
+        consultation["report"],
+        consultation["language"],
+        state=consultation["state"],
+    )
+    st.query_params["c"] = consultation["id"]
+
+
+def pending_transcriptions() -> list:
+    return st.session_state.transcription_jobs[st.session_state.transcribed:]
+
+
+def report_pending() -> bool:
+    return bool(st.session_state.report_job) and st.session_state.report_job != st.session_state.report_applied
+
+
+def collect_jobs() -> bool:
+    """Apply finished jobs to the session; True when the transcript or report changed"""
+    manager = get_job_manager()
+    changed = False
+    
+    # Transcripts are appended in submission order, so a slow segment holds back later ones
+    for job_id in pending_transcriptions():
+        job = manager.get(job_id)
+        if job is not None and job["status"] in ACTIVE:
+            break
+        if job is None:
+            # Submitted by another replica or a process that has since restarted; its audio went with it
+            st.session_state.job_errors["transcribe"] = (
+                "Transcription error: a recorded segment was lost when the server changed or restarted. "
+                "Please record it again."
             )
+        elif job["status"] == "done":
+            base = st.session_state.full_transcript
+            transcript = job["result"]["transcript"]
+            st.session_state.full_transcript = f"{base}\n\n{transcript}" if base else transcript
+        else:
+            st.session_state.job_errors["transcribe"] = f"Transcription error: {job['error']}"
+        st.session_state.transcribed += 1
+        changed = True
+    
+    if report_pending():
+        job = manager.get(st.session_state.report_job)
+        if job is None or job["status"] not in ACTIVE:
+            st.session_state.report_applied = st.session_state.report_job
+            changed = True
+            if job is None:
+                st.session_state.job_errors["report"] = (
+                    "Report error: the report in progress was lost when the server changed or restarted. "
+                    "Please generate it again."
+                )
+            elif job["status"] == "done":
+                result = job["result"]
+                st.session_state.report = result["report"]
+                st.session_state.report_cursor = tuple(result["cursor"])
+                st.session_state.generation_timings = result["timings"]
+                # Render exports while the rerun draws the results
+                get_export_cache().prefetch(st.session_state.report, st.session_state.doctor_name)
+            else:
+                st.session_state.job_errors["report"] = f"Report error: {job['error']}"
+    if changed:
+        save_consultation()
+    return changed
+
+
+STAGE_ICONS = {"done": "✅", "running": "⏳", "pending": "▫️", "failed": "❌"}
+
+
+def render_job_progress(job: dict, label: str):
+    """One line per job: every stage with its state, plus a progress bar for the running stage"""
+    stages = []
+    for name, stage in job["stages"].items():
+        text = f"{STAGE_ICONS[stage['status']]} {name}"
+        if stage["status"] == "done" and stage["seconds"] >= 0.1:
+            text += f" {stage['seconds']:.1f}s"
+        stages.append(text)
+    detail = f" — {job['detail']}" if job["detail"] else ""
+    st.caption(f"**{label}:** {' → '.join(stages)}{detail}")
+    
+    current = job["stages"][job["stage"]]
+    if current["total"]:
+        st.progress(min(1.0, current["done"] / current["total"]))
+
+
+def poll(panel, active: bool):
+    """Run panel as a fragment that refreshes every second while `active`"""
+    st.fragment(panel, run_every=1.0 if active else None)()
+
+
+def transcription_progress():
+    if collect_jobs():
+        st.rerun()
+    
+    manager = get_job_manager()
+    for index, job_id in enumerate(pending_transcriptions()):
+        job = manager.get(job_id)
+        if job is not None:
+            render_job_progress(job, f"🎙 Segment {st.session_state.transcribed + index + 1}")
+            # Long recordings publish the text of the segments finished so far
+            partial = job["partial"].get("transcript")
+            if partial:
+                st.caption("Provisional transcript, still transcribing:")
+                st.text(partial)
+    
+    error = st.session_state.job_errors.get("transcribe")
+    if error:
+        st.error(error)
+
+
+def report_progress():
+    if collect_jobs():
+        st.rerun()
+    
+    if report_pending():
+        job = get_job_manager().get(st.session_state.report_job)
+        if job is not None:
+            render_job_progress(job, "🧠 Report")
+            # Sections streamed so far
+            for section in LIVE_SECTION_TITLES:
+                if section in job["partial"]:
+                    render_live_section(section, job["partial"][section])
+    
+    error = st.session_state.job_errors.get("report")
+    if error:
+        st.error(error)
+
+
+def report_key(rep: dict) -> str:
+    """Content hash of the current report, computed once per report object"""
+    cached = st.session_state.get("_report_key")
+    if cached and cached[0] is rep:
+        return cached[1]
+    key = hashlib.sha256(json.dumps(rep, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+    st.session_state._report_key = (rep, key)
+    return key
+
+
+def transcript_extraction(transcript: str) -> dict:
+    """pre_extract_transcript for the current transcript, run once per transcript rather than per rerun"""
+    cached = st.session_state.get("_transcript_extraction")
+    if cached and cached[0] == transcript:
+        return cached[1]
+    found = pre_extract_transcript(transcript)
+    st.session_state._transcript_extraction = (transcript, found)
+    return found
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_report_body(key: str, _rep: dict):
+    """Overview, diagnosis and report tabs; replayed from cache while the report is unchanged"""
+    # Overview
+    overview = _rep.get('conversation_overview', {})
+    if overview and any(overview.values()):
+        st.markdown("### 💬 Conversation Overview")
         
-        # Clean up
-        os.unlink(tmp_path)
+        if overview.get('what_patient_said'):
+            st.info(f"**Patient's Complaint:** {overview['what_patient_said']}")
         
-        return transcript.text
-    
-    except Exception as e:
-        return f"Transcription error: {str(e)}"
-
-
-# PDF Generation (same as before, compressed version)
-def generate_professional_pdf(rep: dict, doctor_name: str) -> BytesIO:
-    """Generate ONE-PAGE compressed medical report PDF"""
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    y = height - 30
-    
-    def draw_compact_text(text, font="Helvetica", size=8, x_offset=70, max_lines=3):
-        nonlocal y
-        c.setFont(font, size)
-        max_width = width - 140
-        words = str(text).split()
-        line = ""
-        lines_drawn = 0
+        if overview.get('what_doctor_observed'):
+            st.info(f"**Doctor's Observation:** {overview['what_doctor_observed']}")
         
-        for word in words:
-            test_line = line + word + " "
-            if c.stringWidth(test_line, font, size) < max_width:
-                line = test_line
-            else:
-                if line and lines_drawn < max_lines:
-                    c.drawString(x_offset, y, line.strip()[:95])
-                    y -= 10
-                    lines_drawn += 1
-                line = word + " "
-        if line and lines_drawn < max_lines:
-            c.drawString(x_offset, y, line.strip()[:95])
-            y -= 10
-    
-    # Compact header
-    c.setFont("Helvetica-Bold", 16)
-    c.setFillColor(colors.HexColor("#3B82F6"))
-    c.drawString(50, y, "MedNote AI")
-    c.setFont("Helvetica", 7)
-    c.setFillColor(colors.grey)
-    c.drawString(160, y, "Smart Medical Documentation")
-    y -= 15
-    
-    # Patient info
-    c.setFont("Helvetica-Bold", 9)
-    c.setFillColor(colors.black)
-    c.drawString(50, y, f"Dr: {doctor_name}")
-    c.setFont("Helvetica", 8)
-    c.drawString(200, y, f"Patient: {safe_str(rep.get('patient_name', 'Not documented'))[:20]}")
-    
-    demo = rep.get('demographics', {})
-    demo_parts = []
-    if demo.get('age'): demo_parts.append(f"Age:{demo['age']}")
-    if demo.get('gender'): demo_parts.append(f"Sex:{demo['gender']}")
-    if demo.get('weight'): demo_parts.append(f"Wt:{demo['weight']}")
-    if demo.get('height'): demo_parts.append(f"Ht:{demo['height']}")
-    
-    if demo_parts:
-        c.drawString(400, y, " | ".join(demo_parts)[:50])
-    
-    y -= 10
-    c.setFont("Helvetica", 7)
-    c.drawString(50, y, datetime.now().strftime('%b %d, %Y'))
-    y -= 12
-    c.setStrokeColor(colors.grey)
-    c.line(50, y, width - 50, y)
-    y -= 12
+        st.markdown("---")
     
-    # Overview
-    overview = rep.get('conversation_overview', {})
-    if overview and overview.get('conversation_summary'):
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y, "SUMMARY:")
-        y -= 10
-        draw_compact_text(overview['conversation_summary'], size=7, max_lines=2)
-        y -= 5
-    
-    # Chief Complaint
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(50, y, "CHIEF COMPLAINT:")
-    y -= 10
-    draw_compact_text(rep.get('chief_complaint', 'Not documented'), size=7, max_lines=2)
-    y -= 5
-    
-    # HPI
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(50, y, "HISTORY:")
-    y -= 10
-    draw_compact_text(rep.get('history_of_present_illness', 'Not documented'), size=7, max_lines=3)
-    y -= 5
-    
-    # Vital Signs
-    vitals = rep.get('vital_signs', {})
-    if vitals and any(vitals.values()):
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y, "VITALS:")
-        y -= 10
-        c.setFont("Helvetica", 7)
-        vital_str = " | ".join([
-            f"BP:{vitals['blood_pressure']}" if vitals.get('blood_pressure') else "",
-            f"HR:{vitals['heart_rate']}" if vitals.get('heart_rate') else "",
-            f"Temp:{vitals['temperature']}" if vitals.get('temperature') else "",
-        ]).strip(' |')
-        c.drawString(70, y, vital_str[:100])
-        y -= 12
-    
-    # Assessment
-    assessment = rep.get('clinical_assessment', {})
+    # Diagnosis
+    assessment = _rep.get('clinical_assessment', {})
     if assessment and assessment.get('suspected_diagnosis'):
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y, "ASSESSMENT:")
-        y -= 10
-        c.setFont("Helvetica-Bold", 8)
-        c.drawString(70, y, safe_str(assessment['suspected_diagnosis'])[:80])
-        y -= 10
+        st.success(f"**🎯 Diagnosis:** {assessment['suspected_diagnosis']}")
+    
+    # Tabs
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "📋 Doctor Report",
+        "🧑‍⚕️ Patient Summary", 
+        "💊 Medications",
+        "⚠️ Safety & Advisory"
+    ])
+    
+    with tab1:
+        st.markdown("**Chief Complaint:**")
+        st.write(safe_str(_rep.get('chief_complaint')))
+        
+        st.markdown("**History of Present Illness:**")
+        st.write(safe_str(_rep.get('history_of_present_illness')))
+        
+        st.markdown("**Physical Examination:**")
+        st.write(safe_str(_rep.get('physical_examination')))
+        
         if assessment.get('reasoning'):
-            draw_compact_text(assessment['reasoning'], size=7, max_lines=2)
-        y -= 5
-    
-    # Medications
-    meds = rep.get('medication_plan', [])
-    if meds:
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y, "PRESCRIBED:")
-        y -= 10
-        for i, med in enumerate(meds[:4], 1):
-            c.setFont("Helvetica-Bold", 8)
-            c.drawString(70, y, f"{i}. {safe_str(med.get('name'))[:30]}")
-            y -= 9
-            c.setFont("Helvetica", 7)
-            c.drawString(85, y, f"{safe_str(med.get('dose'))[:20]} - {safe_str(med.get('frequency'))[:20]}"[:50])
-            y -= 9
-        y -= 3
-    
-    # Follow-up
-    followup = rep.get('follow_up')
-    if followup:
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y, "FOLLOW-UP:")
-        y -= 10
-        draw_compact_text(followup, size=7, max_lines=2)
-    
-    # Footer
-    c.setFont("Helvetica", 6)
-    c.setFillColor(colors.grey)
-    c.drawString(50, 25, "MedNote AI - For Testing Purposes Only - Not a substitute for professional medical judgment")
-    
-    c.save()
-    buffer.seek(0)
-    return buffer
+            st.markdown("**Clinical Reasoning:**")
+            st.info(assessment['reasoning'])
+    
+    with tab2:
+        patient_report = _rep.get('patient_report')
+        if patient_report:
+            st.write(patient_report)
+        else:
+            st.info("Patient-friendly summary will appear here")
+    
+    with tab3:
+        meds = _rep.get('medication_plan', [])
+        if meds:
+            for i, med in enumerate(meds, 1):
+                stock = med.get('stock_status', {})
+                in_stock = stock.get('in_stock', True)
+                
+                st.markdown(f"**{i}. {safe_str(med.get('name'))}**")
+                
+                if in_stock:
+                    st.success("✅ In Stock")
+                else:
+                    st.error("❌ Out of Stock")
+                    st.info(f"**Alternative:** {safe_str(stock.get('alternative'))}")
+                
+                st.write(f"**Dose:** {safe_str(med.get('dose'))}")
+                st.write(f"**Frequency:** {safe_str(med.get('frequency'))}")
+                st.write(f"**Duration:** {safe_str(med.get('duration'))}")
+                st.write(f"**Instructions:** {safe_str(med.get('instructions'))}")
+                
+                if med.get('guideline_basis'):
+                    st.caption(f"📚 {med['guideline_basis']}")
+                st.markdown("---")
+        else:
+            st.info("No medications prescribed")
+    
+    with tab4:
+        safety = _rep.get('safety_checks', [])
+        if safety:
+            st.markdown("**⚠️ Safety Checks:**")
+            for check in safety:
+                st.warning(check)
+        
+        missing = _rep.get('doctor_advisory_missing_questions', [])
+        if missing:
+            st.markdown("**❓ Suggested Questions:**")
+            for i, q in enumerate(missing, 1):
+                st.write(f"{i}. {q}")
 
 
 # =========================
@@ -349,9 +492,11 @@ def generate_professional_pdf(rep: dict, doctor_name: str) -> BytesIO:
 col_new, col_spacer = st.columns([1, 5])
 with col_new:
     if st.button("🆕 New Consultation", use_container_width=True):
-        st.session_state.full_transcript = ""
-        st.session_state.report = None
-        st.rerun()
+        open_consultation()
+        st.query_params.clear()
+
+# Results of jobs that finished since the last run
+collect_jobs()
 
 st.markdown("<br>", unsafe_allow_html=True)
 st.markdown("<h1 style='text-align: center; margin-top: -10px; margin-bottom: 5px;'>🩺 MedNote AI</h1>", unsafe_allow_html=True)
@@ -361,10 +506,21 @@ st.markdown("<p style='text-align: center; color: rgba(255,255,255,0.6); margin-
 # =========================
 #   MAIN LAYOUT
 # =========================
-left_col, center_col, right_col = st.columns([1, 2, 1.5])
+# Each panel is a fragment: its own widgets rerun only that panel. Changes
+# another panel depends on (new transcript, new report) rerun the whole app.
+
+def queue_transcription(audio_file):
+    """Submit a recording for transcription and clear the recorder for the next segment"""
+    job_id = submit_transcription(st.session_state.doctor_name, audio_file.getvalue(), upload_filename(audio_file))
+    st.session_state.transcription_jobs.append(job_id)
+    st.session_state.job_errors.pop("transcribe", None)
+    st.session_state.recorder_round += 1
+    save_consultation()
+    st.rerun()
 
 # LEFT: Patient Profile
-with left_col:
+@st.fragment
+def patient_profile_panel():
     st.markdown("<h3>👤 Patient Profile</h3>", unsafe_allow_html=True)
     
     if st.session_state.report:
@@ -395,30 +551,110 @@ with left_col:
             if vitals.get('blood_pressure'): st.metric("BP", vitals['blood_pressure'])
             if vitals.get('heart_rate'): st.metric("HR", vitals['heart_rate'])
             if vitals.get('temperature'): st.metric("Temp", vitals['temperature'])
+    elif st.session_state.full_transcript:
+        # Read locally from the transcript while the report is pending or not yet requested
+        found = transcript_extraction(st.session_state.full_transcript)
+        measurements = found["measurements"]
+        labels = {
+            "blood_pressure": "BP", "heart_rate": "HR", "temperature": "Temp", "oxygen_saturation": "SpO₂",
+            "respiratory_rate": "RR", "age": "Age", "weight": "Weight", "height": "Height",
+        }
+        readings = [
+            (labels[field], values[-1])
+            for section in ("demographics", "vital_signs")
+            for field, values in measurements.get(section, {}).items()
+        ]
+        if readings:
+            st.markdown("**📊 From the transcript:**")
+            for label, value in readings:
+                st.markdown(f"**{label}:** {safe_str(value)}")
+        if found["medications"]:
+            st.markdown("**💊 Medications mentioned:**")
+            for med in found["medications"]:
+                icon = "✅" if med["in_stock"] else "⚠️"
+                alternative = f" (alternative: {safe_str(med['alternative'])})" if med["alternative"] else ""
+                st.markdown(f"{icon} {safe_str(med['name'])}{alternative}")
+        if not readings and not found["medications"]:
+            st.info("Patient information will appear here after generating report")
     else:
         st.info("Patient information will appear here after generating report")
 
+# LEFT: Past Consultations (reopened from the store, no model call)
+def reset_history_pages():
+    st.session_state.history_pages = 1
+
+@st.fragment
+def past_consultations_panel():
+    st.markdown("<h3>📂 Past Consultations</h3>", unsafe_allow_html=True)
+    
+    search = st.text_input(
+        "Search",
+        placeholder="Patient name, or symptoms, drugs...",
+        label_visibility="collapsed",
+        on_change=reset_history_pages
+    )
+    all_doctors = st.toggle("All doctors", on_change=reset_history_pages)
+    full_text = st.toggle(
+        "Search transcripts and reports",
+        help='All words must appear; "quote" a phrase, end a word with * to match by prefix',
+        on_change=reset_history_pages
+    )
+    
+    store = get_consultation_store()
+    doctor = None if all_doctors else st.session_state.doctor_name
+    pages = st.session_state.setdefault("history_pages", 1)
+    items, after = [], None
+    if search and full_text:
+        items = store.search(search, doctor=doctor, limit=10 * pages + 1)
+        after = len(items) > 10 * pages
+        items = items[:10 * pages]
+    else:
+        for _ in range(pages):
+            page = store.query(patient=search or None, doctor=doctor, limit=10, after=after)
+            items.extend(page["items"])
+            after = page["next"]
+            if not after:
+                break
+    
+    for item in items:
+        label = f"{item['patient_name'] or 'Unnamed patient'} · {datetime.fromtimestamp(item['created_at']).strftime('%d %b %Y')}"
+        if item["diagnosis"]:
+            label += f" · {item['diagnosis'][:30]}"
+        if st.button(label, key=f"open_{item['id']}", use_container_width=True,
+                     disabled=item["id"] == st.session_state.consultation_id):
+            open_consultation(store.get(item["id"]))
+            st.query_params["c"] = item["id"]
+            st.rerun()
+        if item.get("snippet"):
+            st.caption(item["snippet"])
+    
+    if after:
+        st.button(
+            "Load more",
+            on_click=lambda: st.session_state.update(history_pages=st.session_state.history_pages + 1),
+            use_container_width=True
+        )
+    if not items:
+        st.caption("No matching consultations" if search else "Saved consultations will appear here")
+
 # CENTER: Audio Recording/Upload
-with center_col:
+@st.fragment
+def recording_panel():
     st.markdown("<h3 style='text-align: center;'>🎙 Record Consultation</h3>", unsafe_allow_html=True)
     
     st.info("💡 **Works on ANY device!** 1️⃣ Click mic → 2️⃣ Speak → 3️⃣ Transcribe")
     
     # Audio input (browser recording) - WORKS ON ALL DEVICES!
-    audio_input = st.audio_input("Click to record consultation", key="audio_recorder")
+    audio_input = st.audio_input(
+        "Click to record consultation",
+        key=f"audio_recorder_{st.session_state.recorder_round}"
+    )
     
     if audio_input:
         st.audio(audio_input)
         
         if st.button("📝 Transcribe Audio", type="primary", use_container_width=True):
-            with st.spinner("Transcribing audio..."):
-                transcript = transcribe_audio(audio_input)
-                if st.session_state.full_transcript:
-                    st.session_state.full_transcript += "\n\n" + transcript
-                else:
-                    st.session_state.full_transcript = transcript
-            st.success("Transcription complete!")
-            st.rerun()
+            queue_transcription(audio_input)
     
     # OR file upload
     st.markdown("---")
@@ -426,21 +662,18 @@ with center_col:
     uploaded_file = st.file_uploader(
         "Upload audio (WAV, MP3, M4A)",
         type=['wav', 'mp3', 'm4a', 'ogg'],
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key=f"audio_upload_{st.session_state.recorder_round}"
     )
     
     if uploaded_file:
         st.audio(uploaded_file)
         
         if st.button("📝 Transcribe Uploaded File", use_container_width=True):
-            with st.spinner("Transcribing audio..."):
-                transcript = transcribe_audio(uploaded_file)
-                if st.session_state.full_transcript:
-                    st.session_state.full_transcript += "\n\n" + transcript
-                else:
-                    st.session_state.full_transcript = transcript
-            st.success("Transcription complete!")
-            st.rerun()
+            queue_transcription(uploaded_file)
+    
+    # Segments still being transcribed; the doctor can record the next one meanwhile
+    poll(transcription_progress, bool(pending_transcriptions()))
     
     # Show transcript
     st.markdown("**📝 Full Transcript:**")
@@ -453,115 +686,80 @@ with center_col:
     )
 
 # RIGHT: Results
-with right_col:
+@st.fragment
+def results_panel():
     st.markdown("<h3>📊 Results</h3>", unsafe_allow_html=True)
     
     st.markdown("**🌐 Select Report Language:**")
     st.session_state.report_language = st.selectbox(
         "Language",
         ["English", "Arabic"],
+        index=1 if st.session_state.report_language == "arabic" else 0,
         label_visibility="collapsed"
     ).lower()
     
     if st.session_state.full_transcript:
-        if st.button("🧠 Generate Report", use_container_width=True):
-            with st.spinner("AI analyzing..."):
-                st.session_state.report = generate_report(
-                    st.session_state.full_transcript,
-                    st.session_state.report_language
-                )
-            st.rerun()
+        parallel_mode = st.toggle(
+            "⚡ Parallel extraction",
+            help="Extract report sections as concurrent requests instead of one long response"
+        )
+        
+        transcript = st.session_state.full_transcript
+        language = st.session_state.report_language
+        cursor = st.session_state.report_cursor
+        incremental = (
+            st.session_state.report is not None
+            and cursor is not None
+            and cursor[0] == language
+            and 0 < cursor[1] < len(transcript)
+        )
+        
+        if st.button(
+            "🧠 Update Report" if incremental else "🧠 Generate Report",
+            use_container_width=True,
+            disabled=report_pending()
+        ):
+            st.session_state.report_job = submit_report(
+                st.session_state.doctor_name,
+                transcript,
+                language,
+                mode="update" if incremental else "parallel" if parallel_mode else "stream",
+                report=st.session_state.report if incremental else None,
+                cursor=cursor[1] if incremental else 0
+            )
+            st.session_state.job_errors.pop("report", None)
+            save_consultation()
+    
+    poll(report_progress, report_pending())
+    
+    timings = st.session_state.generation_timings
+    if timings:
+        groups = " · ".join(f"{name} {secs:.1f}s" for name, secs in timings.items() if name != "total")
+        st.caption(f"⏱️ {groups} (total {timings.get('total', 0):.1f}s)")
+    
+    backend = get_backend()
+    api_stats = backend.transport_stats() if backend is not None else {}
+    if api_stats.get("retries") or api_stats.get("breaker", "closed") != "closed":
+        st.caption(
+            f"🔁 API: {api_stats['requests']} requests, {api_stats['retries']} retries, "
+            f"{api_stats['failures']} failed, circuit {api_stats['breaker'].replace('_', '-')}"
+        )
+    
+    cache_stats = get_report_cache().stats()
+    if cache_stats["memory_hits"] + cache_stats["disk_hits"]:
+        st.caption(
+            f"⚡ Report cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+            f"{cache_stats['misses']} misses, ~{cache_stats['seconds_saved']:.0f}s saved"
+        )
     
     st.markdown("<br>", unsafe_allow_html=True)
     
     if st.session_state.report:
         rep = st.session_state.report
+        export_cache = get_export_cache()
+        export_cache.prefetch(rep, st.session_state.doctor_name)
         
-        # Overview
-        overview = rep.get('conversation_overview', {})
-        if overview:
-            st.markdown("### 💬 Conversation Overview")
-            
-            if overview.get('what_patient_said'):
-                st.info(f"**Patient's Complaint:** {overview['what_patient_said']}")
-            
-            if overview.get('what_doctor_observed'):
-                st.info(f"**Doctor's Observation:** {overview['what_doctor_observed']}")
-            
-            st.markdown("---")
-        
-        # Diagnosis
-        assessment = rep.get('clinical_assessment', {})
-        if assessment and assessment.get('suspected_diagnosis'):
-            st.success(f"**🎯 Diagnosis:** {assessment['suspected_diagnosis']}")
-        
-        # Tabs
-        tab1, tab2, tab3, tab4 = st.tabs([
-            "📋 Doctor Report",
-            "🧑‍⚕️ Patient Summary", 
-            "💊 Medications",
-            "⚠️ Safety & Advisory"
-        ])
-        
-        with tab1:
-            st.markdown("**Chief Complaint:**")
-            st.write(safe_str(rep.get('chief_complaint')))
-            
-            st.markdown("**History of Present Illness:**")
-            st.write(safe_str(rep.get('history_of_present_illness')))
-            
-            st.markdown("**Physical Examination:**")
-            st.write(safe_str(rep.get('physical_examination')))
-            
-            if assessment.get('reasoning'):
-                st.markdown("**Clinical Reasoning:**")
-                st.info(assessment['reasoning'])
-        
-        with tab2:
-            patient_report = rep.get('patient_report')
-            if patient_report:
-                st.write(patient_report)
-            else:
-                st.info("Patient-friendly summary will appear here")
-        
-        with tab3:
-            meds = rep.get('medication_plan', [])
-            if meds:
-                for i, med in enumerate(meds, 1):
-                    stock = med.get('stock_status', {})
-                    in_stock = stock.get('in_stock', True)
-                    
-                    st.markdown(f"**{i}. {safe_str(med.get('name'))}**")
-                    
-                    if in_stock:
-                        st.success("✅ In Stock")
-                    else:
-                        st.error("❌ Out of Stock")
-                        st.info(f"**Alternative:** {safe_str(stock.get('alternative'))}")
-                    
-                    st.write(f"**Dose:** {safe_str(med.get('dose'))}")
-                    st.write(f"**Frequency:** {safe_str(med.get('frequency'))}")
-                    st.write(f"**Duration:** {safe_str(med.get('duration'))}")
-                    st.write(f"**Instructions:** {safe_str(med.get('instructions'))}")
-                    
-                    if med.get('guideline_basis'):
-                        st.caption(f"📚 {med['guideline_basis']}")
-                    st.markdown("---")
-            else:
-                st.info("No medications prescribed")
-        
-        with tab4:
-            safety = rep.get('safety_checks', [])
-            if safety:
-                st.markdown("**⚠️ Safety Checks:**")
-                for check in safety:
-                    st.warning(check)
-            
-            missing = rep.get('doctor_advisory_missing_questions', [])
-            if missing:
-                st.markdown("**❓ Suggested Questions:**")
-                for i, q in enumerate(missing, 1):
-                    st.write(f"{i}. {q}")
+        render_report_body(report_key(rep), rep)
         
         # Export
         st.markdown("---")
@@ -571,18 +769,40 @@ with right_col:
         
         st.markdown("<br>", unsafe_allow_html=True)
         
-        if st.button("📄 Download PDF Report", use_container_width=True, type="primary"):
-            pdf_buffer = generate_professional_pdf(rep, st.session_state.doctor_name)
+        file_stem = f"MedNote_{safe_str(rep.get('patient_name', 'Patient')).replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
+        pdf_col, docx_col = st.columns(2)
+        with pdf_col:
+            st.download_button(
+                "📄 Download PDF Report",
+                export_cache.get(rep, st.session_state.doctor_name, "pdf"),
+                f"{file_stem}.pdf",
+                mime=MIME_TYPES["pdf"],
+                on_click="ignore",
+                use_container_width=True,
+                type="primary"
+            )
+        with docx_col:
             st.download_button(
-                "⬇️ Download PDF",
-                pdf_buffer,
-                f"MedNote_{safe_str(rep.get('patient_name', 'Patient')).replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
-                mime="application/pdf",
+                "📝 Download Word Report",
+                export_cache.get(rep, st.session_state.doctor_name, "docx"),
+                f"{file_stem}.docx",
+                mime=MIME_TYPES["docx"],
+                on_click="ignore",
                 use_container_width=True
             )
     else:
         st.info("Results will appear here after generating report")
 
+left_col, center_col, right_col = st.columns([1, 2, 1.5])
+with left_col:
+    patient_profile_panel()
+    st.markdown("---")
+    past_consultations_panel()
+with center_col:
+    recording_panel()
+with right_col:
+    results_panel()
+
 # Disclaimer
 st.markdown("""
 <div class='disclaimer'>
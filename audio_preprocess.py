@@ -0,0 +1,281 @@
+"""
+Audio preprocessing before a recording is sent to whisper-1.
+
+Browser recordings arrive as 44.1/48 kHz (often stereo) WAV with long silent
+stretches while the doctor examines the patient. Whisper works on 16 kHz mono
+internally, so the recording is decoded, downmixed to mono, resampled to
+16 kHz (lower rates are kept) and stripped of silences longer than a second before upload, which
+cuts the upload (and whisper's processing time) by a large factor.
+
+Decoding runs in blocks of a few seconds, so memory stays bounded by the
+output rather than the input. Silence is found with an energy VAD over 30 ms
+frames against an adaptive noise floor; speech keeps a short margin on both
+sides and pauses shorter than `min_silence` are left alone.
+
+WAV is decoded with the stdlib `wave` module, other formats with the decoders
+registered in long_audio. The output is 16-bit WAV, or FLAC when ffmpeg is
+available (MEDNOTE_AUDIO_FORMAT=wav|flac|ogg; ogg is Opus, lossy).
+"""
+import io
+import os
+import shutil
+import subprocess
+import time
+import wave
+
+import numpy as np
+
+import telemetry
+
+
+TARGET_RATE = 16000
+FRAME_SECONDS = 0.03
+BLOCK_SECONDS = 5.0
+# Frames quieter than this are always silence; louder than the cap are always speech
+SILENCE_FLOOR_DB = -55.0
+SPEECH_CAP_DB = -38.0
+NOISE_MARGIN_DB = 12.0
+OUTPUT_FORMAT = os.getenv("MEDNOTE_AUDIO_FORMAT", "flac" if shutil.which("ffmpeg") else "wav").lower()
+
+
+def _pcm_to_float(raw: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """Interleaved PCM -> float32 array of shape (frames, channels) in [-1, 1)"""
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        # Little-endian 24-bit: widen to int32 with the sign in the top byte
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        widened = (triplets[:, 0] << 8) | (triplets[:, 1] << 16) | (triplets[:, 2] << 24)
+        samples = widened.astype(np.float32) / 2147483648.0
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+    return samples.reshape(-1, channels)
+
+
+def _pcm_blocks(data: bytes, filename: str, block_seconds: float = BLOCK_SECONDS):
+    """Yield (sample_rate, channels, float32 block of shape (frames, channels)) over the recording"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".wav":
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+            block_frames = max(1, int(rate * block_seconds))
+            while True:
+                raw = wav.readframes(block_frames)
+                if not raw:
+                    return
+                yield rate, channels, _pcm_to_float(raw, width, channels)
+
+    from long_audio import DECODERS
+
+    if ext not in DECODERS:
+        raise ValueError(f"No audio decoder registered for '{ext or filename}'")
+    pcm, rate, channels, width = DECODERS[ext](data)
+    frame_size = channels * width
+    step = max(1, int(rate * block_seconds)) * frame_size
+    for start in range(0, len(pcm) - len(pcm) % frame_size, step):
+        yield rate, channels, _pcm_to_float(pcm[start:start + step], width, channels)
+
+
+class Resampler:
+    """
+    Streaming sample-rate conversion: a windowed-sinc low-pass (when
+    downsampling) followed by linear interpolation at the output rate.
+    Blocks can be any length; state carries across calls.
+    """
+
+    def __init__(self, rate_in: int, rate_out: int = TARGET_RATE, taps: int = 63):
+        self.rate_in = rate_in
+        self.rate_out = rate_out
+        self.step = rate_in / rate_out
+        self._filter = None
+        if rate_in > rate_out:
+            # Cut off a little below the new Nyquist frequency so nothing aliases back into speech
+            cutoff = 0.45 * rate_out / rate_in
+            n = np.arange(taps) - (taps - 1) / 2
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(taps)
+            self._filter = (kernel / kernel.sum()).astype(np.float32)
+            self._history = np.zeros(taps - 1, dtype=np.float32)
+        # Filtered samples not yet fully interpolated past, and the input index of the first one
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pending_start = 0
+        self._position = 0.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.rate_in == self.rate_out:
+            return samples
+        if self._filter is not None:
+            padded = np.concatenate([self._history, samples])
+            self._history = padded[len(padded) - len(self._history):]
+            samples = np.convolve(padded, self._filter, mode="valid").astype(np.float32)
+        buffer = np.concatenate([self._pending, samples])
+        # Output positions that have both neighbours in this buffer
+        last = self._pending_start + len(buffer) - 1
+        count = max(0, int(np.ceil((last - self._position) / self.step)))
+        positions = self._position + self.step * np.arange(count) - self._pending_start
+        index = positions.astype(np.int64)
+        fraction = (positions - index).astype(np.float32)
+        out = buffer[index] * (1 - fraction) + buffer[np.minimum(index + 1, len(buffer) - 1)] * fraction
+        self._position += self.step * count
+        keep_from = max(0, min(len(buffer) - 1, int(self._position) - self._pending_start))
+        self._pending = buffer[keep_from:]
+        self._pending_start += keep_from
+        return out
+
+
+class SilenceTrimmer:
+    """
+    Streaming energy VAD. Frames are decided once `lookahead` more frames
+    have arrived, so a frame just before speech can still be kept as lead-in.
+    """
+
+    def __init__(self, rate: int = TARGET_RATE, pad_seconds: float = 0.3, min_silence: float = 1.0):
+        self.frame = int(rate * FRAME_SECONDS)
+        self.pad = int(round(pad_seconds / FRAME_SECONDS))
+        # Pauses up to this many frames are kept whole
+        self.min_gap = int(round(min_silence / FRAME_SECONDS))
+        self.lookahead = max(self.pad, self.min_gap) + 1
+        self._samples = np.zeros(0, dtype=np.float32)
+        self._frames = np.zeros((0, self.frame), dtype=np.float32)
+        self._speech = np.zeros(0, dtype=bool)
+        self._decided = 0
+        self._last_speech = -10**9
+        self._noise_db = None
+        self.speech_frames = 0
+
+    def _classify(self, frames: np.ndarray) -> np.ndarray:
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        floor = float(np.percentile(energy_db, 10))
+        self._noise_db = floor if self._noise_db is None else 0.8 * self._noise_db + 0.2 * floor
+        threshold = min(max(self._noise_db + NOISE_MARGIN_DB, SILENCE_FLOOR_DB), SPEECH_CAP_DB)
+        return energy_db > threshold
+
+    def process(self, samples: np.ndarray, final: bool = False) -> np.ndarray:
+        samples = np.concatenate([self._samples, samples])
+        whole = len(samples) // self.frame * self.frame
+        self._samples = samples[whole:]
+        if whole:
+            new_frames = samples[:whole].reshape(-1, self.frame)
+            self._frames = np.concatenate([self._frames, new_frames])
+            self._speech = np.concatenate([self._speech, self._classify(new_frames)])
+
+        ready = len(self._frames) if final else max(0, len(self._frames) - self.lookahead)
+        if not ready:
+            return np.zeros(0, dtype=np.float32)
+
+        # Absolute frame indices; nearest speech frame before/after each frame being decided
+        base = self._decided
+        index = base + np.arange(len(self._frames))
+        speech_index = np.where(self._speech, index, -10**9)
+        previous = np.maximum(np.maximum.accumulate(speech_index), self._last_speech)
+        following = np.where(self._speech, index, 10**9)
+        following = np.minimum.accumulate(following[::-1])[::-1]
+        keep = (
+            (index - previous <= self.pad)
+            | (following - index <= self.pad)
+            | (following - previous - 1 <= self.min_gap)
+        )[:ready]
+
+        out = self._frames[:ready][keep].ravel()
+        self.speech_frames += int(self._speech[:ready].sum())
+        self._last_speech = int(previous[ready - 1])
+        self._frames = self._frames[ready:]
+        self._speech = self._speech[ready:]
+        self._decided += ready
+        if final and len(keep) and keep[-1]:
+            out = np.concatenate([out, self._samples])
+        return out
+
+
+def _encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    pcm = (np.clip(samples, -1.0, 32767 / 32768) * 32768).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def _encode_ffmpeg(wav_bytes: bytes, fmt: str) -> bytes:
+    codec = ["-c:a", "flac"] if fmt == "flac" else ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *codec, "-f", fmt, "pipe:1"],
+        input=wav_bytes,
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+def preprocess_audio(data: bytes, filename: str, output_format: str = None, trim_silence: bool = True) -> tuple:
+    """
+    Return (audio bytes, filename, stats) ready for upload. stats holds the
+    input/output bytes and seconds, the speech seconds found and the time the
+    stage took. When nothing would be gained (no decoder, no speech found or
+    no size saving) the original recording is returned unchanged.
+    """
+    started = time.perf_counter()
+    output_format = (output_format or OUTPUT_FORMAT).lower()
+    stats = {"input_bytes": len(data), "output_bytes": len(data), "applied": False}
+    with telemetry.span("preprocess", input_bytes=len(data)) as attrs:
+        try:
+            resampler = trimmer = None
+            input_frames = 0
+            pieces = []
+            for rate, channels, block in _pcm_blocks(data, filename):
+                if resampler is None:
+                    # Narrowband audio (8 kHz phone recordings) keeps its rate; upsampling adds nothing
+                    output_rate = min(rate, TARGET_RATE)
+                    resampler = Resampler(rate, output_rate)
+                    trimmer = SilenceTrimmer(output_rate) if trim_silence else None
+                    downmix = np.full(channels, 1 / channels, dtype=np.float32)
+                    stats.update(input_rate=rate, input_channels=channels, output_rate=output_rate)
+                input_frames += len(block)
+                # A matrix-vector product is much faster than mean(axis=1) over a short axis
+                mono = block @ downmix
+                resampled = resampler.process(mono)
+                pieces.append(trimmer.process(resampled) if trimmer else resampled)
+            if resampler is None:
+                raise ValueError("Recording contains no audio")
+            if trimmer:
+                pieces.append(trimmer.process(np.zeros(0, dtype=np.float32), final=True))
+        except (ValueError, EOFError, wave.Error, OSError, subprocess.CalledProcessError) as e:
+            stats.update(skipped=str(e), seconds=round(time.perf_counter() - started, 4))
+            attrs.update(skipped=type(e).__name__)
+            return data, filename, stats
+
+        samples = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+        stats["input_seconds"] = round(input_frames / stats["input_rate"], 2)
+        stats["output_seconds"] = round(len(samples) / output_rate, 2)
+        if trimmer:
+            stats["speech_seconds"] = round(trimmer.speech_frames * FRAME_SECONDS, 2)
+        if not len(samples) or (trimmer and not trimmer.speech_frames):
+            # All silence by our measure; let whisper judge the original
+            stats.update(skipped="no speech detected", seconds=round(time.perf_counter() - started, 4))
+            attrs.update(skipped="no speech")
+            return data, filename, stats
+
+        output = _encode_wav(samples, output_rate)
+        extension = ".wav"
+        if output_format in ("flac", "ogg") and shutil.which("ffmpeg"):
+            try:
+                output = _encode_ffmpeg(output, output_format)
+                extension = f".{output_format}"
+            except (OSError, subprocess.CalledProcessError):
+                pass
+        if len(output) >= len(data):
+            stats.update(skipped="no size saving", seconds=round(time.perf_counter() - started, 4))
+            attrs.update(skipped="no saving")
+            return data, filename, stats
+
+        stats.update(output_bytes=len(output), applied=True, seconds=round(time.perf_counter() - started, 4))
+        attrs.update(output_bytes=len(output), input_seconds=stats["input_seconds"], output_seconds=stats["output_seconds"])
+        telemetry.count("mednote_preprocess_bytes_total", len(data), direction="in")
+        telemetry.count("mednote_preprocess_bytes_total", len(output), direction="out")
+        name = os.path.splitext(os.path.basename(filename or "audio"))[0] or "audio"
+        return output, name + extension, stats
@@ -0,0 +1,69 @@
+"""
+Upload path for audio sent to whisper-1.
+
+Streamlit already holds an uploaded or recorded file in memory, so that buffer
+is handed to the OpenAI client as-is, with its real filename so the API can
+tell m4a from ogg from wav. Seekable disk files are streamed from disk the
+same way. Anything else (pipes, sockets, custom readers) is copied in chunks
+into a SpooledTemporaryFile that stays in RAM up to the threshold and spills
+to disk beyond it.
+"""
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+SPOOL_THRESHOLD_BYTES = int(os.getenv("MEDNOTE_SPOOL_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+def upload_filename(audio_file, default: str = "audio.wav") -> str:
+    """Filename to send with the upload, always carrying an extension"""
+    name = os.path.basename(getattr(audio_file, "name", "") or "")
+    if not name:
+        return default
+    if not os.path.splitext(name)[1]:
+        name += os.path.splitext(default)[1]
+    return name
+
+
+def _is_seekable_disk_file(audio_file) -> bool:
+    try:
+        audio_file.fileno()
+        return audio_file.seekable()
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+@contextmanager
+def open_upload(audio_file, spool_threshold: int = None):
+    """
+    Yield a (filename, file) tuple ready for `client.audio.transcriptions.create(file=...)`.
+
+    In-memory buffers (Streamlit UploadedFile, BytesIO, bytes) and seekable
+    disk files are passed through without copying. Other streams are spooled,
+    and the spool is always closed, removing any temp file, even if the API
+    call raises.
+    """
+    if spool_threshold is None:
+        spool_threshold = SPOOL_THRESHOLD_BYTES
+    filename = upload_filename(audio_file)
+
+    if isinstance(audio_file, (bytes, bytearray, memoryview)):
+        yield filename, io.BytesIO(audio_file)
+        return
+
+    if hasattr(audio_file, "getbuffer") or _is_seekable_disk_file(audio_file):
+        audio_file.seek(0)
+        yield filename, audio_file
+        return
+
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_threshold, suffix=os.path.splitext(filename)[1])
+    try:
+        shutil.copyfileobj(audio_file, spool, COPY_CHUNK_BYTES)
+        spool.seek(0)
+        yield filename, spool
+    finally:
+        spool.close()
@@ -0,0 +1,267 @@
+"""
+Pluggable chat/transcription backends.
+
+Everything that talks to a model goes through an `LLMBackend`, so the pipeline
+can be pointed at OpenAI, at the bundled mock server (mock_openai_server.py),
+or at any other implementation without touching the callers.
+
+Selection, in order: `set_backend()`, then the MEDNOTE_BACKEND environment
+variable ("openai" by default, "mock" to start the local mock server in this
+process). MEDNOTE_OPENAI_BASE_URL points the OpenAI backend at any server
+speaking the same API, e.g. a mock server started separately.
+
+The backend is created once per process through st.cache_resource and shared
+by every session; the openai SDK is imported when the first request is made.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import streamlit as st
+
+import telemetry
+from scheduler import get_rate_limiter
+from transcript_chunking import estimate_tokens
+from transport import Transport
+
+
+def _read_api_key() -> str:
+    try:
+        return st.secrets.get("OPENAI_API_KEY", "")
+    except:
+        return os.getenv("OPENAI_API_KEY", "")
+
+
+class ChatResult:
+    """Text of one chat completion plus its token usage"""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class LLMBackend:
+    """Interface every backend implements"""
+
+    def chat(self, messages: list, model: str, temperature: float = 0.2) -> ChatResult:
+        raise NotImplementedError
+
+    def chat_stream(self, messages: list, model: str, temperature: float = 0.2):
+        """Yield text deltas as the completion is generated"""
+        raise NotImplementedError
+
+    async def achat(self, messages: list, model: str, temperature: float = 0.2) -> ChatResult:
+        """Async chat without retries; callers such as generate_reports_batch own the retry policy"""
+        # Backends without a native async client run the sync call in a thread
+        return await asyncio.to_thread(self.chat, messages, model, temperature)
+
+    def transcribe(self, file, model: str = "whisper-1", language: str = "ar") -> str:
+        """`file` is anything the OpenAI SDK accepts, e.g. a (filename, fileobj) tuple"""
+        raise NotImplementedError
+
+    def transport_stats(self) -> dict:
+        """Request, retry and connection-pool counters, if the backend keeps them"""
+        return {}
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI (or OpenAI-compatible) API via the official SDK, with retries and
+    timeouts from `transport` and every attempt paced by `limiter`.
+    """
+
+    def __init__(self, api_key: str, base_url: str = None, transport: Transport = None, limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.transport = transport or Transport()
+        self.limiter = limiter or get_rate_limiter()
+        self._client = None
+        self._client_lock = threading.Lock()
+        # httpx async pools are bound to the loop that created them
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    # Retries are the transport's job so they are counted and feed the breaker
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=0,
+                        http_client=self.transport.http_client(),
+                    )
+        return self._client
+
+    def _pace(self, operation: str, tokens: int = 0):
+        return lambda: self.limiter.acquire(operation, tokens)
+
+    @staticmethod
+    def _prompt_tokens(messages) -> int:
+        return sum(estimate_tokens(m.get("content") or "") for m in messages)
+
+    @staticmethod
+    def _result(response, model: str, attrs: dict) -> ChatResult:
+        usage = getattr(response, "usage", None)
+        result = ChatResult(
+            response.choices[0].message.content or "",
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+        telemetry.record_tokens(model, result.prompt_tokens, result.completion_tokens)
+        attrs.update(prompt_tokens=result.prompt_tokens, completion_tokens=result.completion_tokens)
+        return result
+
+    def chat(self, messages, model, temperature=0.2):
+        with telemetry.span("chat", model=model) as attrs:
+            response = self.transport.call("chat", lambda: self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, timeout=self.transport.timeout("chat"),
+            ), before_attempt=self._pace("chat", self._prompt_tokens(messages)))
+            return self._result(response, model, attrs)
+
+    def chat_stream(self, messages, model, temperature=0.2):
+        # Timed by hand: a span's context can't stay open across yields to the consumer
+        started = time.perf_counter()
+        attrs = {"model": model}
+        error = None
+        try:
+            # Retried only until the stream opens; a stream that breaks midway raises to the caller
+            stream = self.transport.call("chat_stream", lambda: self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, stream=True,
+                stream_options={"include_usage": True}, timeout=self.transport.timeout("chat_stream"),
+            ), before_attempt=self._pace("chat", self._prompt_tokens(messages)))
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if "first_token_ms" not in attrs:
+                        attrs["first_token_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                    yield chunk.choices[0].delta.content
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    # Sent as the last chunk, with no choices
+                    attrs.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                    telemetry.record_tokens(model, usage.prompt_tokens, usage.completion_tokens)
+        except GeneratorExit:
+            attrs["closed_early"] = True
+            raise
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            telemetry.record_span("chat_stream", time.perf_counter() - started, error=error, **attrs)
+
+    async def achat(self, messages, model, temperature=0.2):
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        aclient = self._async_clients.get(loop)
+        if aclient is None:
+            aclient = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=self.transport.async_http_client(),
+            )
+            self._async_clients[loop] = aclient
+        # Wait for the rate limiter off the event loop
+        await asyncio.to_thread(self.limiter.acquire, "chat", self._prompt_tokens(messages))
+        with telemetry.span("chat", model=model) as attrs:
+            response = await self.transport.acall("chat", lambda: aclient.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, timeout=self.transport.timeout("chat"),
+            ))
+            return self._result(response, model, attrs)
+
+    def transcribe(self, file, model="whisper-1", language="ar"):
+        fileobj = file[1] if isinstance(file, tuple) else file
+        streamed = hasattr(fileobj, "read")
+        start = fileobj.tell() if streamed and fileobj.seekable() else None
+
+        def rewind():
+            # A retried upload has to send the audio from the beginning again
+            if streamed:
+                if start is None:
+                    raise RuntimeError("Cannot retry a transcription from a non-seekable stream")
+                fileobj.seek(start)
+
+        size = _payload_size(fileobj, start)
+        with telemetry.span("transcribe", model=model, audio_bytes=size) as attrs:
+            # verbose_json adds the audio duration to the response
+            transcript = self.transport.call("transcribe", lambda: self.client.audio.transcriptions.create(
+                model=model, file=file, language=language, response_format="verbose_json",
+                timeout=self.transport.timeout("transcribe"),
+            ), before_retry=rewind, before_attempt=self._pace("transcribe"))
+            duration = getattr(transcript, "duration", None)
+            attrs["audio_seconds"] = duration
+            telemetry.record_audio(size, duration)
+            return transcript.text
+
+    def transport_stats(self) -> dict:
+        return {**self.transport.metrics.snapshot(), "breaker": self.transport.breaker.state}
+
+
+def _payload_size(fileobj, start=None):
+    """Bytes left to upload from bytes or a seekable file, None when unknown"""
+    if isinstance(fileobj, (bytes, bytearray)):
+        return len(fileobj)
+    if start is None:
+        return None
+    end = fileobj.seek(0, os.SEEK_END)
+    fileobj.seek(start)
+    return end - start
+
+
+def _openai_backend():
+    api_key = _read_api_key()
+    base_url = os.getenv("MEDNOTE_OPENAI_BASE_URL") or None
+    if not api_key and base_url:
+        # OpenAI-compatible local servers don't check the key
+        api_key = "local"
+    return OpenAIBackend(api_key, base_url=base_url) if api_key else None
+
+
+def _mock_backend():
+    from mock_openai_server import MockConfig, start_mock_server
+
+    _, base_url = start_mock_server(MockConfig.from_env())
+    return OpenAIBackend("mock", base_url=base_url)
+
+
+BACKENDS = {
+    "openai": _openai_backend,
+    "mock": _mock_backend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def register_backend(name: str, factory):
+    """Make `factory() -> LLMBackend` selectable via MEDNOTE_BACKEND"""
+    BACKENDS[name] = factory
+
+
+def set_backend(backend):
+    """Use `backend` for every subsequent call in this process (None to go back to MEDNOTE_BACKEND)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_backend(name: str):
+    return BACKENDS[name]()
+
+
+def get_backend():
+    """Process-wide backend, or None when no API key is configured"""
+    if _backend is not None:
+        return _backend
+    name = os.getenv("MEDNOTE_BACKEND", "openai").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown MEDNOTE_BACKEND '{name}' (choose from {', '.join(BACKENDS)})")
+    return _shared_backend(name)
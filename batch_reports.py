@@ -0,0 +1,120 @@
+"""
+Asynchronous batch report generation.
+
+Used to back-fill reports for a whole clinic day of transcripts. Requests run
+concurrently on the backend's async chat (the async OpenAI client by default)
+up to `max_concurrency`, each with its own exponential-backoff retry
+(honouring Retry-After), and results come back in input order.
+
+    reports = asyncio.run(generate_reports_batch(transcripts, "english", max_concurrency=10))
+"""
+import asyncio
+import time
+
+from backends import get_backend
+from report_cache import get_report_cache, report_cache_key
+from pre_extract import prefilled_fields
+from summarizer import (
+    COMPACT_OUTPUT,
+    MODEL_NAME,
+    _apply_stock_status,
+    _build_messages,
+    _empty_report,
+    _normalize_report,
+    _output_version,
+    _parse_output,
+    generate_report_map_reduce,
+    pre_extract_transcript,
+)
+from transcript_chunking import TRANSCRIPT_TOKEN_BUDGET, estimate_tokens
+from transport import UpstreamUnavailable, backoff_delay, is_retryable
+
+
+def _is_retryable(error: Exception) -> bool:
+    # A batch can afford to wait out an open circuit breaker
+    return isinstance(error, UpstreamUnavailable) or is_retryable(error)
+
+
+async def _generate_one(
+    backend,
+    semaphore: asyncio.Semaphore,
+    transcript: str,
+    report_language: str,
+    max_retries: int,
+    base_delay: float,
+    use_cache: bool,
+    compact: bool,
+) -> dict:
+    if not transcript or not transcript.strip():
+        return _empty_report("Transcript was empty")
+
+    cache = get_report_cache() if use_cache else None
+    key = report_cache_key(transcript, report_language, MODEL_NAME, _output_version(compact))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return _apply_stock_status(cached)
+
+    if estimate_tokens(transcript) > TRANSCRIPT_TOKEN_BUDGET:
+        # Map-reduce runs its own thread pool; hold one slot while it works
+        async with semaphore:
+            return await asyncio.to_thread(
+                generate_report_map_reduce, transcript, report_language, use_cache=use_cache, compact=compact
+            )
+
+    prefilled = prefilled_fields(pre_extract_transcript(transcript))
+    messages = _build_messages(transcript, report_language, prefilled=prefilled, compact=compact)
+    attempt = 0
+    while True:
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                result = await backend.achat(messages, model=MODEL_NAME, temperature=0.2)
+                elapsed = time.perf_counter() - started
+            break
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                return _empty_report(f"Error generating report: {str(e)}")
+            # Back off outside the semaphore so waiting items don't hold a slot
+            await asyncio.sleep(backoff_delay(attempt, base_delay, 60.0, e))
+            attempt += 1
+
+    try:
+        data = _parse_output(result.text, compact)
+        if data is None:
+            return _empty_report("Failed to parse AI response")
+        # JSON that isn't a report object (a list, a string plan...) fails here, for this item only
+        report = _normalize_report(data)
+    except Exception as e:
+        return _empty_report(f"Error generating report: {str(e)}")
+    if cache is not None:
+        cache.put(key, report, elapsed=elapsed)
+    return report
+
+
+async def generate_reports_batch(
+    transcripts: list,
+    language: str = "english",
+    max_concurrency: int = 8,
+    max_retries: int = 4,
+    base_delay: float = 1.0,
+    use_cache: bool = True,
+    compact: bool = None,
+) -> list:
+    """
+    Generate one report per transcript, at most `max_concurrency` in flight.
+
+    Returns a list aligned with `transcripts`. Items that still fail after
+    retrying come back as _empty_report dicts, with the message in "error" and
+    chief_complaint; the rest of the batch is unaffected.
+    """
+    backend = get_backend()
+    if backend is None:
+        return [_empty_report("OpenAI API key not configured") for _ in transcripts]
+
+    compact = COMPACT_OUTPUT if compact is None else compact
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    return await asyncio.gather(*[
+        _generate_one(backend, semaphore, transcript, language, max_retries, base_delay, use_cache, compact)
+        for transcript in transcripts
+    ])
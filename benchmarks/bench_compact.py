@@ -0,0 +1,130 @@
+"""
+Compact vs verbose report output: completion tokens and generation time.
+
+The completion is the mock server's canned report, written the way each
+prompt asks for it: verbose output carries every schema field (the history
+checklists as "false", anything else missing as "Not documented") as
+indented JSON; compact output is minified, uses the short key aliases and
+leaves empty fields out. Timing follows bench_long_transcript's simulated
+model (time to first token, prefill rate, decode rate), so fewer completion
+tokens show up directly as less time. Rows cover one full-report request and
+the five parallel section-group requests, and check that both modes
+normalize to a report with the same content.
+
+Token counts are exact with tiktoken installed; without it whitespace runs
+are collapsed before the character estimate, as BPE encodes an indentation
+run as about one token.
+
+    python benchmarks/bench_compact.py --decode-tps 80 --time-scale 0.05
+"""
+import argparse
+import copy
+import re
+import time
+
+from harness import result
+
+import summarizer
+import transcript_chunking
+from backends import ChatResult, set_backend
+from bench_long_transcript import SimulatedBackend, synthetic_transcript
+from compact_output import prune_empty
+from mock_openai_server import CANNED_REPORT, MockConfig, _MockState
+
+
+CHECKLISTS = ("past_medical_history", "family_history")
+
+
+def verbose_report() -> dict:
+    """CANNED_REPORT with every schema field filled in, as the verbose prompt asks"""
+    report = copy.deepcopy(CANNED_REPORT)
+    for section, fields in summarizer.OBJECT_FIELDS.items():
+        value = report.setdefault(section, {})
+        for field in fields:
+            if field not in value:
+                value[field] = "false" if section in CHECKLISTS and field != "other" else "Not documented"
+    return report
+
+
+def output_tokens(text: str) -> int:
+    if transcript_chunking._encoding() is None:
+        text = re.sub(r"\s+", " ", text)
+    return transcript_chunking.estimate_tokens(text)
+
+
+class CannedBackend(SimulatedBackend):
+    """SimulatedBackend timing, with the mock server's answer to the prompt as the completion"""
+
+    def __init__(self, time_scale: float, decode_tps: float, report: dict):
+        super().__init__(time_scale, decode_tps=decode_tps)
+        self._mock = _MockState(MockConfig(report=report))
+        self.completion_tokens = 0
+        self.output_chars = 0
+
+    def chat(self, messages, model, temperature=0.2):
+        prompt_tokens = sum(transcript_chunking.estimate_tokens(m["content"]) for m in messages)
+        content = self._mock.completion_for(messages)
+        completion_tokens = output_tokens(content)
+        seconds = self.ttft + prompt_tokens / self.prefill_tps + completion_tokens / self.decode_tps
+        self.completion_tokens += completion_tokens
+        self.output_chars += len(content)
+        time.sleep(seconds * self.time_scale)
+        return ChatResult(content, prompt_tokens, completion_tokens)
+
+
+def _content(report: dict) -> dict:
+    report = {k: v for k, v in report.items() if k != "patient_profile_updates"}
+    for med in report.get("medication_plan", []):
+        med.pop("stock_status", None)
+    return prune_empty(report)
+
+
+def run(decode_tps: float, time_scale: float, repeat: int) -> list:
+    transcript = synthetic_transcript(10 / 60)
+    report = verbose_report()
+    paths = {
+        "single": lambda compact: summarizer.generate_report(transcript, use_cache=False, compact=compact),
+        "parallel": lambda compact: summarizer.generate_report_parallel(transcript, use_cache=False, compact=compact),
+    }
+    rows, contents = [], {}
+    for path, generate in paths.items():
+        for mode in ("verbose", "compact"):
+            samples = []
+            for _ in range(repeat):
+                backend = CannedBackend(time_scale, decode_tps, report)
+                set_backend(backend)
+                started = time.perf_counter()
+                generated = generate(mode == "compact")
+                samples.append((time.perf_counter() - started) / time_scale)
+            contents[path, mode] = _content(copy.deepcopy(generated))
+            samples.sort()
+            rows.append((path, {
+                "mode": mode,
+                "decode_tps": decode_tps,
+                "completion_tokens": backend.completion_tokens,
+                "output_chars": backend.output_chars,
+                "same_content": contents[path, mode] == contents[path, "verbose"],
+            }, {"n": len(samples), "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+                "max_ms": round(samples[-1] * 1000, 1)}))
+    set_backend(None)
+    return rows
+
+
+def suite(quick: bool = False) -> list:
+    rows = run(decode_tps=80, time_scale=0.02, repeat=3 if quick else 5)
+    return [result("compact", name, stats, **params) for name, params, stats in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decode-tps", type=float, default=80)
+    parser.add_argument("--time-scale", type=float, default=0.05, help="fraction of simulated time actually slept")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for name, params, stats in run(args.decode_tps, args.time_scale, args.repeat):
+        print(f"{name:9s} {params['mode']:8s} {params['completion_tokens']:6d} tokens  {params['output_chars']:6d} chars  "
+              f"{stats['p50_ms'] / 1000:6.2f} s simulated  same content: {params['same_content']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cold-start import cost of the app's modules.
+
+Each sample is a fresh interpreter running `python -X importtime` on the
+modules app.py imports at startup, so nothing is warm in sys.modules. Rows
+report the cumulative import time of each project module, the total, and
+whether the heavy optional dependencies (openai, reportlab, docx) were
+pulled in at startup; they should only load when a feature uses them.
+
+    python benchmarks/bench_import.py            # top 15 imports of one cold start
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from harness import REPO, _percentile, result
+
+STARTUP_MODULES = [
+    "backends", "summarizer", "exports", "export_cache", "report_cache", "consultation_store", "jobs", "audio_upload",
+    "telemetry", "state_backend",
+]
+HEAVY_MODULES = ["openai", "reportlab", "docx"]
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile() -> list:
+    """(module, self_us, cumulative_us, depth) for one cold import of the startup modules"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import streamlit; import " + ", ".join(STARTUP_MODULES)],
+        cwd=REPO, capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONPATH=REPO),
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def _stats(samples_us: list) -> dict:
+    samples = sorted(us / 1000 for us in samples_us)
+    return {
+        "n": len(samples),
+        "p50_ms": round(_percentile(samples, 50), 2),
+        "p95_ms": round(_percentile(samples, 95), 2),
+        "mean_ms": round(sum(samples) / len(samples), 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+
+def suite(quick: bool = False) -> list:
+    samples = {}
+    loaded_heavy = set()
+    for _ in range(3 if quick else 10):
+        profile = import_profile()
+        project_total = 0
+        for module, _, cumulative_us, depth in profile:
+            if module in STARTUP_MODULES:
+                samples.setdefault(module, []).append(cumulative_us)
+                if depth == 0:
+                    # Nested project imports are already inside their importer's total
+                    project_total += cumulative_us
+            if module.split(".")[0] in HEAVY_MODULES:
+                loaded_heavy.add(module.split(".")[0])
+        samples.setdefault("project_total", []).append(project_total)
+        samples.setdefault("streamlit", []).append(next(c for m, _, c, _ in profile if m == "streamlit"))
+
+    heavy = ",".join(sorted(loaded_heavy)) or "none"
+    return [result("import", name, _stats(values), heavy_at_startup=heavy) for name, values in samples.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    profile = import_profile()
+    for module, self_us, cumulative_us, depth in sorted(profile, key=lambda row: -row[2])[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {self_us / 1000:7.1f} ms self  {'  ' * depth}{module}")
+
+
+if __name__ == "__main__":
+    main()
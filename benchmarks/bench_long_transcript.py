@@ -0,0 +1,138 @@
+"""
+Map-reduce extraction on synthetic multi-hour transcripts.
+
+Builds a doctor/patient transcript of the requested length, then measures
+token estimation, chunking, and generate_report_map_reduce end to end against
+a simulated backend whose latency follows prompt size and completion
+tokens (time to first token plus a fixed decode rate). The same backend is
+timed on a single request over the whole transcript for comparison.
+
+    python benchmarks/bench_long_transcript.py --hours 2 4 --time-scale 0.05
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import summarizer
+from backends import ChatResult, LLMBackend, set_backend
+from transcript_chunking import estimate_tokens, split_transcript
+
+
+WORDS_PER_MINUTE = 150
+DOCTOR_LINES = [
+    "How long have you had the {symptom}?",
+    "Is the {symptom} worse in the morning or the evening?",
+    "Your blood pressure today is {bp}. Any headaches or dizziness?",
+    "Are you still taking {drug} every day?",
+    "We will check your kidney function and HbA1c before the next visit.",
+]
+PATIENT_LINES = [
+    "The {symptom} started about {days} days ago and it keeps coming back after work.",
+    "I take {drug} in the morning, sometimes I forget the evening dose.",
+    "My father had diabetes and my mother has high blood pressure.",
+    "I drink four or five cups of coffee a day and I sleep badly.",
+    "Sometimes my vision is blurred and I am thirsty all the time.",
+]
+
+
+def synthetic_transcript(hours: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target_words = int(hours * 60 * WORDS_PER_MINUTE)
+    fill = {
+        "symptom": ["fatigue", "headache", "thirst", "chest tightness", "cough"],
+        "drug": ["metformin", "lisinopril", "atorvastatin", "amlodipine", "aspirin"],
+    }
+    paragraphs, words = [], 0
+    while words < target_words:
+        turns = []
+        for _ in range(rng.randint(3, 8)):
+            values = {
+                "symptom": rng.choice(fill["symptom"]),
+                "drug": rng.choice(fill["drug"]),
+                "bp": f"{rng.randint(110, 165)}/{rng.randint(70, 100)}",
+                "days": rng.randint(2, 30),
+            }
+            turns.append("Doctor: " + rng.choice(DOCTOR_LINES).format(**values))
+            turns.append("Patient: " + rng.choice(PATIENT_LINES).format(**values))
+        paragraph = "\n".join(turns)
+        paragraphs.append(paragraph)
+        words += len(paragraph.split())
+    return "\n\n".join(paragraphs)
+
+
+class SimulatedBackend(LLMBackend):
+    """Sleeps like a chat completion would, returns JSON for the keys the prompt asks for"""
+
+    def __init__(self, time_scale: float, ttft: float = 0.5, prefill_tps: float = 20000, decode_tps: float = 80):
+        self.time_scale = time_scale
+        self.ttft = ttft
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.simulated_seconds = 0.0
+
+    def chat(self, messages, model, temperature=0.2):
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        keys = re.findall(r'^  "(\w+)":', messages[0]["content"], re.M)
+        # Roughly 70 output tokens per requested section
+        content = json.dumps({key: "detail " * 60 for key in keys})
+        completion_tokens = estimate_tokens(content)
+        seconds = self.ttft + prompt_tokens / self.prefill_tps + completion_tokens / self.decode_tps
+        self.simulated_seconds += seconds
+        time.sleep(seconds * self.time_scale)
+        return ChatResult(content, prompt_tokens, completion_tokens)
+
+
+def run(hours_list, time_scale: float) -> list:
+    results = []
+    for hours in hours_list:
+        transcript = synthetic_transcript(hours)
+
+        started = time.perf_counter()
+        tokens = estimate_tokens(transcript)
+        estimate_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        chunks = split_transcript(transcript)
+        split_ms = (time.perf_counter() - started) * 1000
+
+        set_backend(SimulatedBackend(time_scale))
+        timings = {}
+        started = time.perf_counter()
+        summarizer.generate_report_map_reduce(transcript, timings=timings, use_cache=False)
+        map_reduce_seconds = (time.perf_counter() - started) / time_scale
+
+        single = SimulatedBackend(time_scale=0)
+        single.chat(summarizer._build_messages(transcript, "english"), model=summarizer.MODEL_NAME)
+
+        results.append({
+            "benchmark": "long_transcript",
+            "hours": hours,
+            "transcript_tokens": tokens,
+            "chunks": len(chunks),
+            "estimate_ms": round(estimate_ms, 2),
+            "split_ms": round(split_ms, 2),
+            "map_reduce_seconds": round(map_reduce_seconds, 2),
+            "single_request_seconds": round(single.simulated_seconds, 2),
+            "single_request_fits_context": tokens + 4000 < 128000,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, nargs="+", default=[2])
+    parser.add_argument("--time-scale", type=float, default=0.05,
+                        help="fraction of simulated API time actually slept")
+    args = parser.parse_args()
+    for result in run(args.hours, args.time_scale):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
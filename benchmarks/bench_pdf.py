@@ -0,0 +1,63 @@
+"""
+generate_professional_pdf on short and very long reports.
+
+The long report stretches the free-text fields the layout wraps (summary,
+HPI, reasoning, follow-up) to thousands of words. Wrapping is also timed on
+its own: the original per-word stringWidth loop against pdf_layout.wrap_text
+with a cold and a warm line cache.
+"""
+import copy
+
+from harness import result, timeit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from exports import generate_professional_pdf
+from pdf_layout import wrap_text
+from mock_openai_server import CANNED_REPORT
+
+
+def long_report(words: int) -> dict:
+    report = copy.deepcopy(CANNED_REPORT)
+    filler = ("The patient describes intermittent fatigue that worsens after work and improves with rest. " * (words // 14 + 1))
+    report["history_of_present_illness"] = filler
+    report["clinical_assessment"]["reasoning"] = filler
+    report["conversation_overview"]["conversation_summary"] = filler
+    report["follow_up"] = filler
+    return report
+
+
+def legacy_wrap(text: str, font: str, size: float, max_width: float, max_lines: int) -> list:
+    # draw_compact_text before pdf_layout, minus the drawing
+    lines, line = [], ""
+    for word in text.split():
+        test_line = line + word + " "
+        if stringWidth(test_line, font, size) < max_width:
+            line = test_line
+        else:
+            if line and len(lines) < max_lines:
+                lines.append(line.strip())
+            line = word + " "
+    if line and len(lines) < max_lines:
+        lines.append(line.strip())
+    return lines
+
+
+def _cold_wrap(text: str):
+    wrap_text.cache_clear()
+    return wrap_text(text, "Helvetica", 7, 472, None)
+
+
+def suite(quick: bool = False) -> list:
+    repeat = 5 if quick else 20
+    rows = [result("pdf", "render", timeit(lambda: generate_professional_pdf(CANNED_REPORT, "Dr. Bench"), repeat), words=0)]
+    for words in ([1000, 5000] if quick else [1000, 5000, 20000]):
+        report = long_report(words)
+        text = report["history_of_present_illness"]
+        rows += [
+            result("pdf", "render", timeit(lambda: generate_professional_pdf(report, "Dr. Bench"), repeat), words=words),
+            # Full paragraph, no line limit, so every word is laid out
+            result("pdf", "wrap_legacy", timeit(lambda: legacy_wrap(text, "Helvetica", 7, 472, 10 ** 9), repeat), words=words),
+            result("pdf", "wrap_cold", timeit(lambda: _cold_wrap(text), repeat), words=words),
+            result("pdf", "wrap_cached", timeit(lambda: wrap_text(text, "Helvetica", 7, 472, None), repeat), words=words),
+        ]
+    return rows
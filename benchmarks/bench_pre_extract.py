@@ -0,0 +1,67 @@
+"""
+Local pre-extraction of measurements and drug mentions.
+
+Times extract_measurements, the catalogue drug scan and the whole
+pre_extract call on a single consultation (English and Arabic) and on
+synthetic multi-hour transcripts, and reports how many readings were found.
+This runs before the report request, so it should stay in the low
+milliseconds for an ordinary consultation.
+
+    python benchmarks/bench_pre_extract.py --hours 1 4
+"""
+import argparse
+
+from harness import result, timeit
+from bench_long_transcript import synthetic_transcript
+
+from medication_catalogue import get_medication_catalogue
+from pre_extract import extract_measurements, extract_medications, pre_extract
+
+
+CONSULTATION = (
+    "Doctor: Good morning. Your blood pressure is 142/91 today, pulse 88 and temperature 37.4 °C. "
+    "Oxygen saturation 97%, respiratory rate 16. You weigh 82 kg and you're 1.75 m tall.\n"
+    "Patient: I'm 54 years old and I still take metformin 500 mg twice a day, and atorvastatin at night.\n"
+    "Doctor: We'll add lisinopril 10 mg and check again on 12/05.\n"
+)
+CONSULTATION_AR = (
+    "الطبيب: ضغط الدم ١٤٠/٩٠ والنبض ٧٦ والحرارة ٣٧٫٢ درجة. الوزن ٧٩ كيلو والطول ١٧٠ سم.\n"
+    "المريض: عمري ٦١ سنة وآخذ ميتفورمين صباحاً ومساءً.\n"
+)
+
+
+def _found(transcript: str) -> int:
+    return sum(len(values) for fields in extract_measurements(transcript).values() for values in fields.values())
+
+
+def run(hours_list, repeat: int) -> list:
+    catalogue = get_medication_catalogue()
+    samples = [("consultation_en", CONSULTATION), ("consultation_ar", CONSULTATION_AR)]
+    samples += [(f"{hours:g}h", synthetic_transcript(hours)) for hours in hours_list]
+    rows = []
+    for label, transcript in samples:
+        params = {"transcript": label, "chars": len(transcript), "readings": _found(transcript),
+                  "medications": len(extract_medications(transcript, catalogue))}
+        rows += [
+            ("measurements", params, timeit(lambda: extract_measurements(transcript), repeat)),
+            ("medications", params, timeit(lambda: extract_medications(transcript, catalogue), repeat)),
+            ("pre_extract", params, timeit(lambda: pre_extract(transcript, catalogue), repeat)),
+        ]
+    return rows
+
+
+def suite(quick: bool = False) -> list:
+    rows = run([1] if quick else [1, 4], repeat=5 if quick else 20)
+    return [result("pre_extract", name, stats, **params) for name, params, stats in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+    for name, params, stats in run(args.hours, repeat=10):
+        print(f"{name:14s} {stats['p50_ms']:9.2f} ms  {params}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Audio preprocessing before transcription.
+
+Synthesizes a 48 kHz stereo 16-bit WAV like the browser recorder produces:
+speech-like bursts (a voiced tone with a syllable-rate envelope) separated by
+quiet pauses of up to eight seconds, as when the doctor examines the patient.
+Times preprocess_audio itself, reports the size reduction, and times a
+transcription against the mock server throttled to a typical clinic uplink
+with and without preprocessing.
+
+    python benchmarks/bench_preprocess.py --minutes 5 20 --uplink-mbps 8
+"""
+import argparse
+import io
+import wave
+
+import numpy as np
+from harness import result, timeit
+
+from audio_preprocess import preprocess_audio
+from backends import OpenAIBackend
+from mock_openai_server import MockConfig, start_mock_server
+
+
+def synthetic_recording(minutes: float, rate: int = 48000, channels: int = 2, seed: int = 1) -> bytes:
+    rng = np.random.default_rng(seed)
+    parts, total = [], 0
+    while total < rate * 60 * minutes:
+        n = int(rate * rng.uniform(1, 4))
+        t = np.arange(n) / rate
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+        pitch = rng.uniform(100, 250)
+        speech = 0.2 * envelope * (np.sin(2 * np.pi * pitch * t) + 0.5 * np.sin(4 * np.pi * pitch * t)
+                                   + 0.1 * rng.standard_normal(n))
+        pause = 0.001 * rng.standard_normal(int(rate * rng.uniform(0.3, 8)))
+        parts += [speech, pause]
+        total += n + len(pause)
+    pcm = (np.clip(np.concatenate(parts), -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(np.repeat(pcm[:, None], channels, axis=1).tobytes())
+    return buffer.getvalue()
+
+
+def run(minutes_list, uplink_mbps: float, repeat: int) -> list:
+    _, base_url = start_mock_server(MockConfig(latency="fixed:0", transcribe_bytes_per_second=uplink_mbps * 1e6 / 8))
+    backend = OpenAIBackend("mock", base_url=base_url)
+    rows = []
+    for minutes in minutes_list:
+        data = synthetic_recording(minutes)
+        processed, name, stats = preprocess_audio(data, "recording.wav")
+        params = {"minutes": minutes, "input_mb": round(len(data) / 1e6, 1), "output_mb": round(len(processed) / 1e6, 2)}
+        rows.append(("preprocess", params, timeit(lambda: preprocess_audio(data, "recording.wav"), repeat, warmup=1)))
+        for label, payload, filename in (("transcribe_raw", data, "recording.wav"), ("transcribe_preprocessed", processed, name)):
+            stats = timeit(lambda: backend.transcribe((filename, payload)), repeat=1, warmup=0)
+            rows.append((label, {**params, "uplink_mbps": uplink_mbps}, stats))
+    return rows
+
+
+def suite(quick: bool = False) -> list:
+    rows = run([2] if quick else [5, 20], uplink_mbps=50, repeat=3 if quick else 5)
+    return [result("preprocess", name, stats, **params) for name, params, stats in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 20])
+    parser.add_argument("--uplink-mbps", type=float, default=8)
+    args = parser.parse_args()
+    for name, params, stats in run(args.minutes, args.uplink_mbps, repeat=3):
+        print(f"{name:24s} {stats['p50_ms']:9.1f} ms  {params}")
+
+
+if __name__ == "__main__":
+    main()
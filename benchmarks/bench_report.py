@@ -0,0 +1,43 @@
+"""
+generate_report hot path, stage by stage.
+
+The request goes to the in-process mock server with zero added latency, so
+the "request" stage is SDK + HTTP overhead only. The other stages are the
+local work around it: prompt build, JSON parse (direct and the brace-scan
+fallback taken for fenced output), and normalization with stock checks.
+"""
+import copy
+import json
+
+from harness import result, timeit
+
+import summarizer
+from backends import OpenAIBackend, set_backend
+from bench_long_transcript import synthetic_transcript
+from mock_openai_server import MockConfig, start_mock_server
+
+
+def suite(quick: bool = False) -> list:
+    repeat = 10 if quick else 50
+    server, base_url = start_mock_server(MockConfig(latency="fixed:0"))
+    backend = OpenAIBackend("mock", base_url=base_url)
+    set_backend(backend)
+
+    # About a 10-minute consultation
+    transcript = synthetic_transcript(10 / 60)
+    messages = summarizer._build_messages(transcript, "english")
+    raw = backend.chat(messages, model=summarizer.MODEL_NAME).text
+    fenced = f"Here is the report:\n```json\n{raw}\n```"
+    data = json.loads(raw)
+
+    rows = [
+        result("report", "prompt_build", timeit(lambda: summarizer._build_messages(transcript, "english"), repeat * 10)),
+        result("report", "request", timeit(lambda: backend.chat(messages, model=summarizer.MODEL_NAME), repeat)),
+        result("report", "parse_json", timeit(lambda: summarizer._parse_report_json(raw), repeat * 10)),
+        result("report", "parse_fallback", timeit(lambda: summarizer._parse_report_json(fenced), repeat * 10)),
+        result("report", "normalize", timeit(lambda: summarizer._normalize_report(copy.deepcopy(data)), repeat * 10)),
+        result("report", "end_to_end", timeit(lambda: summarizer.generate_report(transcript, use_cache=False), repeat)),
+    ]
+    server.shutdown()
+    set_backend(None)
+    return rows
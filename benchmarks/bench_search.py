@@ -0,0 +1,135 @@
+"""
+Full-text search over stored consultations.
+
+Fills a consultation store with synthetic bilingual consultations (English
+and Arabic transcripts, a report with complaint, history, assessment and a
+medication plan drawn from the bundled catalogue) through the normal
+batched writer, then times ranked searches: a rare drug + symptom
+combination, a drug prescribed in ~1 in 20 consultations (also limited to
+one doctor), an Arabic word typed without the article, a phrase and a
+prefix. Built stores are kept in the temp directory and reused by later
+runs of the same size; the million-row one takes about 2 GB and a few
+minutes to build.
+
+    python benchmarks/bench_search.py --consultations 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from harness import REPO, result, timeit
+
+from consultation_store import ConsultationStore
+
+
+SYMPTOMS_EN = [
+    "headache", "fatigue", "cough", "fever", "nausea", "dizziness", "chest pain", "shortness of breath",
+    "back pain", "joint pain", "abdominal pain", "frequent urination", "excessive thirst", "palpitations",
+]
+SYMPTOMS_AR = ["صداع", "تعب", "سعال", "حمى", "غثيان", "دوخة", "ألم في الصدر", "ضيق في التنفس", "ألم في الظهر"]
+# Rare on purpose: the "find the needle" query
+RARE_SYMPTOM = "blurred vision"
+FILLER_EN = ("the patient says it started last week and gets worse at night no relevant family history "
+             "takes medication regularly denies smoking works as a teacher sleeps poorly").split()
+FILLER_AR = "المريض يقول إن الأعراض بدأت منذ أسبوع وتزداد في الليل لا يوجد تاريخ عائلي ويعمل مدرسا".split()
+QUERIES = {
+    "rare_combination": "empagliflozin blurred vision",
+    "common_drug": "metformin",
+    "arabic_without_article": "الصداع",
+    "phrase": '"chest pain"',
+    "prefix": "empag*",
+}
+
+
+def _drugs() -> list:
+    with open(os.path.join(REPO, "data", "medications.csv"), encoding="utf-8") as f:
+        return [(row["name"], row["arabic_names"].split("|")[0]) for row in csv.DictReader(f)]
+
+
+def synthetic_consultation(rng: random.Random, drugs: list) -> tuple:
+    """(transcript, report) for one made-up consultation"""
+    drug, drug_ar = rng.choice(drugs)
+    arabic = rng.random() < 0.4
+    symptoms = rng.sample(SYMPTOMS_AR if arabic else SYMPTOMS_EN, 2)
+    if not arabic and rng.random() < 0.01:
+        symptoms[1] = RARE_SYMPTOM
+    filler = FILLER_AR if arabic else FILLER_EN
+    words = rng.choices(filler, k=40)
+    words[5:5] = ("يشكو من " if arabic else "complains of ").split() + [symptoms[0]]
+    words[20:20] = (["و"] if arabic else ["and"]) + [symptoms[1]]
+    words.append(drug_ar if arabic else drug)
+    report = {
+        "patient_name": f"Patient {rng.randrange(100000)}",
+        "chief_complaint": f"{symptoms[0]}, {symptoms[1]}",
+        "history_of_present_illness": " ".join(rng.choices(filler, k=20)),
+        "clinical_assessment": {"suspected_diagnosis": rng.choice(["T2DM", "Hypertension", "Migraine", "URTI"]),
+                                "reasoning": " ".join(rng.choices(filler, k=10))},
+        "medication_plan": [{"name": drug}],
+    }
+    return " ".join(words), report
+
+
+def build_store(count: int, rebuild: bool = False) -> tuple:
+    """(store, rows per second while building, or None when an existing store was reused)"""
+    path = os.path.join(tempfile.gettempdir(), f"mednote_bench_search_{count}.sqlite3")
+    if rebuild:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    store = ConsultationStore(path, batch_size=1000)
+    existing = store.stats()["consultations"]
+    if existing >= count:
+        return store, None
+
+    rng = random.Random(count)
+    drugs = _drugs()
+    started = time.perf_counter()
+    for i in range(existing, count):
+        transcript, report = synthetic_consultation(rng, drugs)
+        store.save(f"bench{i:08d}", f"Dr {i % 25}", transcript, report)
+        if i % 10000 == 0:
+            # Keep the write queue (and memory) bounded
+            store.flush()
+    store.flush()
+    return store, round((count - existing) / (time.perf_counter() - started))
+
+
+def suite(quick: bool = False) -> list:
+    rows = []
+    for count in ([20000] if quick else [100000, 1000000]):
+        store, rate = build_store(count)
+        params = {"consultations": count}
+        if rate is not None:
+            rows.append(result("search", "index_rows_per_s", {"rows_per_s": rate}, **params))
+        for name, query in QUERIES.items():
+            stats = timeit(lambda: store.search(query, limit=20), repeat=10 if quick else 30)
+            rows.append(result("search", name, stats, **params))
+        stats = timeit(lambda: store.search(QUERIES["common_drug"], doctor="Dr 3", limit=20), repeat=10 if quick else 30)
+        rows.append(result("search", "common_drug_one_doctor", stats, **params))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--consultations", type=int, default=100000)
+    parser.add_argument("--rebuild", action="store_true", help="discard a stored index of this size")
+    parser.add_argument("query", nargs="*", help="run this query instead of the standard set")
+    args = parser.parse_args()
+
+    store, rate = build_store(args.consultations, args.rebuild)
+    if rate is not None:
+        print(f"indexed {args.consultations} consultations at {rate} rows/s")
+    queries = {"query": " ".join(args.query)} if args.query else QUERIES
+    for name, query in queries.items():
+        stats = timeit(lambda: store.search(query, limit=20), repeat=20)
+        hits = store.search(query, limit=3)
+        print(f"{name:24s} p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  {query}")
+        for hit in hits:
+            print(f"    {hit['score']:7.2f}  {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
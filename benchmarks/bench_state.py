@@ -0,0 +1,88 @@
+"""
+Shared session state: read and write latency per backend.
+
+The value is what app.py stores for an open consultation: the canned report,
+a transcript of the requested length and the job bookkeeping. Reads happen
+once per new session (a refresh, a restart, a reconnect to another
+replica) and writes on every change, so both should stay well under a
+millisecond next to a Streamlit rerun. The Redis backend talks to
+mock_redis_server.py over loopback, optionally with added per-command
+latency to mimic a network hop. Rows also record the JSON and packed sizes.
+
+    python benchmarks/bench_state.py --minutes 5 60 --redis-latency-ms 0.5
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from harness import result, timeit
+
+from mock_openai_server import CANNED_REPORT
+from mock_redis_server import start_mock_redis_server
+from state_backend import InProcessStateBackend, RedisStateBackend, SQLiteStateBackend, pack
+
+from bench_long_transcript import synthetic_transcript
+
+
+def consultation(minutes: float) -> dict:
+    return {
+        "id": "0" * 32,
+        "doctor": "Dr. Nayef",
+        "transcript": synthetic_transcript(minutes / 60),
+        "report": CANNED_REPORT,
+        "language": "english",
+        "state": {
+            "report_cursor": ["english", 0],
+            "timings": {"stream": 4.2, "total": 4.4},
+            "transcription_jobs": ["a1b2c3d4e5f6", "0f1e2d3c4b5a"],
+            "transcribed": 2,
+            "report_job": "9a8b7c6d5e4f",
+            "report_applied": "9a8b7c6d5e4f",
+        },
+    }
+
+
+def run(minutes_list, redis_latency_ms: float, repeat: int) -> list:
+    _, url = start_mock_redis_server(latency=redis_latency_ms / 1000)
+    directory = tempfile.mkdtemp(prefix="mednote-state-")
+    backends = {
+        "memory": InProcessStateBackend(),
+        "sqlite": SQLiteStateBackend(os.path.join(directory, "state.sqlite3")),
+        "redis": RedisStateBackend(url),
+    }
+    rows = []
+    for minutes in minutes_list:
+        value = consultation(minutes)
+        params = {
+            "minutes": minutes,
+            "json_bytes": len(json.dumps(value, ensure_ascii=False).encode("utf-8")),
+            "packed_bytes": len(pack(value)),
+        }
+        rows.append(("pack", params, timeit(lambda: pack(value), repeat)))
+        for name, backend in backends.items():
+            backend.set("bench", value)
+            backend_params = {**params, "backend": name}
+            if name == "redis":
+                backend_params["latency_ms"] = redis_latency_ms
+            rows.append(("write", backend_params, timeit(lambda: backend.set("bench", value), repeat)))
+            rows.append(("read", backend_params, timeit(lambda: backend.get("bench"), repeat)))
+    return rows
+
+
+def suite(quick: bool = False) -> list:
+    rows = run([5] if quick else [5, 60], redis_latency_ms=0, repeat=200 if quick else 1000)
+    return [result("state", name, stats, **params) for name, params, stats in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 60])
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    for name, params, stats in run(args.minutes, args.redis_latency_ms, repeat=500):
+        print(f"{name:6s} {stats['p50_ms']:8.3f} ms (p95 {stats['p95_ms']:.3f})  {params}")
+
+
+if __name__ == "__main__":
+    main()
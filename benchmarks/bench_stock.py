@@ -0,0 +1,69 @@
+"""
+Medication stock checks over large catalogues.
+
+Builds synthetic catalogues of increasing size, each entry with two brand
+spellings, and times catalogue construction, exact and embedded-name
+lookups, misses, and a batched check of a whole medication plan. The original
+substring scan over a stock dict is timed on the same names for comparison.
+"""
+import random
+
+from harness import result, timeit
+
+from medication_catalogue import MedicationCatalogue
+
+
+SYLLABLES = ["met", "for", "min", "glip", "zi", "de", "lo", "sar", "tan", "am", "lo", "di", "pine", "ator", "va",
+             "sta", "tin", "ce", "pha", "lex", "azi", "thro", "my", "cin", "pra", "zo", "le", "xa", "ban"]
+CLASSES = ["statin", "ACE inhibitor", "SGLT2 inhibitor", "macrolide antibiotic", "NSAID", "beta blocker",
+           "proton pump inhibitor", "calcium channel blocker"]
+
+
+def synthetic_rows(count: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    rows, seen = [], set()
+    while len(rows) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5)))
+        if name in seen:
+            continue
+        seen.add(name)
+        rows.append({
+            "name": name,
+            "generic_name": name,
+            "brand_names": f"{name[:4].title()}ex|{name[-4:].title()}a",
+            "arabic_names": "",
+            "therapeutic_class": rng.choice(CLASSES),
+            "in_stock": "1" if rng.random() > 0.2 else "0",
+            "alternative": "",
+        })
+    return rows
+
+
+def legacy_check(stock: dict, medication_name: str) -> dict:
+    # The scan check_medication_stock used before the catalogue
+    med_lower = medication_name.lower().strip()
+    for stock_med, available in stock.items():
+        if stock_med in med_lower or med_lower in stock_med:
+            return {"in_stock": available, "alternative": None}
+    return {"in_stock": True, "alternative": None}
+
+
+def suite(quick: bool = False) -> list:
+    rows_out = []
+    for size in ([1000, 10000] if quick else [1000, 10000, 50000]):
+        rows = synthetic_rows(size)
+        catalogue = MedicationCatalogue(rows=rows)
+        stock = {row["name"]: row["in_stock"] == "1" for row in rows}
+        last = rows[-1]["name"]
+        plan = [f"{rows[i]['name'].title()} 500 mg tablets" for i in range(0, size, size // 6)][:6]
+
+        params = {"catalogue_size": size}
+        rows_out += [
+            result("stock", "build_index", timeit(lambda: MedicationCatalogue(rows=rows), 3, 0), **params),
+            result("stock", "exact_lookup", timeit(lambda: catalogue.check(last), 1000), **params),
+            result("stock", "embedded_lookup", timeit(lambda: catalogue.check(f"Start {last.title()} 10mg daily"), 1000), **params),
+            result("stock", "miss", timeit(lambda: catalogue.check("unknown drug 5 mg"), 1000), **params),
+            result("stock", "check_plan", timeit(lambda: catalogue.check_many(plan), 500), **params),
+            result("stock", "legacy_scan_plan", timeit(lambda: [legacy_check(stock, name) for name in plan], 20), **params),
+        ]
+    return rows_out
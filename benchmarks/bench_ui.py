@@ -0,0 +1,171 @@
+"""
+Server CPU per UI interaction with many concurrent sessions.
+
+Starts `streamlit run` on a wrapper that seeds every session with the mock
+report and transcript, opens N browser-like websocket sessions and has each
+flip the "Parallel extraction" toggle in the results panel K times. The
+server process's CPU time (from /proc) over the interaction phase is divided
+by the number of interactions. Pass --app to measure another version of
+app.py, e.g. one from before the panels became fragments:
+
+    git show HEAD~1:app.py > /tmp/app_before.py
+    python benchmarks/bench_ui.py --app /tmp/app_before.py --sessions 20
+    python benchmarks/bench_ui.py --sessions 20
+
+Needs the `websockets` package and Linux /proc.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TOGGLE_LABEL = "⚡ Parallel extraction"
+WRAPPER = '''
+import copy, runpy, sys
+sys.path.insert(0, {repo!r})
+import streamlit as st
+from mock_openai_server import CANNED_REPORT, CANNED_TRANSCRIPT
+if "report" not in st.session_state:
+    st.session_state.report = copy.deepcopy(CANNED_REPORT)
+    st.session_state.full_transcript = CANNED_TRANSCRIPT
+    st.session_state.report_cursor = ("english", len(CANNED_TRANSCRIPT))
+runpy.run_path({app!r}, run_name="__main__")
+'''
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime, fields 14 and 15 of the full line
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_server(app_path: str, port: int):
+    wrapper = tempfile.NamedTemporaryFile("w", suffix=".py", delete=False)
+    wrapper.write(WRAPPER.format(repo=os.path.abspath(REPO), app=os.path.abspath(app_path)))
+    wrapper.close()
+    env = dict(os.environ, MEDNOTE_BACKEND="mock")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", wrapper.name, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return process, wrapper.name
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("streamlit server did not start")
+
+
+class Session:
+    """Just enough of the browser client to run the script and click a widget"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.toggle = None
+
+    async def rerun(self, widget_states=(), fragment_id: str = ""):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.widget_states.widgets.extend(widget_states)
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                if element.WhichOneof("type") == "checkbox" and element.checkbox.label == TOGGLE_LABEL:
+                    self.toggle = (element.checkbox.id, forward.delta.fragment_id)
+            elif kind == "script_finished":
+                return
+
+    async def flip_toggle(self, value: bool):
+        widget_id, fragment_id = self.toggle
+        state = WidgetState(id=widget_id, bool_value=value)
+        await self.rerun([state], fragment_id)
+
+
+async def _session(url: str, clicks: int, latencies: list, ready: asyncio.Event, loaded: list):
+    async with websockets.connect(url, max_size=None) as ws:
+        session = Session(ws)
+        await session.rerun()
+        loaded.append(session)
+        await ready.wait()
+        for i in range(clicks):
+            started = time.perf_counter()
+            await session.flip_toggle(i % 2 == 0)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def _drive(port: int, pid: int, sessions: int, clicks: int) -> dict:
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    latencies, loaded = [], []
+    ready = asyncio.Event()
+    tasks = [asyncio.create_task(_session(url, clicks, latencies, ready, loaded)) for _ in range(sessions)]
+    while len(loaded) < sessions:
+        await asyncio.sleep(0.05)
+    if loaded[0].toggle is None:
+        raise RuntimeError("toggle not found; is the app showing the results panel?")
+    cpu_before, started = _cpu_seconds(pid), time.perf_counter()
+    ready.set()
+    await asyncio.gather(*tasks)
+    cpu = _cpu_seconds(pid) - cpu_before
+    latencies.sort()
+    interactions = sessions * clicks
+    return {
+        "interactions": interactions,
+        "fragment_scoped": bool(loaded[0].toggle[1]),
+        "cpu_ms_per_interaction": round(cpu * 1000 / interactions, 2),
+        "wall_seconds": round(time.perf_counter() - started, 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+    }
+
+
+def run(app_path: str, sessions: int, clicks: int) -> dict:
+    port = _free_port()
+    process, wrapper = start_server(app_path, port)
+    try:
+        stats = asyncio.run(_drive(port, process.pid, sessions, clicks))
+    finally:
+        process.terminate()
+        process.wait(10)
+        os.unlink(wrapper)
+    return {"benchmark": "ui", "app": os.path.basename(app_path), "sessions": sessions, **stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(REPO, "app.py"))
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.app, args.sessions, args.clicks)))
+
+
+if __name__ == "__main__":
+    main()
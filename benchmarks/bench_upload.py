@@ -0,0 +1,122 @@
+"""
+Peak memory and time of the transcription upload path.
+
+Compares the original path in transcribe_audio (read the whole upload, write
+a .wav NamedTemporaryFile, reopen it for the API call) against
+audio_upload.open_upload. The API client is replaced by a consumer that reads
+the file in 64 KB chunks, the way the HTTP layer streams a multipart body.
+
+    python benchmarks/bench_upload.py --sizes 1 16 64 200
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from audio_upload import open_upload
+
+
+class _PipeReader(io.RawIOBase):
+    """Non-seekable reader, like a socket or subprocess pipe"""
+
+    name = "consultation.m4a"
+
+    def __init__(self, payload: bytes):
+        self._view = memoryview(payload)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self._view) - self._pos)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _consume(fileobj):
+    while fileobj.read(64 * 1024):
+        pass
+
+
+def legacy_upload(audio_file) -> int:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
+        tmp_file.write(audio_file.read())
+        tmp_path = tmp_file.name
+    disk_bytes = os.path.getsize(tmp_path)
+    with open(tmp_path, "rb") as audio:
+        _consume(audio)
+    os.unlink(tmp_path)
+    return disk_bytes
+
+
+def spooled_upload(audio_file) -> int:
+    with open_upload(audio_file) as (_, fileobj):
+        _consume(fileobj)
+        rolled = getattr(fileobj, "_rolled", False)
+        return fileobj.tell() if rolled else 0
+
+
+def measure(fn, audio_file) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    disk_bytes = fn(audio_file)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "peak_bytes": peak, "disk_bytes": disk_bytes}
+
+
+def run(sizes_mb) -> list:
+    results = []
+    for size_mb in sizes_mb:
+        payload = os.urandom(int(size_mb * 1024 * 1024))
+        with tempfile.NamedTemporaryFile(suffix=".m4a") as source_file:
+            source_file.write(payload)
+            source_file.flush()
+            for source in ("buffer", "disk", "pipe"):
+                for name, fn in (("legacy", legacy_upload), ("spooled", spooled_upload)):
+                    if source == "buffer":
+                        # What Streamlit hands over for uploads and recordings
+                        audio_file = io.BytesIO(payload)
+                        audio_file.name = "consultation.m4a"
+                    elif source == "disk":
+                        audio_file = open(source_file.name, "rb")
+                    else:
+                        audio_file = _PipeReader(payload)
+                    with audio_file:
+                        results.append({
+                            "benchmark": "upload", "path": name, "source": source, "size_mb": size_mb,
+                            **measure(fn, audio_file),
+                        })
+    return results
+
+
+def suite(quick: bool = False) -> list:
+    from harness import result
+
+    rows = []
+    for row in run([1, 16] if quick else [1, 16, 64, 200]):
+        stats = {"n": 1, "p50_ms": round(row["seconds"] * 1000, 4), "p95_ms": round(row["seconds"] * 1000, 4),
+                 "peak_traced_bytes": row["peak_bytes"], "disk_bytes": row["disk_bytes"]}
+        rows.append(result("upload", row["path"], stats, source=row["source"], size_mb=row["size_mb"]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 16, 64])
+    args = parser.parse_args()
+    for result in run(args.sizes):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
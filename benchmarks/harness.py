@@ -0,0 +1,51 @@
+"""
+Shared timing helpers for the benchmark suites.
+
+Every suite module exposes `suite(quick: bool) -> list[dict]`; each dict is one
+result row built with `result()`. run.py executes suites in separate processes
+so the peak RSS recorded for a suite is its own.
+"""
+import math
+import os
+import resource
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+
+def _percentile(sorted_samples: list, pct: float) -> float:
+    # Nearest-rank percentile
+    index = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+def timeit(fn, repeat: int = 20, warmup: int = 2) -> dict:
+    """Run fn repeatedly and summarize wall time in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "n": repeat,
+        "p50_ms": round(_percentile(samples, 50), 4),
+        "p95_ms": round(_percentile(samples, 95), 4),
+        "mean_ms": round(sum(samples) / len(samples), 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def result(suite: str, name: str, stats: dict, **params) -> dict:
+    return {"suite": suite, "name": name, **params, **stats, "peak_rss_mb": peak_rss_mb()}
@@ -0,0 +1,117 @@
+"""
+Run the benchmark suites and record p50/p95 latency and peak RSS.
+
+Each suite runs in its own interpreter so its peak RSS is not inflated by the
+suites before it. Everything runs offline: report requests go to the
+in-process mock server.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --quick --suites stock pdf
+    python benchmarks/run.py --output new.json --compare results.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+SUITES = {
+    "report": "bench_report",
+    "stock": "bench_stock",
+    "pdf": "bench_pdf",
+    "upload": "bench_upload",
+    "import": "bench_import",
+    "search": "bench_search",
+    "preprocess": "bench_preprocess",
+    "pre_extract": "bench_pre_extract",
+    "state": "bench_state",
+    "compact": "bench_compact",
+}
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_suite(name: str, quick: bool) -> list:
+    code = (
+        "import json, sys\n"
+        f"sys.path.insert(0, {HERE!r})\n"
+        f"import {SUITES[name]} as suite_module\n"
+        f"print(json.dumps(suite_module.suite(quick={quick!r})))\n"
+    )
+    env = dict(os.environ, MEDNOTE_BACKEND="mock")
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=False)
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise SystemExit(f"suite {name} failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _row_key(row: dict) -> tuple:
+    skip = {"n", "p50_ms", "p95_ms", "mean_ms", "max_ms", "peak_rss_mb", "peak_traced_bytes", "disk_bytes", "rows_per_s"}
+    return tuple(sorted((k, str(v)) for k, v in row.items() if k not in skip))
+
+
+def compare(results: list, previous: list, threshold: float) -> list:
+    """Rows whose p50 or peak RSS grew by more than threshold (a fraction)"""
+    baseline = {_row_key(row): row for row in previous}
+    regressions = []
+    for row in results:
+        old = baseline.get(_row_key(row))
+        if not old:
+            continue
+        for metric in ("p50_ms", "peak_rss_mb"):
+            if old.get(metric) and row.get(metric, 0) > old[metric] * (1 + threshold):
+                regressions.append({
+                    "suite": row["suite"], "name": row["name"], "metric": metric,
+                    "before": old[metric], "after": row[metric],
+                    "change": round(row[metric] / old[metric] - 1, 3),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES), default=list(SUITES))
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and fewer repeats")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="previous results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative growth before a row is flagged")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.suites:
+        started = time.perf_counter()
+        rows = run_suite(name, args.quick)
+        results.extend(rows)
+        print(f"{name}: {len(rows)} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for row in rows:
+            print(json.dumps(row))
+
+    document = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+        regressions = compare(results, previous, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + json.dumps(regression), file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Short key aliases for compact report output.
+
+Output tokens dominate report latency, and a verbose report spends many of
+them on long key names and on placeholders ("Not documented", "false", "")
+for every field the consultation never touched. In compact mode the model
+writes minified JSON with the aliases below and leaves empty fields out;
+expand_keys() restores the report key names and summarizer's normalization
+fills the missing fields back in, so callers always get the full shape.
+
+Aliases are unique across all levels, so expansion is a plain recursive
+rename that needs no knowledge of where a key sits.
+"""
+import re
+
+
+COMPACT_KEYS = {
+    "conversation_overview": "co", "what_patient_said": "ps", "what_doctor_observed": "ob", "conversation_summary": "cs",
+    "patient_name": "pn",
+    "demographics": "dm", "age": "ag", "gender": "gn", "weight": "wt", "height": "ht", "contact": "ct",
+    "chief_complaint": "cc",
+    "history_of_present_illness": "hpi",
+    "past_medical_history": "pmh", "diabetes": "dia", "hypertension": "htn", "asthma": "ast", "heart_failure": "hf",
+    "hypothyroidism": "hyt", "hyperlipidemia": "hld", "kidney_disease": "ckd", "liver_disease": "liv", "copd": "cop",
+    "cancer": "cn", "other": "oth",
+    "past_surgical_history": "psh",
+    "current_medications": "cm", "name": "n", "dose": "d", "frequency": "f", "duration": "du",
+    "allergies": "al", "drug_allergies": "da", "reactions": "rx",
+    "vital_signs": "vs", "blood_pressure": "bp", "heart_rate": "hr", "respiratory_rate": "rr", "temperature": "tp",
+    "oxygen_saturation": "o2",
+    "physical_examination": "pe",
+    "lab_results": "lab", "mentioned": "mn", "details": "dt",
+    "social_history": "sh", "smoking": "smk", "alcohol": "alc", "physical_activity": "pa", "diet": "di",
+    "occupation": "oc", "sleep": "sl",
+    "family_history": "fh", "heart_disease": "hd",
+    "clinical_assessment": "as", "suspected_diagnosis": "dx", "differential_diagnosis": "ddx", "reasoning": "rs",
+    "recommended_workup": "wu",
+    "medication_plan": "mp", "instructions": "in", "guideline_basis": "gb",
+    "safety_checks": "sc",
+    "contraindications_checked": "ci",
+    "alternative_if_contraindicated": "alt",
+    "follow_up": "fu",
+    "doctor_advisory_missing_questions": "mq",
+    "patient_report": "pr",
+}
+KEY_NAMES = {alias: key for key, alias in COMPACT_KEYS.items()}
+
+# Placeholders compact output leaves out. "false" is the verbose history checklist's
+# default for a condition nobody mentioned; a denied condition is written as "no".
+EMPTY_VALUES = {"", "not documented", "none mentioned", "not mentioned", "—", "false", "n/a"}
+
+_SCHEMA_KEY = re.compile(r'"(\w+)":')
+
+
+def is_empty(value) -> bool:
+    if value is None or value is False:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in EMPTY_VALUES
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def prune_empty(value):
+    """Drop empty fields at every level, as the model is asked to in compact mode"""
+    if isinstance(value, dict):
+        pruned = {k: prune_empty(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if not is_empty(v)}
+    if isinstance(value, list):
+        return [item for item in (prune_empty(v) for v in value) if not is_empty(item)]
+    return value
+
+
+def alias_keys(value):
+    """Rename report keys to their aliases, at any depth"""
+    if isinstance(value, dict):
+        return {COMPACT_KEYS.get(k, k): alias_keys(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [alias_keys(v) for v in value]
+    return value
+
+
+def expand_keys(value):
+    """Rename aliases back to report keys, at any depth; full key names pass through"""
+    if isinstance(value, dict):
+        return {KEY_NAMES.get(k, k): expand_keys(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [expand_keys(v) for v in value]
+    return value
+
+
+def alias_schema(schema: str) -> str:
+    """The JSON schema text with every key written as its alias"""
+    return _SCHEMA_KEY.sub(lambda m: f'"{COMPACT_KEYS.get(m.group(1), m.group(1))}":', schema)
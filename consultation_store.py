@@ -0,0 +1,434 @@
+"""
+Persistent store of consultations: transcript, normalized report JSON and
+enough session state to pick a consultation back up.
+
+A SQLite file in WAL mode, so the UI's reads never wait on a write. Rows are
+indexed on patient name, date, diagnosis and doctor for the "past
+consultations" lookup; queries are keyset-paginated, newest first. Writes
+are queued and committed by a background thread in batches, one
+transaction per batch, so saving never blocks a Streamlit script run.
+
+Transcripts and the report's free-text fields are also indexed in an FTS5
+table, updated in the same transaction as the row, for ranked full-text
+search. Text is folded before indexing and querying (Arabic diacritics,
+letter variants and digits; FTS5's unicode61 tokenizer handles case and
+Latin accents), and Arabic query words also match their forms with the
+definite article and its common prefixes (ال، وال، بال، ...).
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from medication_catalogue import normalize_arabic
+from report_cache import DEFAULT_CACHE_DIR
+
+
+SUMMARY_COLUMNS = "id, doctor, patient_name, diagnosis, language, created_at, updated_at"
+
+# FTS5 columns and their bm25 weights: a hit in a prescribed drug or the
+# complaint says more about a consultation than one anywhere in the transcript
+SEARCH_COLUMNS = ("transcript", "complaint", "history", "assessment", "medications", "doctor")
+SEARCH_WEIGHTS = (1.0, 3.0, 1.5, 2.0, 4.0, 0.0)
+
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+_ARABIC_WORD = re.compile(r"[\u0600-\u06FF]")
+_ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+_QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_TOKEN = re.compile(r"\w+")
+
+
+def patient_key(name: str) -> str:
+    """Case- and spacing-insensitive form of a patient name, used for lookups"""
+    return re.sub(r"\s+", " ", (name or "").strip()).casefold()
+
+
+def _report_fields(report) -> tuple:
+    # A failed generation (summarizer._empty_report) carries "error"; nothing in it describes the patient
+    report = report if report and not report.get("error") else {}
+    name = report.get("patient_name") or ""
+    if name == "Not documented":
+        name = ""
+    assessment = report.get("clinical_assessment") or {}
+    diagnosis = assessment.get("suspected_diagnosis") if isinstance(assessment, dict) else ""
+    return name, diagnosis or ""
+
+
+def normalize_search_text(text) -> str:
+    """Fold Arabic diacritics, letter variants and digits so every spelling indexes alike"""
+    return normalize_arabic(unicodedata.normalize("NFKC", str(text or ""))).translate(_ARABIC_DIGITS)
+
+
+def _term(token: str, prefix: bool = False) -> str:
+    if _ARABIC_WORD.match(token):
+        stem = token
+        for article in _ARABIC_PREFIXES:
+            if token.startswith(article) and len(token) - len(article) >= 2:
+                stem = token[len(article):]
+                break
+        star = "*" if prefix else ""
+        return "(" + " OR ".join(f'"{form}"{star}' for form in [stem] + [a + stem for a in _ARABIC_PREFIXES]) + ")"
+    return f'"{token}"' + ("*" if prefix else "")
+
+
+def build_match_query(query: str) -> str:
+    """
+    FTS5 MATCH expression for free text typed by a user: every word must
+    occur somewhere in the consultation, "quoted words" must occur as a
+    phrase, and a trailing * matches by prefix. Returns "" when there is
+    nothing to search for.
+    """
+    parts = []
+    for phrase, word in _QUERY_TERM.findall(normalize_search_text(query)):
+        tokens = _TOKEN.findall(phrase or word)
+        if not tokens:
+            continue
+        if phrase and len(tokens) > 1:
+            parts.append('"' + " ".join(tokens) + '"')
+        else:
+            prefix = word.endswith("*")
+            parts.extend(_term(token, prefix and i == len(tokens) - 1) for i, token in enumerate(tokens))
+    return " AND ".join(parts)
+
+
+def _doctor_token(doctor: str) -> str:
+    # One opaque token per doctor, so the doctor filter is an FTS term
+    # intersected with the query instead of a lookup per match
+    return "dr" + hashlib.sha1((doctor or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _search_fields(transcript: str, report, doctor: str) -> tuple:
+    report = report if report and not report.get("error") else {}
+    assessment = report.get("clinical_assessment") or {}
+    if not isinstance(assessment, dict):
+        assessment = {}
+    medications = [
+        med.get("name", "") for med in report.get("medication_plan") or [] if isinstance(med, dict)
+    ]
+    fields = (
+        transcript,
+        report.get("chief_complaint"),
+        report.get("history_of_present_illness"),
+        " — ".join(str(v) for v in (assessment.get("suspected_diagnosis"), assessment.get("reasoning")) if v),
+        " · ".join(str(name) for name in medications if name),
+    )
+    return tuple(normalize_search_text(field) if isinstance(field, str) else "" for field in fields) + (
+        _doctor_token(doctor),
+    )
+
+
+class ConsultationStore:
+    """SQLite consultation store with a batching writer thread"""
+
+    RANK_WINDOW = 10000
+
+    def __init__(self, path: str = None, batch_size: int = 64):
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._pending = {}   # id -> row queued but not yet committed, so reads see it at once
+        self._pending_lock = threading.Lock()
+        self._stats = {"saved": 0, "batches": 0, "write_errors": 0}
+
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "consultations.sqlite3")
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._writer = self._connect(path)
+            self.search_enabled = self._create_schema(self._writer)
+            self._reader = self._connect(path) if path != ":memory:" else self._writer
+        except sqlite3.Error:
+            # Read-only or full disk: keep consultations for the life of the process only
+            path = ":memory:"
+            self._writer = self._reader = self._connect(path)
+            self.search_enabled = self._create_schema(self._writer)
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._read_lock = self._write_lock if self._reader is self._writer else threading.Lock()
+
+        self._thread = threading.Thread(target=self._write_loop, name="mednote-consultation-writer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            db.execute("PRAGMA journal_mode=WAL")
+            # WAL makes NORMAL durable against application crashes, which is what matters here
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> bool:
+        """Create tables and indexes; returns whether full-text search is available"""
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS consultations ("
+            " id TEXT PRIMARY KEY,"
+            " doctor TEXT NOT NULL,"
+            " patient_name TEXT NOT NULL,"
+            " patient_key TEXT NOT NULL,"
+            " diagnosis TEXT NOT NULL,"
+            " language TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " transcript TEXT NOT NULL,"
+            " report TEXT,"
+            " state TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_consultations_patient ON consultations (patient_key, created_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_consultations_created ON consultations (created_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_consultations_diagnosis ON consultations (diagnosis, created_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_consultations_doctor ON consultations (doctor, created_at)")
+        db.commit()
+
+        indexed = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'consultation_search'").fetchone()
+        try:
+            # The FTS row shares the consultation's rowid
+            db.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS consultation_search USING fts5("
+                f"{', '.join(SEARCH_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: everything but search still works
+            return False
+        if not indexed:
+            # Index consultations saved before search existed
+            rows = db.execute("SELECT rowid, transcript, report, doctor FROM consultations").fetchall()
+            db.executemany(
+                f"INSERT INTO consultation_search (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(rowid, *_search_fields(transcript, json.loads(report) if report else None, doctor))
+                 for rowid, transcript, report, doctor in rows],
+            )
+        db.commit()
+        return True
+
+    # ---- writes ----
+    def save(self, consultation_id: str, doctor: str, transcript: str, report: dict = None,
+             language: str = "english", state: dict = None):
+        """Queue an insert-or-update of one consultation; returns without touching the disk"""
+        name, diagnosis = _report_fields(report)
+        now = time.time()
+        row = {
+            "id": consultation_id,
+            "doctor": doctor,
+            "patient_name": name,
+            "patient_key": patient_key(name),
+            "diagnosis": diagnosis,
+            "language": language,
+            "created_at": now,
+            "updated_at": now,
+            "transcript": transcript or "",
+            "report": json.dumps(report, ensure_ascii=False) if report is not None else None,
+            "state": json.dumps(state or {}, ensure_ascii=False),
+        }
+        with self._pending_lock:
+            previous = self._pending.get(consultation_id)
+            if previous is not None:
+                row["created_at"] = previous["created_at"]
+            self._pending[consultation_id] = row
+        self._queue.put(row)
+
+    def flush(self):
+        """Block until every queued write is committed"""
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Whatever queued up while the last batch was committing goes in the next transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: list):
+        # Several saves of one consultation in a batch collapse into the last one
+        latest = {row["id"]: row for row in batch}
+        try:
+            with self._write_lock:
+                self._writer.executemany(
+                    "INSERT INTO consultations"
+                    " (id, doctor, patient_name, patient_key, diagnosis, language,"
+                    "  created_at, updated_at, transcript, report, state)"
+                    " VALUES (:id, :doctor, :patient_name, :patient_key, :diagnosis, :language,"
+                    "  :created_at, :updated_at, :transcript, :report, :state)"
+                    " ON CONFLICT (id) DO UPDATE SET"
+                    "  doctor = excluded.doctor, patient_name = excluded.patient_name,"
+                    "  patient_key = excluded.patient_key, diagnosis = excluded.diagnosis,"
+                    "  language = excluded.language, updated_at = excluded.updated_at,"
+                    "  transcript = excluded.transcript, report = excluded.report, state = excluded.state",
+                    list(latest.values()),
+                )
+                if self.search_enabled:
+                    self._index(latest.values())
+                self._writer.commit()
+            self._stats["saved"] += len(latest)
+            self._stats["batches"] += 1
+        except sqlite3.Error:
+            self._stats["write_errors"] += 1
+        with self._pending_lock:
+            for consultation_id, row in latest.items():
+                # A newer save may have been queued meanwhile; keep that one visible
+                if self._pending.get(consultation_id) is row:
+                    del self._pending[consultation_id]
+
+    def _index(self, rows):
+        # Caller holds the write lock and commits; replaces each consultation's FTS row
+        rowids = []
+        for row in rows:
+            rowid = self._writer.execute("SELECT rowid FROM consultations WHERE id = ?", (row["id"],)).fetchone()[0]
+            report = json.loads(row["report"]) if row["report"] else None
+            rowids.append((rowid, _search_fields(row["transcript"], report, row["doctor"])))
+        self._writer.executemany("DELETE FROM consultation_search WHERE rowid = ?", [(rowid,) for rowid, _ in rowids])
+        self._writer.executemany(
+            f"INSERT INTO consultation_search (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(rowid, *fields) for rowid, fields in rowids],
+        )
+
+    # ---- reads ----
+    def get(self, consultation_id: str):
+        """Full consultation (report and state decoded), or None"""
+        with self._pending_lock:
+            row = self._pending.get(consultation_id)
+        if row is None:
+            with self._read_lock:
+                cursor = self._reader.execute(
+                    f"SELECT {SUMMARY_COLUMNS}, transcript, report, state FROM consultations WHERE id = ?",
+                    (consultation_id,),
+                )
+                found = cursor.fetchone()
+                if found is None:
+                    return None
+                row = dict(zip([c[0] for c in cursor.description], found))
+        consultation = {k: v for k, v in row.items() if k != "patient_key"}
+        consultation["report"] = json.loads(row["report"]) if row["report"] else None
+        consultation["state"] = json.loads(row["state"])
+        return consultation
+
+    def query(self, patient: str = None, doctor: str = None, diagnosis: str = None,
+              since: float = None, until: float = None, limit: int = 20, after: str = None) -> dict:
+        """
+        One page of consultation summaries, newest first.
+
+        patient matches names by prefix; diagnosis by substring. Pass the
+        returned "next" cursor as `after` for the following page; it is None
+        on the last page. Only committed rows are listed.
+        """
+        clauses, params = [], []
+        if patient:
+            key = patient_key(patient)
+            clauses.append("patient_key >= ? AND patient_key < ?")
+            params += [key, key + "\uffff"]
+        if doctor:
+            clauses.append("doctor = ?")
+            params.append(doctor)
+        if diagnosis:
+            clauses.append("diagnosis LIKE ?")
+            params.append(f"%{diagnosis}%")
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if after:
+            created_at, _, last_id = after.partition(":")
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params += [float(created_at), float(created_at), last_id]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._read_lock:
+            cursor = self._reader.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM consultations {where}"
+                " ORDER BY created_at DESC, id DESC LIMIT ?",
+                params + [limit + 1],
+            )
+            columns = [c[0] for c in cursor.description]
+            items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = f"{items[-1]['created_at']!r}:{items[-1]['id']}"
+        return {"items": items, "next": next_cursor}
+
+    def search(self, query: str, doctor: str = None, limit: int = 20, offset: int = 0) -> list:
+        """
+        Consultations matching a free-text query (see build_match_query), best
+        match first, each with a bm25 `score` (lower is better) and a `snippet`
+        of the best-matching field, folded as indexed, with matched words
+        wrapped in **. Only committed rows are searched.
+
+        bm25 has to score every match, so for very common terms only the
+        newest RANK_WINDOW matches are ranked; that keeps a query over a
+        million consultations in tens of milliseconds.
+        """
+        match = build_match_query(query)
+        if not match or not self.search_enabled:
+            return []
+        if doctor:
+            match = f'doctor : "{_doctor_token(doctor)}" AND ({match})'
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        with self._read_lock:
+            # Score the newest matches in one descending pass, then sort them
+            ranked = self._reader.execute(
+                "SELECT rowid, score FROM ("
+                f" SELECT rowid, bm25(consultation_search, {weights}) AS score FROM consultation_search"
+                " WHERE consultation_search MATCH ? ORDER BY rowid DESC LIMIT ?"
+                ") ORDER BY score LIMIT ? OFFSET ?",
+                (match, self.RANK_WINDOW, limit, offset),
+            ).fetchall()
+            if not ranked:
+                return []
+
+            rowids = [rowid for rowid, _ in ranked]
+            placeholders = ", ".join("?" * len(rowids))
+            cursor = self._reader.execute(
+                f"SELECT rowid, {SUMMARY_COLUMNS} FROM consultations WHERE rowid IN ({placeholders})",
+                rowids,
+            )
+            columns = [c[0] for c in cursor.description][1:]
+            summaries = {row[0]: dict(zip(columns, row[1:])) for row in cursor.fetchall()}
+            # Snippets for this page only: snippet() costs far more than bm25().
+            # The rowid range lets FTS5 seek straight to the page's rows; the
+            # unary + keeps the IN list from turning into one MATCH per row.
+            snippets = dict(self._reader.execute(
+                "SELECT rowid, snippet(consultation_search, -1, '**', '**', '…', 16) FROM consultation_search"
+                " WHERE consultation_search MATCH ? AND rowid >= ? AND rowid <= ?"
+                f" AND +rowid IN ({placeholders})",
+                [match, min(rowids), max(rowids)] + rowids,
+            ).fetchall())
+        return [
+            {**summaries[rowid], "snippet": snippets.get(rowid, ""), "score": score}
+            for rowid, score in ranked if rowid in summaries
+        ]
+
+    def stats(self) -> dict:
+        with self._read_lock:
+            count = self._reader.execute("SELECT COUNT(*) FROM consultations").fetchone()[0]
+        return {**self._stats, "consultations": count, "queued": self._queue.qsize()}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_consultation_store() -> ConsultationStore:
+    """Process-wide consultation store shared by every Streamlit session"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConsultationStore()
+    return _store
@@ -0,0 +1,98 @@
+"""
+Background rendering of report exports.
+
+As soon as a report exists its PDF and DOCX are rendered on a worker thread,
+so the download buttons serve ready bytes instead of rendering on click.
+Renders are keyed by a hash of the report, the doctor name and the date
+printed on the document, so reruns on an unchanged report reuse them.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from exports import generate_docx_report, generate_professional_pdf
+
+
+RENDERERS = {
+    "pdf": generate_professional_pdf,
+    "docx": generate_docx_report,
+}
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+def export_key(report: dict, doctor_name: str) -> str:
+    """Content hash of everything that ends up in an export"""
+    payload = json.dumps(
+        [report, doctor_name, date.today().isoformat()],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExportCache:
+    """LRU of rendered export bytes, filled by a small thread pool"""
+
+    def __init__(self, max_entries: int = 64, max_workers: int = 2):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mednote-export")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"renders": 0, "hits": 0}
+
+    def prefetch(self, report: dict, doctor_name: str, formats=None) -> str:
+        """Start rendering any missing formats; returns the export key"""
+        key = export_key(report, doctor_name)
+        for fmt in formats or RENDERERS:
+            self._future(key, fmt, report, doctor_name)
+        return key
+
+    def get(self, report: dict, doctor_name: str, fmt: str, timeout: float = None) -> bytes:
+        """Rendered bytes, waiting for a render in flight or starting one if needed"""
+        key = export_key(report, doctor_name)
+        return self._future(key, fmt, report, doctor_name).result(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._futures)}
+
+    def _future(self, key, fmt, report, doctor_name):
+        with self._lock:
+            future = self._futures.get((key, fmt))
+            if future is not None and not (future.done() and future.exception()):
+                self._futures.move_to_end((key, fmt))
+                self._stats["hits"] += 1
+                return future
+            # Render from a snapshot so later edits to the session report can't race it
+            snapshot = json.loads(json.dumps(report, default=str))
+            future = self._executor.submit(self._render, fmt, snapshot, doctor_name)
+            self._futures[(key, fmt)] = future
+            self._stats["renders"] += 1
+            while len(self._futures) > self.max_entries:
+                self._futures.popitem(last=False)
+            return future
+
+    @staticmethod
+    def _render(fmt, report, doctor_name) -> bytes:
+        return RENDERERS[fmt](report, doctor_name).getvalue()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache() -> ExportCache:
+    """Process-wide export cache shared by every Streamlit session"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExportCache()
+    return _cache
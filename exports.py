@@ -0,0 +1,232 @@
+"""
+Report exports.
+
+Rendering lives outside app.py so it can be reused and benchmarked without
+starting the Streamlit UI. reportlab and python-docx are imported on first
+export rather than at startup.
+"""
+from io import BytesIO
+from datetime import datetime
+
+import telemetry
+
+
+def safe_str(value, default="—"):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    return str(value)
+
+
+# PDF Generation (same as before, compressed version)
+@telemetry.timed("pdf_render")
+def generate_professional_pdf(rep: dict, doctor_name: str) -> BytesIO:
+    """Generate ONE-PAGE compressed medical report PDF"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+    
+    from pdf_layout import font_for_text, wrap_text
+    
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    y = height - 30
+    
+    def draw_compact_text(text, font="Helvetica", size=8, x_offset=70, max_lines=3):
+        nonlocal y
+        text = str(text)
+        font = font_for_text(text, font)
+        c.setFont(font, size)
+        for line in wrap_text(text, font, size, width - 140, max_lines):
+            c.drawString(x_offset, y, line[:95])
+            y -= 10
+    
+    # Compact header
+    c.setFont("Helvetica-Bold", 16)
+    c.setFillColor(colors.HexColor("#3B82F6"))
+    c.drawString(50, y, "MedNote AI")
+    c.setFont("Helvetica", 7)
+    c.setFillColor(colors.grey)
+    c.drawString(160, y, "Smart Medical Documentation")
+    y -= 15
+    
+    # Patient info
+    c.setFont("Helvetica-Bold", 9)
+    c.setFillColor(colors.black)
+    c.drawString(50, y, f"Dr: {doctor_name}")
+    c.setFont("Helvetica", 8)
+    c.drawString(200, y, f"Patient: {safe_str(rep.get('patient_name', 'Not documented'))[:20]}")
+    
+    demo = rep.get('demographics', {})
+    demo_parts = []
+    if demo.get('age'): demo_parts.append(f"Age:{demo['age']}")
+    if demo.get('gender'): demo_parts.append(f"Sex:{demo['gender']}")
+    if demo.get('weight'): demo_parts.append(f"Wt:{demo['weight']}")
+    if demo.get('height'): demo_parts.append(f"Ht:{demo['height']}")
+    
+    if demo_parts:
+        c.drawString(400, y, " | ".join(demo_parts)[:50])
+    
+    y -= 10
+    c.setFont("Helvetica", 7)
+    c.drawString(50, y, datetime.now().strftime('%b %d, %Y'))
+    y -= 12
+    c.setStrokeColor(colors.grey)
+    c.line(50, y, width - 50, y)
+    y -= 12
+    
+    # Overview
+    overview = rep.get('conversation_overview', {})
+    if overview and overview.get('conversation_summary'):
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y, "SUMMARY:")
+        y -= 10
+        draw_compact_text(overview['conversation_summary'], size=7, max_lines=2)
+        y -= 5
+    
+    # Chief Complaint
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(50, y, "CHIEF COMPLAINT:")
+    y -= 10
+    draw_compact_text(rep.get('chief_complaint', 'Not documented'), size=7, max_lines=2)
+    y -= 5
+    
+    # HPI
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(50, y, "HISTORY:")
+    y -= 10
+    draw_compact_text(rep.get('history_of_present_illness', 'Not documented'), size=7, max_lines=3)
+    y -= 5
+    
+    # Vital Signs
+    vitals = rep.get('vital_signs', {})
+    if vitals and any(vitals.values()):
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y, "VITALS:")
+        y -= 10
+        c.setFont("Helvetica", 7)
+        vital_str = " | ".join([
+            f"BP:{vitals['blood_pressure']}" if vitals.get('blood_pressure') else "",
+            f"HR:{vitals['heart_rate']}" if vitals.get('heart_rate') else "",
+            f"Temp:{vitals['temperature']}" if vitals.get('temperature') else "",
+        ]).strip(' |')
+        c.drawString(70, y, vital_str[:100])
+        y -= 12
+    
+    # Assessment
+    assessment = rep.get('clinical_assessment', {})
+    if assessment and assessment.get('suspected_diagnosis'):
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y, "ASSESSMENT:")
+        y -= 10
+        c.setFont("Helvetica-Bold", 8)
+        c.drawString(70, y, safe_str(assessment['suspected_diagnosis'])[:80])
+        y -= 10
+        if assessment.get('reasoning'):
+            draw_compact_text(assessment['reasoning'], size=7, max_lines=2)
+        y -= 5
+    
+    # Medications
+    meds = rep.get('medication_plan', [])
+    if meds:
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y, "PRESCRIBED:")
+        y -= 10
+        for i, med in enumerate(meds[:4], 1):
+            c.setFont("Helvetica-Bold", 8)
+            c.drawString(70, y, f"{i}. {safe_str(med.get('name'))[:30]}")
+            y -= 9
+            c.setFont("Helvetica", 7)
+            c.drawString(85, y, f"{safe_str(med.get('dose'))[:20]} - {safe_str(med.get('frequency'))[:20]}"[:50])
+            y -= 9
+        y -= 3
+    
+    # Follow-up
+    followup = rep.get('follow_up')
+    if followup:
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y, "FOLLOW-UP:")
+        y -= 10
+        draw_compact_text(followup, size=7, max_lines=2)
+    
+    # Footer
+    c.setFont("Helvetica", 6)
+    c.setFillColor(colors.grey)
+    c.drawString(50, 25, "MedNote AI - For Testing Purposes Only - Not a substitute for professional medical judgment")
+    
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+
+@telemetry.timed("docx_render")
+def generate_docx_report(rep: dict, doctor_name: str) -> BytesIO:
+    """Generate an editable Word version of the report"""
+    from docx import Document
+    from docx.shared import Pt
+    
+    doc = Document()
+    doc.styles["Normal"].font.size = Pt(10)
+    doc.add_heading("MedNote AI - Medical Report", level=1)
+    doc.add_paragraph(f"Dr: {doctor_name}    Patient: {safe_str(rep.get('patient_name'), 'Not documented')}")
+    
+    demo = rep.get('demographics') or {}
+    demo_parts = [f"{label}: {demo[key]}" for key, label in
+                  (("age", "Age"), ("gender", "Sex"), ("weight", "Weight"), ("height", "Height")) if demo.get(key)]
+    if demo_parts:
+        doc.add_paragraph(" | ".join(demo_parts))
+    doc.add_paragraph(datetime.now().strftime('%b %d, %Y'))
+    
+    def section(title, body):
+        if body:
+            doc.add_heading(title, level=2)
+            doc.add_paragraph(safe_str(body))
+    
+    overview = rep.get('conversation_overview') or {}
+    assessment = rep.get('clinical_assessment') or {}
+    section("Summary", overview.get('conversation_summary'))
+    section("Chief Complaint", rep.get('chief_complaint'))
+    section("History of Present Illness", rep.get('history_of_present_illness'))
+    section("Physical Examination", rep.get('physical_examination'))
+    
+    vitals = rep.get('vital_signs') or {}
+    vital_parts = [f"{label}: {vitals[key]}" for key, label in
+                   (("blood_pressure", "BP"), ("heart_rate", "HR"), ("temperature", "Temp"),
+                    ("respiratory_rate", "RR"), ("oxygen_saturation", "SpO2")) if vitals.get(key)]
+    section("Vital Signs", " | ".join(vital_parts))
+    
+    if assessment.get('suspected_diagnosis'):
+        section("Assessment", assessment['suspected_diagnosis'])
+        if assessment.get('reasoning'):
+            doc.add_paragraph(safe_str(assessment['reasoning']))
+    
+    meds = rep.get('medication_plan') or []
+    if meds:
+        doc.add_heading("Medications", level=2)
+        for i, med in enumerate(meds, 1):
+            stock = med.get('stock_status') or {}
+            line = (f"{i}. {safe_str(med.get('name'))} - {safe_str(med.get('dose'))}, "
+                    f"{safe_str(med.get('frequency'))}, {safe_str(med.get('duration'))}")
+            if stock.get('in_stock') is False:
+                line += f" (out of stock; alternative: {safe_str(stock.get('alternative'))})"
+            doc.add_paragraph(line)
+            if med.get('instructions'):
+                doc.add_paragraph(safe_str(med['instructions']), style="List Bullet")
+    
+    for title, key in (("Safety Checks", 'safety_checks'), ("Suggested Questions", 'doctor_advisory_missing_questions')):
+        items = rep.get(key) or []
+        if items:
+            doc.add_heading(title, level=2)
+            for item in items:
+                doc.add_paragraph(safe_str(item), style="List Bullet")
+    
+    section("Follow-up", rep.get('follow_up'))
+    section("Patient Summary", rep.get('patient_report'))
+    
+    footer = doc.add_paragraph("MedNote AI - For Testing Purposes Only - Not a substitute for professional medical judgment")
+    footer.runs[0].font.size = Pt(7)
+    
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,373 @@
+"""
+Background jobs for transcription and report generation.
+
+submit_* returns a job id at once; the work runs on a worker pool (inside a
+scheduler slot, so queuing and rate limits from scheduler.py still apply) and
+reports progress per stage. Job state is kept in memory for cheap polling and
+written through to SQLite, so a finished result survives a browser refresh
+or a session restart.
+
+Replicas may share the SQLite file, so every job records the instance (one
+per process) running it, and each instance heartbeats while it is alive. A
+job still marked running whose instance has stopped heartbeating is marked
+failed: its worker died with that process. Other replicas' live jobs are
+left alone.
+
+When MEDNOTE_STATE_BACKEND is shared (sqlite or redis, see state_backend.py)
+job state and heartbeats are written there too, so a session that moves to
+another replica or host keeps polling the job where it runs.
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+from report_cache import DEFAULT_CACHE_DIR
+from scheduler import get_scheduler
+from state_backend import InProcessStateBackend, get_state_backend
+
+
+TRANSCRIPTION_STAGES = ["queued", "preprocess", "transcribe"]  # transcribe includes the upload
+REPORT_STAGES = ["queued", "extract"]  # extract includes the stock check of the new report
+ACTIVE = ("queued", "running")
+
+HEARTBEAT_SECONDS = 10.0
+# An instance silent for this long has stopped; its running jobs will never finish
+STALE_SECONDS = float(os.getenv("MEDNOTE_JOB_STALE_SECONDS", 60))
+
+# Shared state backend keys
+JOB_KEY = "job:"
+INSTANCE_KEY = "job-instance:"
+
+
+class JobContext:
+    """Handed to the job function to report progress"""
+
+    def __init__(self, manager, job_id: str):
+        self._manager = manager
+        self.job_id = job_id
+
+    def stage(self, name: str, detail: str = ""):
+        """Mark `name` as the running stage; earlier stages count as done"""
+        self._manager._update(self.job_id, stage=name, detail=detail)
+
+    def progress(self, done: int, total: int, detail: str = ""):
+        self._manager._update(self.job_id, progress=(done, total), detail=detail)
+
+    def partial(self, key: str, value):
+        """Publish part of the result before the job finishes (e.g. a streamed report section)"""
+        self._manager._update(self.job_id, partial=(key, value))
+
+
+class JobManager:
+    """Worker pool plus a write-through SQLite store of job state"""
+
+    def __init__(self, path: str = None, max_workers: int = None, retention_seconds: float = 7 * 24 * 3600,
+                 shared=None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("MEDNOTE_JOB_WORKERS", 8)),
+            thread_name_prefix="mednote-job",
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.instance_id = uuid.uuid4().hex[:12]
+        # Job state for other replicas; an in-process backend has no one to share with
+        if shared is None:
+            shared = get_state_backend()
+        self._shared = None if isinstance(shared, InProcessStateBackend) else shared
+
+        self._db = None
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite3")
+        if path:
+            try:
+                if path != ":memory:":
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " id TEXT PRIMARY KEY,"
+                    " kind TEXT NOT NULL,"
+                    " owner TEXT NOT NULL,"
+                    " state TEXT NOT NULL,"
+                    " status TEXT NOT NULL,"
+                    " created_at REAL NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, created_at)")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS instances (id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)"
+                )
+                now = time.time()
+                self._db.execute("DELETE FROM jobs WHERE created_at < ?", (now - retention_seconds,))
+                self._db.execute("DELETE FROM instances WHERE heartbeat_at < ?", (now - retention_seconds,))
+                self._heartbeat()
+                for (state,) in self._db.execute("SELECT state FROM jobs WHERE status IN (?, ?)", ACTIVE).fetchall():
+                    self._fail_if_orphaned(json.loads(state))
+                self._db.commit()
+            except sqlite3.Error:
+                # Read-only or full disk: jobs still run, results just don't outlive the process
+                self._db = None
+        if self._db is not None or self._shared is not None:
+            if self._db is None:
+                self._heartbeat()
+            threading.Thread(target=self._heartbeat_loop, name="mednote-job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        now = time.time()
+        if self._shared is not None:
+            self._shared.set(INSTANCE_KEY + self.instance_id, {"heartbeat_at": now})
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO instances (id, heartbeat_at) VALUES (?, ?)", (self.instance_id, now))
+            self._db.commit()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                try:
+                    self._heartbeat()
+                except sqlite3.Error:
+                    pass
+
+    def _instance_alive(self, instance: str) -> bool:
+        if instance == self.instance_id:
+            return True
+        beats = []
+        if self._db is not None:
+            row = self._db.execute("SELECT heartbeat_at FROM instances WHERE id = ?", (instance,)).fetchone()
+            if row is not None:
+                beats.append(row[0])
+        if self._shared is not None and instance:
+            beat = self._shared.get(INSTANCE_KEY + instance)
+            if beat is not None:
+                beats.append(beat["heartbeat_at"])
+        return bool(beats) and time.time() - max(beats) < STALE_SECONDS
+
+    def _fail_if_orphaned(self, job: dict) -> dict:
+        """Mark an active job failed when the instance running it has stopped; returns the job"""
+        if job["status"] in ACTIVE and not self._instance_alive(job.get("instance")):
+            job.update(status="failed", error="Interrupted by a server restart", updated_at=time.time())
+            self._persist(job)
+        return job
+
+    def submit(self, kind: str, owner: str, stages: list, fn, *args, **kwargs) -> str:
+        """Run fn(ctx, *args, **kwargs) in the background; its return value becomes the job result"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "owner": owner,
+            "instance": self.instance_id,
+            "status": "queued",
+            "stage": stages[0],
+            "detail": "",
+            "stages": {name: {"status": "pending", "done": 0, "total": 0, "seconds": 0.0} for name in stages},
+            "partial": {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        job["stages"][stages[0]].update(status="running", started=now)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._persist(job)
+        self._executor.submit(self._run, job_id, owner, kind, fn, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str):
+        """Snapshot of a job's state, or None for an unknown id"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return json.loads(json.dumps(job, ensure_ascii=False))
+            if self._db is not None:
+                row = self._db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None:
+                    # Another replica's job: running as long as that replica is
+                    return self._fail_if_orphaned(json.loads(row[0]))
+            if self._shared is not None:
+                # Started on another host; it writes its progress and result here
+                job = self._shared.get(JOB_KEY + job_id)
+                if job is not None:
+                    return self._fail_if_orphaned(job)
+        return None
+
+    def recent(self, owner: str, limit: int = 20) -> list:
+        """Most recent jobs for one doctor, newest first"""
+        with self._lock:
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT state FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?", (owner, limit)
+                ).fetchall()
+                return [json.loads(row[0]) for row in rows]
+            jobs = [job for job in self._jobs.values() if job["owner"] == owner]
+        return sorted(jobs, key=lambda job: -job["created_at"])[:limit]
+
+    def _run(self, job_id, owner, kind, fn, args, kwargs):
+        ctx = JobContext(self, job_id)
+        try:
+            def on_wait(position, waiting):
+                ctx.stage("queued", f"#{position} in queue ({waiting} waiting)")
+
+            # Root span: every stage of this job shares its trace id
+            with telemetry.span(f"{kind}_job", job=job_id):
+                queued = time.perf_counter()
+                with get_scheduler().slot(owner, kind, on_wait=on_wait):
+                    telemetry.record_span("queue_wait", time.perf_counter() - queued, kind=kind)
+                    self._update(job_id, status="running")
+                    result = fn(ctx, *args, **kwargs)
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+        else:
+            self._update(job_id, status="done", result=result)
+
+    def _update(self, job_id, stage=None, detail=None, progress=None, partial=None, status=None, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            job = self._jobs[job_id]
+            current = job["stages"][job["stage"]]
+            if stage is not None and stage != job["stage"]:
+                current.update(status="done", seconds=round(now - current.get("started", now), 3))
+                job["stage"] = stage
+                job["stages"][stage].update(status="running", started=now)
+            if detail is not None:
+                job["detail"] = detail
+            if progress is not None:
+                job["stages"][job["stage"]].update(done=progress[0], total=progress[1])
+            if partial is not None:
+                job["partial"][partial[0]] = partial[1]
+            if status is not None:
+                job["status"] = status
+            if status in ("done", "failed"):
+                current = job["stages"][job["stage"]]
+                current.update(
+                    status="done" if status == "done" else "failed",
+                    seconds=round(now - current.get("started", now), 3),
+                )
+                job["result"] = result
+                job["error"] = error
+                job["partial"] = {}
+            job["updated_at"] = now
+            # Streamed sections change often; only stage changes and the outcome hit the disk
+            if partial is None or status is not None:
+                self._persist(job)
+            if status in ("done", "failed"):
+                # Finished jobs are served from the store from now on
+                if self._db is not None:
+                    del self._jobs[job_id]
+
+    def _persist(self, job):
+        if self._shared is not None:
+            self._shared.set(JOB_KEY + job["id"], job)
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (id, kind, owner, state, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["kind"], job["owner"], json.dumps(job, ensure_ascii=False),
+             job["status"], job["created_at"], job["updated_at"]),
+        )
+        self._db.commit()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Process-wide job manager shared by every Streamlit session"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
+
+
+# =========================
+#   JOB FUNCTIONS
+# =========================
+def _transcribe(ctx: JobContext, data: bytes, filename: str, language: str) -> dict:
+    from audio_preprocess import preprocess_audio
+    from audio_upload import open_upload
+    from backends import get_backend
+    from long_audio import LONG_AUDIO_THRESHOLD_BYTES, can_split, transcribe_long_audio
+
+    backend = get_backend()
+    if backend is None:
+        raise RuntimeError("OpenAI API key not configured")
+
+    ctx.stage("preprocess")
+    data, filename, audio_stats = preprocess_audio(data, filename)
+    detail = ""
+    if audio_stats["applied"]:
+        detail = f"{audio_stats['input_bytes'] / 1e6:.1f} MB → {audio_stats['output_bytes'] / 1e6:.1f} MB"
+
+    ctx.stage("transcribe", detail)
+    audio = io.BytesIO(data)
+    audio.name = filename
+
+    # Long recordings are split and transcribed segment by segment
+    if len(data) > LONG_AUDIO_THRESHOLD_BYTES and can_split(filename):
+        def on_progress(partial, done, total):
+            ctx.partial("transcript", partial)
+            ctx.progress(done, total, f"{done}/{total} segments")
+
+        transcript = transcribe_long_audio(backend, data, filename, language=language, on_progress=on_progress)
+        return {"transcript": transcript, "audio": audio_stats}
+
+    with open_upload(audio) as upload:
+        return {"transcript": backend.transcribe(upload, model="whisper-1", language=language), "audio": audio_stats}
+
+
+def submit_transcription(owner: str, data: bytes, filename: str, language: str = "ar") -> str:
+    """
+    Transcribe one recording in the background. The result is
+    {"transcript": text, "audio": preprocessing stats (see audio_preprocess)}
+    """
+    return get_job_manager().submit("transcribe", owner, TRANSCRIPTION_STAGES, _transcribe, data, filename, language)
+
+
+def _generate(ctx: JobContext, transcript: str, language: str, mode: str, report: dict, cursor: int) -> dict:
+    import summarizer
+
+    ctx.stage("extract")
+    timings = {}
+    new_cursor = len(transcript)
+    if mode == "update":
+        report, new_cursor = summarizer.update_report(report, transcript, cursor, language)
+    elif mode == "parallel":
+        report = summarizer.generate_report_parallel(transcript, language, timings=timings)
+    else:
+        report = None
+        expected = {key for key, _ in summarizer.REPORT_SCHEMA}
+        received = set()
+        for section, value in summarizer.generate_report_stream(transcript, language):
+            if section == summarizer.REPORT_COMPLETE:
+                report = value
+            else:
+                ctx.partial(section, value)
+                # Cached and map-reduce reports also carry keys outside the schema (patient_profile_updates)
+                if section in expected:
+                    received.add(section)
+                    ctx.progress(len(received), len(expected), f"{len(received)} sections")
+
+    return {"report": report, "cursor": [language, new_cursor], "timings": timings}
+
+
+def submit_report(owner: str, transcript: str, language: str, mode: str = "stream", report: dict = None, cursor: int = 0) -> str:
+    """
+    Generate a report in the background. mode is "stream" (sections appear in
+    the job's partial result as they arrive), "parallel" or "update" (add the
+    transcript after `cursor` to `report`). The result holds the report, the
+    new report cursor and any timings.
+    """
+    return get_job_manager().submit("report", owner, REPORT_STAGES, _generate, transcript, language, mode, report, cursor)
@@ -0,0 +1,76 @@
+"""
+Incremental parser for a streamed top-level JSON object.
+
+The model writes the report as one JSON object. Instead of waiting for the
+closing brace, the parser tracks string/nesting state over each new chunk and
+hands back every top-level ``key: value`` pair as soon as its value is closed.
+"""
+import json
+
+
+class TopLevelJSONStream:
+    """Feed text chunks, get back completed top-level (key, value) pairs"""
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._item_start = 0
+
+    def feed(self, chunk: str) -> list:
+        """Consume the next chunk and return the pairs it completed, in order"""
+        if self.done or not chunk:
+            return []
+
+        self.text += chunk
+        text = self.text
+        items = []
+        i = self._pos
+
+        while i < len(text):
+            ch = text[i]
+            if not self._started:
+                # Skip anything before the object, e.g. a ```json fence
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._item_start = i + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    items.extend(self._parse_item(text[self._item_start:i]))
+                    self.done = True
+                    i += 1
+                    break
+            elif ch == "," and self._depth == 1:
+                items.extend(self._parse_item(text[self._item_start:i]))
+                self._item_start = i + 1
+            i += 1
+
+        self._pos = i
+        return items
+
+    @staticmethod
+    def _parse_item(fragment: str) -> list:
+        if not fragment.strip():
+            return []
+        try:
+            return list(json.loads("{" + fragment + "}").items())
+        except ValueError:
+            # Malformed member; the full-text parse at the end still gets a chance
+            return []
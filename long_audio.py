@@ -0,0 +1,163 @@
+"""
+Long-recording transcription.
+
+A 40-minute consultation is too large for one whisper-1 upload, so the audio
+is decoded to PCM, cut into overlapping WAV segments and the segments are
+transcribed concurrently. The pieces are stitched back in order, dropping the
+words repeated in each overlap.
+
+WAV is decoded with the stdlib `wave` module. Other formats need a decoder
+registered with `register_decoder`; an ffmpeg-based one is registered
+automatically when the `ffmpeg` binary is available.
+"""
+import io
+import os
+import re
+import shutil
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import telemetry
+
+
+# Whisper rejects uploads above 25 MB; split well before that
+LONG_AUDIO_THRESHOLD_BYTES = int(os.getenv("MEDNOTE_LONG_AUDIO_BYTES", str(20 * 1024 * 1024)))
+# Largest WAV segment sent; 300 s of 44.1 kHz stereo 16-bit PCM alone is ~53 MB
+SEGMENT_MAX_BYTES = int(os.getenv("MEDNOTE_SEGMENT_MAX_BYTES", str(24 * 1024 * 1024)))
+_WAV_HEADER_BYTES = 44
+
+DECODERS = {}
+
+
+def register_decoder(extensions, decoder):
+    """
+    Register `decoder(data: bytes) -> (pcm: bytes, sample_rate, channels, sample_width)`
+    for the given file extensions (e.g. [".mp3", ".m4a"]).
+    """
+    for ext in extensions:
+        DECODERS[ext.lower()] = decoder
+
+
+def _decode_wav(data: bytes):
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.readframes(wav.getnframes()), wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+
+
+def _decode_ffmpeg(data: bytes):
+    # Whisper resamples to 16 kHz mono internally, so nothing is lost here
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", "16000", "pipe:1"],
+        input=data,
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout, 16000, 1, 2
+
+
+register_decoder([".wav"], _decode_wav)
+if shutil.which("ffmpeg"):
+    register_decoder([".mp3", ".m4a", ".ogg", ".webm", ".flac"], _decode_ffmpeg)
+
+
+def can_split(filename: str) -> bool:
+    return os.path.splitext(filename or "")[1].lower() in DECODERS
+
+
+def split_audio(data: bytes, filename: str, segment_seconds: float = 300, overlap_seconds: float = 5,
+                max_bytes: int = SEGMENT_MAX_BYTES) -> list:
+    """
+    Decode and cut the recording into overlapping WAV segments, in order.
+    Segments are at most `segment_seconds` long and, whatever the sample rate
+    and channel count, at most `max_bytes` in size.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in DECODERS:
+        raise ValueError(f"No audio decoder registered for '{ext or filename}'")
+
+    pcm, sample_rate, channels, sample_width = DECODERS[ext](data)
+    frame_size = channels * sample_width
+    total_frames = len(pcm) // frame_size
+    budget_frames = max(1, (max_bytes - _WAV_HEADER_BYTES) // frame_size)
+    segment_frames = max(1, min(int(segment_seconds * sample_rate), budget_frames))
+    # The overlap only has to cover a word or two; never let it eat most of a segment
+    overlap_frames = min(int(overlap_seconds * sample_rate), segment_frames // 10)
+    step_frames = max(1, segment_frames - overlap_frames)
+
+    segments = []
+    start = 0
+    while start < total_frames:
+        end = min(start + segment_frames, total_frames)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(channels)
+            wav.setsampwidth(sample_width)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm[start * frame_size:end * frame_size])
+        segments.append(buffer.getvalue())
+        if end == total_frames:
+            break
+        start += step_frames
+    return segments
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def stitch_transcripts(texts: list, max_overlap_words: int = 40) -> str:
+    """Join segment transcripts, removing the words repeated across each overlap"""
+    words = []
+    for text in texts:
+        new_words = (text or "").split()
+        if words and new_words:
+            tail = [_normalize_word(w) for w in words[-max_overlap_words:]]
+            head = [_normalize_word(w) for w in new_words[:max_overlap_words]]
+            for k in range(min(len(tail), len(head)), 1, -1):
+                if tail[-k:] == head[:k]:
+                    new_words = new_words[k:]
+                    break
+        words.extend(new_words)
+    return " ".join(words)
+
+
+def transcribe_long_audio(
+    backend,
+    data: bytes,
+    filename: str,
+    language: str = "ar",
+    segment_seconds: float = 300,
+    overlap_seconds: float = 5,
+    max_workers: int = 4,
+    on_progress=None,
+) -> str:
+    """
+    Transcribe a long recording segment by segment on a thread pool.
+
+    `on_progress(partial_text, done, total)` is called from the calling thread
+    each time a segment finishes, with the stitched text of the contiguous
+    segments finished so far.
+    """
+    segments = split_audio(data, filename, segment_seconds, overlap_seconds)
+    results = [None] * len(segments)
+
+    def transcribe_segment(index):
+        text = backend.transcribe((f"segment_{index:03d}.wav", segments[index]), model="whisper-1", language=language)
+        return index, text
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(telemetry.in_trace(transcribe_segment), i) for i in range(len(segments))]
+        done = 0
+        for future in as_completed(futures):
+            index, text = future.result()
+            results[index] = text
+            done += 1
+            if on_progress:
+                ready = []
+                for text in results:
+                    if text is None:
+                        break
+                    ready.append(text)
+                on_progress(stitch_transcripts(ready), done, len(segments))
+
+    return stitch_transcripts(results)
@@ -0,0 +1,263 @@
+"""
+Medication catalogue with indexed lookups.
+
+Entries are loaded from a CSV file or a SQLite database with the columns
+
+    name, generic_name, brand_names, arabic_names, therapeutic_class, in_stock, alternative
+
+where brand_names and arabic_names hold `|`-separated spellings. Every spelling
+is normalized (case, Arabic diacritics and letter variants, punctuation) into a
+token sequence. Whole names resolve through a dict; names embedded in longer
+text ("Metformin 500mg tablets", "start Jardiance 10 mg") go through a
+word-level Aho-Corasick automaton, so a short name never matches inside a
+longer word. Out-of-stock alternatives are precomputed per therapeutic class,
+and the source file is reloaded automatically when it changes on disk.
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+DEFAULT_CATALOGUE_PATH = os.getenv(
+    "MEDNOTE_MEDICATION_CATALOGUE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "medications.csv"),
+)
+
+NO_ALTERNATIVE = "consult pharmacist for equivalent medication"
+
+_ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_ARABIC_LETTERS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي"})
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_arabic(text: str) -> str:
+    """Strip Arabic diacritics and tatweel, and fold letter variants (أ/إ/آ → ا, ة → ه, ...)"""
+    return _ARABIC_DIACRITICS.sub("", text).translate(_ARABIC_LETTERS)
+
+
+def normalize_drug_name(text: str) -> str:
+    """Case-fold, strip Arabic diacritics/letter variants and punctuation"""
+    text = normalize_arabic(unicodedata.normalize("NFKC", str(text or "")).lower())
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _split_names(value) -> list:
+    return [part.strip() for part in str(value or "").split("|") if part.strip()]
+
+
+def _parse_bool(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "in stock")
+
+
+class _TokenAutomaton:
+    """Aho-Corasick automaton over word tokens rather than characters"""
+
+    def __init__(self, patterns: dict):
+        # patterns: tuple of tokens -> value
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for tokens, value in patterns.items():
+            state = 0
+            for token in tokens:
+                nxt = self._goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(tokens), value))
+
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(token, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, tokens: list) -> list:
+        """Leftmost-longest, non-overlapping matches as (start, end, value)"""
+        found = []
+        state = 0
+        for i, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for length, value in self._out[state]:
+                found.append((i - length + 1, i + 1, value))
+
+        found.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        matches = []
+        last_end = 0
+        for start, end, value in found:
+            if start >= last_end:
+                matches.append((start, end, value))
+                last_end = end
+        return matches
+
+
+class MedicationCatalogue:
+    """Indexed, hot-reloading view over a medication CSV/SQLite file"""
+
+    def __init__(self, path: str = None, rows: list = None, reload_interval: float = 2.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._rows = rows
+        self._build(rows if rows is not None else self._read_rows())
+
+    # ---- loading ---------------------------------------------------------
+
+    def _read_rows(self) -> list:
+        if not self.path or not os.path.exists(self.path):
+            return []
+        self._mtime = os.path.getmtime(self.path)
+        if self.path.endswith((".db", ".sqlite", ".sqlite3")):
+            with sqlite3.connect(self.path) as conn:
+                conn.row_factory = sqlite3.Row
+                return [dict(row) for row in conn.execute("SELECT * FROM medications")]
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def _build(self, rows: list):
+        entries = {}
+        by_class = {}
+        for row in rows:
+            name = normalize_drug_name(row.get("name"))
+            if not name:
+                continue
+            entry = {
+                "name": row.get("name", "").strip(),
+                "generic_name": normalize_drug_name(row.get("generic_name")) or name,
+                "therapeutic_class": (row.get("therapeutic_class") or "").strip(),
+                "in_stock": _parse_bool(row.get("in_stock", "1")),
+                "alternative": (row.get("alternative") or "").strip() or None,
+                "aliases": {name},
+            }
+            for alias in [row.get("generic_name")] + _split_names(row.get("brand_names")) + _split_names(row.get("arabic_names")):
+                alias = normalize_drug_name(alias)
+                if alias:
+                    entry["aliases"].add(alias)
+            entries[name] = entry
+            if entry["therapeutic_class"]:
+                by_class.setdefault(entry["therapeutic_class"].lower(), []).append(entry)
+
+        # Precompute what to suggest for every out-of-stock entry
+        for entry in entries.values():
+            if entry["in_stock"] or entry["alternative"]:
+                continue
+            same_class = [
+                other for other in by_class.get(entry["therapeutic_class"].lower(), [])
+                if other["in_stock"] and other["generic_name"] != entry["generic_name"]
+            ]
+            if same_class:
+                entry["alternative"] = f"{same_class[0]['name']} (same class {entry['therapeutic_class']})"
+            else:
+                entry["alternative"] = NO_ALTERNATIVE
+
+        index = {}
+        for entry in entries.values():
+            for alias in entry["aliases"]:
+                # A generic shared by two entries keeps the first one listed
+                index.setdefault(alias, entry)
+
+        automaton = _TokenAutomaton({tuple(alias.split()): entry for alias, entry in index.items()})
+        # Swap in one assignment so concurrent readers see old or new, never half
+        self._state = (index, automaton, len(entries))
+
+    def _maybe_reload(self):
+        if not self.path or self._rows is not None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+            if mtime != self._mtime:
+                self._build(self._read_rows())
+
+    # ---- lookups ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._state[2]
+
+    def lookup(self, medication_name: str):
+        """Catalogue entry for a prescribed name (exact or embedded), or None"""
+        self._maybe_reload()
+        return self._lookup(medication_name, self._state)
+
+    @staticmethod
+    def _lookup(medication_name, state):
+        index, automaton, _ = state
+        normalized = normalize_drug_name(medication_name)
+        entry = index.get(normalized)
+        if entry is None and normalized:
+            matches = automaton.search(normalized.split())
+            if matches:
+                entry = matches[0][2]
+        return entry
+
+    def find_mentions(self, text: str) -> list:
+        """Every catalogue medication mentioned in free text, in order of appearance"""
+        self._maybe_reload()
+        _, automaton, _ = self._state
+        mentions = {}
+        for _, _, entry in automaton.search(normalize_drug_name(text).split()):
+            mentions.setdefault(id(entry), entry)
+        return list(mentions.values())
+
+    def check(self, medication_name: str) -> dict:
+        """Stock status in the shape check_medication_stock has always returned"""
+        return self.check_many([medication_name])[0]
+
+    def check_many(self, medication_names: list) -> list:
+        """Batched stock check for a whole medication plan, one result per name"""
+        self._maybe_reload()
+        state = self._state
+        results = []
+        for medication_name in medication_names:
+            entry = self._lookup(medication_name, state)
+            if entry is None or entry["in_stock"]:
+                results.append({"in_stock": True, "alternative": None})
+            else:
+                results.append({"in_stock": False, "alternative": entry["alternative"]})
+        return results
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_medication_catalogue(fallback_rows: list = None) -> MedicationCatalogue:
+    """
+    Process-wide catalogue loaded from MEDNOTE_MEDICATION_CATALOGUE (or the
+    bundled data/medications.csv). `fallback_rows` are used when that file
+    does not exist.
+    """
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                if os.path.exists(DEFAULT_CATALOGUE_PATH) or not fallback_rows:
+                    _catalogue = MedicationCatalogue(DEFAULT_CATALOGUE_PATH)
+                else:
+                    _catalogue = MedicationCatalogue(rows=fallback_rows)
+    return _catalogue
@@ -0,0 +1,354 @@
+"""
+Local stand-in for the OpenAI API, for offline load tests and benchmarks.
+
+Speaks the subset of the API MedNote uses: chat completions (plain and
+streamed as server-sent events) and audio transcriptions. Responses are
+canned report JSON cut down to the keys the prompt asks for, so the full,
+parallel-group, map-reduce and incremental paths all parse; compact-mode
+prompts get minified JSON with short keys and empty fields left out.
+Latency, decode speed and error injection are configurable and seeded, so
+runs are reproducible.
+
+    python mock_openai_server.py --port 8765 --latency lognormal:0.8,0.4 --tokens-per-second 80 --error-rate 0.05
+    MEDNOTE_OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+
+or, in-process: MEDNOTE_BACKEND=mock (see backends.py).
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from compact_output import KEY_NAMES, alias_keys, prune_empty
+
+
+CANNED_REPORT = {
+    "conversation_overview": {
+        "what_patient_said": "Tired all the time for two weeks, very thirsty, passing urine often, vision sometimes blurred.",
+        "what_doctor_observed": "BP 140/90, BMI about 24, no acute distress.",
+        "conversation_summary": "Adult male with classic hyperglycaemia symptoms and raised blood pressure. Diabetes suspected, labs ordered and metformin started.",
+    },
+    "patient_name": "Ahmed Ali",
+    "demographics": {"age": "45", "gender": "Male", "weight": "79 kg", "height": "182 cm", "contact": ""},
+    "chief_complaint": "Fatigue, polydipsia and polyuria for two weeks",
+    "history_of_present_illness": "Two weeks of progressive fatigue, worse in the afternoon, with marked thirst, frequent urination including nocturia, and intermittent blurred vision. No weight loss reported. Drinks 4-5 cups of coffee daily and sleeps poorly.",
+    "past_medical_history": {"diabetes": "false", "hypertension": "Borderline readings last year", "other": ""},
+    "past_surgical_history": "None mentioned",
+    "current_medications": [],
+    "allergies": {"drug_allergies": ["Penicillin"], "reactions": ["Rash"]},
+    "vital_signs": {"blood_pressure": "140/90", "heart_rate": "82", "respiratory_rate": "", "temperature": "36.8 C", "oxygen_saturation": ""},
+    "physical_examination": "No physical examination documented in this conversation",
+    "lab_results": {"mentioned": False, "details": ""},
+    "social_history": {"smoking": "Non-smoker", "alcohol": "None", "diet": "High caffeine intake", "occupation": "Office worker", "sleep": "Poor"},
+    "family_history": {"diabetes": "Father", "hypertension": "Mother", "heart_disease": "false", "cancer": "false", "other": ""},
+    "clinical_assessment": {
+        "suspected_diagnosis": "Type 2 diabetes mellitus (suspected), stage 1 hypertension",
+        "differential_diagnosis": ["Type 1 diabetes", "Hyperthyroidism", "Diabetes insipidus"],
+        "reasoning": "Polydipsia, polyuria, fatigue and blurred vision with a family history of diabetes match ADA criteria for suspected T2DM; BP 140/90 meets stage 1 hypertension.",
+    },
+    "recommended_workup": ["HbA1c and fasting glucose", "Renal function and urine albumin", "Lipid profile", "TSH"],
+    "medication_plan": [
+        {
+            "name": "Metformin",
+            "dose": "500 mg tablet",
+            "frequency": "Twice daily with meals",
+            "duration": "Ongoing",
+            "instructions": "Start once daily for one week to limit GI upset",
+            "guideline_basis": "ADA 2024 first-line therapy",
+        },
+        {
+            "name": "Empagliflozin",
+            "dose": "10 mg tablet",
+            "frequency": "Once daily",
+            "duration": "Ongoing",
+            "instructions": "Add if HbA1c above target after 3 months",
+            "guideline_basis": "ADA 2024 SGLT2 inhibitor for cardiorenal protection",
+        },
+    ],
+    "safety_checks": ["Check eGFR before metformin", "Monitor BP weekly"],
+    "contraindications_checked": ["No kidney disease reported", "Penicillin allergy noted"],
+    "alternative_if_contraindicated": ["Dapagliflozin if empagliflozin unavailable"],
+    "follow_up": "Review in 2 weeks with lab results",
+    "doctor_advisory_missing_questions": ["Any recent weight loss?", "Any numbness in the feet?"],
+    "patient_report": "Your symptoms suggest high blood sugar. We ordered blood tests and started metformin. Drink water, cut down on coffee and sugary food, and come back in 2 weeks or sooner if you feel very unwell.",
+}
+
+CANNED_TRANSCRIPT = (
+    "Doctor: What brings you in today? Patient: I have been tired for two weeks and I am thirsty all the time. "
+    "Doctor: Your blood pressure is 140/90."
+)
+
+_SCHEMA_KEY = re.compile(r'^  "(\w+)":', re.M)
+
+
+def _sampler(spec: str):
+    """Parse 'fixed:s', 'uniform:a,b', 'normal:mean,std' or 'lognormal:median,sigma'"""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: values[0] * math.exp(rng.gauss(0, values[1]))
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockConfig:
+    """Behaviour of the mock server; every field can be set from MEDNOTE_MOCK_* variables"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0.3",
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        error_statuses=(429, 500, 503),
+        retry_after: float = 1.0,
+        transcribe_bytes_per_second: float = 0.0,
+        time_scale: float = 1.0,
+        seed: int = 0,
+        report: dict = None,
+        transcript: str = CANNED_TRANSCRIPT,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.transcribe_bytes_per_second = transcribe_bytes_per_second
+        self.time_scale = time_scale
+        self.seed = seed
+        self.report = report or CANNED_REPORT
+        self.transcript = transcript
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        report = None
+        if env.get("MEDNOTE_MOCK_REPORT"):
+            with open(env["MEDNOTE_MOCK_REPORT"], encoding="utf-8") as f:
+                report = json.load(f)
+        return cls(
+            latency=env.get("MEDNOTE_MOCK_LATENCY", "fixed:0.3"),
+            tokens_per_second=float(env.get("MEDNOTE_MOCK_TPS", "0")),
+            error_rate=float(env.get("MEDNOTE_MOCK_ERROR_RATE", "0")),
+            time_scale=float(env.get("MEDNOTE_MOCK_TIME_SCALE", "1")),
+            seed=int(env.get("MEDNOTE_MOCK_SEED", "0")),
+            report=report,
+        )
+
+
+class _MockState:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.sample_latency = _sampler(config.latency)
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "chat": 0, "stream": 0, "transcriptions": 0, "errors_injected": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+
+    def draw(self):
+        """(latency seconds, injected error status or None), drawn under one lock for determinism"""
+        with self.lock:
+            latency = self.sample_latency(self.rng)
+            error = None
+            if self.config.error_rate and self.rng.random() < self.config.error_rate:
+                error = self.rng.choice(self.config.error_statuses)
+            return latency, error
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds * self.config.time_scale)
+
+    def completion_for(self, messages: list) -> str:
+        system = messages[0].get("content", "") if messages else ""
+        if "patient_profile_updates" in system:
+            return json.dumps({"patient_profile_updates": {"follow_up": self.config.report.get("follow_up", "")}})
+        keys = _SCHEMA_KEY.findall(system)
+        # A compact-mode schema names its keys by alias; answer the way the model is asked to
+        compact = any(key in KEY_NAMES for key in keys)
+        keys = [KEY_NAMES.get(key, key) for key in keys]
+        report = self.config.report
+        subset = {key: report[key] for key in keys if key in report} if keys else report
+        if compact:
+            return json.dumps(alias_keys(prune_empty(subset)), ensure_ascii=False, separators=(",", ":"))
+        return json.dumps(subset, ensure_ascii=False, indent=2)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set per server in start_mock_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_error(self, status: int):
+        self.state.count(errors_injected=1)
+        headers = {"Retry-After": str(self.state.config.retry_after)} if status == 429 else {}
+        kind = "rate_limit_exceeded" if status == 429 else "server_error"
+        self._send_json(status, {"error": {"message": f"Injected {status}", "type": kind, "code": kind}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/mock/stats"):
+            with self.state.lock:
+                self._send_json(200, dict(self.state.stats))
+        elif self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}, {"id": "whisper-1", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.state.count(requests=1)
+        latency, error = self.state.draw()
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self.state.sleep(latency)
+            if error:
+                return self._inject_error(error)
+            request = json.loads(body or b"{}")
+            if request.get("stream"):
+                return self._stream_chat(request)
+            return self._chat(request)
+
+        if self.path.rstrip("/").endswith("/audio/transcriptions"):
+            rate = self.state.config.transcribe_bytes_per_second
+            self.state.sleep(latency + (len(body) / rate if rate else 0))
+            if error:
+                return self._inject_error(error)
+            self.state.count(transcriptions=1)
+            # Duration as if the upload were 128 kbit/s audio; real servers only send it for verbose_json
+            return self._send_json(200, {"text": self.state.config.transcript, "duration": round(len(body) / 16000, 2)})
+
+        self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}"}})
+
+    def _chat(self, request: dict):
+        content = self.state.completion_for(request.get("messages", []))
+        prompt_tokens = sum(_tokens(str(m.get("content", ""))) for m in request.get("messages", []))
+        completion_tokens = _tokens(content)
+        tps = self.state.config.tokens_per_second
+        self.state.sleep(completion_tokens / tps if tps else 0)
+        self.state.count(chat=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def _stream_chat(self, request: dict):
+        content = self.state.completion_for(request.get("messages", []))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, usage=None):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        event({"role": "assistant", "content": ""})
+        tps = self.state.config.tokens_per_second
+        # ~4 characters per token, flushed 8 tokens at a time
+        step = 32
+        for i in range(0, len(content), step):
+            event({"content": content[i:i + step]})
+            self.wfile.flush()
+            self.state.sleep(8 / tps if tps else 0)
+        event({}, "stop")
+        prompt_tokens = sum(_tokens(str(m.get("content", ""))) for m in request.get("messages", []))
+        completion_tokens = _tokens(content)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event({}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                             "total_tokens": prompt_tokens + completion_tokens})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.state.count(stream=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def start_mock_server(config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Serve in a daemon thread; returns (server, base_url). port=0 picks a free port."""
+    handler = type("MockHandler", (_Handler,), {"state": _MockState(config or MockConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI API stand-in for MedNote benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0.3", help="fixed:s | uniform:a,b | normal:mean,std | lognormal:median,sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="completion decode rate, 0 for instant")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[429, 500, 503])
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="JSON file with the canned report")
+    args = parser.parse_args()
+
+    report = None
+    if args.report:
+        with open(args.report, encoding="utf-8") as f:
+            report = json.load(f)
+    config = MockConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        report=report,
+    )
+    handler = type("MockHandler", (_Handler,), {"state": _MockState(config)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Mock OpenAI API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
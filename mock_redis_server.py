@@ -0,0 +1,164 @@
+"""
+Local stand-in for a Redis server, for running several app replicas and the
+state benchmarks without installing Redis.
+
+Speaks the RESP2 subset state_backend.py uses (PING, AUTH, SELECT, GET, SET
+with EX/PX/NX/XX, DEL, EXISTS, PTTL, DBSIZE, FLUSHDB, QUIT) over plain TCP,
+with numbered databases and key expiry. Everything lives in memory, so it is
+shared between replicas but not durable; point production at a real server.
+
+    python mock_redis_server.py --port 6390
+    MEDNOTE_STATE_BACKEND=redis://127.0.0.1:6390/0 streamlit run app.py --server.port 8501
+    MEDNOTE_STATE_BACKEND=redis://127.0.0.1:6390/0 streamlit run app.py --server.port 8502
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+from state_backend import read_reply
+
+
+class _Store:
+    """Numbered databases of key -> (value, expires_at or None)"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.databases = {}
+        self.lock = threading.Lock()
+
+    def db(self, index: int) -> dict:
+        return self.databases.setdefault(index, {})
+
+    def live(self, db: dict, key: bytes):
+        entry = db.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del db[key]
+            return None
+        return entry
+
+
+def _bulk(value) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _error(message: str) -> bytes:
+    return f"-{message}\r\n".encode("utf-8")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    store = None  # set on the subclass made by start_mock_redis_server
+
+    def handle(self):
+        self.database = 0
+        while True:
+            try:
+                request = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if request is None:
+                return
+            if self.store.latency:
+                time.sleep(self.store.latency)
+            name = request[0].upper().decode("utf-8", "replace") if request else ""
+            reply = self._execute(name, request[1:])
+            self.wfile.write(reply)
+            self.wfile.flush()
+            if name == "QUIT":
+                return
+
+    def _read_command(self):
+        """Arguments of the next command, multibulk or inline; None at end of stream"""
+        first = self.rfile.peek(1)[:1]
+        if not first:
+            return None
+        if first == b"*":
+            request = read_reply(self.rfile)
+            if not isinstance(request, list) or not all(isinstance(arg, bytes) for arg in request):
+                raise ValueError("Malformed command")
+            return request
+        line = self.rfile.readline()
+        if not line.endswith(b"\n"):
+            return None
+        return line.strip().split()
+
+    def _execute(self, name: str, args: list) -> bytes:
+        store = self.store
+        with store.lock:
+            db = store.db(self.database)
+            if name == "PING":
+                return _bulk(args[0]) if args else b"+PONG\r\n"
+            if name in ("AUTH", "QUIT"):
+                return b"+OK\r\n"
+            if name == "SELECT" and len(args) == 1:
+                self.database = int(args[0])
+                return b"+OK\r\n"
+            if name == "GET" and len(args) == 1:
+                entry = store.live(db, args[0])
+                return _bulk(entry[0] if entry else None)
+            if name == "SET" and len(args) >= 2:
+                return self._set(db, args)
+            if name == "DEL" and args:
+                removed = sum(1 for key in args if store.live(db, key) and db.pop(key, None))
+                return b":%d\r\n" % removed
+            if name == "EXISTS" and args:
+                return b":%d\r\n" % sum(1 for key in args if store.live(db, key))
+            if name == "PTTL" and len(args) == 1:
+                entry = store.live(db, args[0])
+                if entry is None:
+                    return b":-2\r\n"
+                return b":-1\r\n" if entry[1] is None else b":%d\r\n" % int((entry[1] - time.time()) * 1000)
+            if name == "DBSIZE":
+                return b":%d\r\n" % sum(1 for key in list(db) if store.live(db, key))
+            if name == "FLUSHDB":
+                db.clear()
+                return b"+OK\r\n"
+        return _error(f"ERR unknown command or wrong number of arguments for '{name.lower()}'")
+
+    def _set(self, db: dict, args: list) -> bytes:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        try:
+            for flag, unit in ((b"EX", 1.0), (b"PX", 0.001)):
+                if flag in options:
+                    expires_at = time.time() + int(options[options.index(flag) + 1]) * unit
+        except (IndexError, ValueError):
+            return _error("ERR syntax error")
+        exists = self.store.live(db, key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return _bulk(None)
+        db[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_mock_redis_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+    """Serve in a daemon thread; returns (server, url). port=0 picks a free port."""
+    handler = type("MockRedisHandler", (_Handler,), {"store": _Store(latency)})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="mock-redis", daemon=True).start()
+    return server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Redis-protocol stand-in for MedNote session state")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every command")
+    args = parser.parse_args()
+
+    handler = type("MockRedisHandler", (_Handler,), {"store": _Store(args.latency)})
+    server = _Server((args.host, args.port), handler)
+    print(f"Mock Redis on redis://{args.host}:{args.port}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
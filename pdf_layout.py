@@ -0,0 +1,112 @@
+"""
+Text layout for the PDF export.
+
+Glyph widths are looked up once per font and character instead of measuring
+the growing line with stringWidth for every word, and wrapped line lists are
+cached, so re-rendering the same report does no layout work.
+
+An Arabic-capable TTF is registered when one is available (set
+MEDNOTE_PDF_ARABIC_FONT to its path); Arabic text is then measured and drawn
+with it instead of Helvetica, which has no Arabic glyphs.
+"""
+import os
+import re
+from functools import lru_cache
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+
+ARABIC_FONT_NAME = "MedNoteArabic"
+ARABIC_FONT_CANDIDATES = [
+    os.getenv("MEDNOTE_PDF_ARABIC_FONT", ""),
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+_ARABIC_CHARS = re.compile("[\u0600-\u06ff\u0750-\u077f\ufb50-\ufdff\ufe70-\ufeff]")
+
+
+class GlyphWidths:
+    """Per-character advance widths of one font, in 1/1000 em"""
+
+    def __init__(self, font_name: str):
+        self.font_name = font_name
+        font = pdfmetrics.getFont(font_name)
+        # Latin-1 up front; anything else is measured on first use
+        self._widths = {chr(code): font.stringWidth(chr(code), 1000) for code in range(32, 256)}
+        self._font = font
+
+    def char(self, ch: str) -> float:
+        width = self._widths.get(ch)
+        if width is None:
+            width = self._widths[ch] = self._font.stringWidth(ch, 1000)
+        return width
+
+    def text(self, text: str) -> float:
+        widths = self._widths
+        total = 0.0
+        for ch in text:
+            width = widths.get(ch)
+            total += width if width is not None else self.char(ch)
+        return total
+
+
+@lru_cache(maxsize=None)
+def glyph_widths(font_name: str) -> GlyphWidths:
+    return GlyphWidths(font_name)
+
+
+@lru_cache(maxsize=1)
+def arabic_font():
+    """Name of the registered Arabic-capable font, or None when none was found"""
+    for path in ARABIC_FONT_CANDIDATES:
+        if path and os.path.exists(path):
+            try:
+                pdfmetrics.registerFont(TTFont(ARABIC_FONT_NAME, path))
+                return ARABIC_FONT_NAME
+            except Exception:
+                continue
+    return None
+
+
+def font_for_text(text: str, font: str) -> str:
+    if _ARABIC_CHARS.search(text):
+        return arabic_font() or font
+    return font
+
+
+@lru_cache(maxsize=2048)
+def wrap_text(text: str, font: str, size: float, max_width: float, max_lines=None) -> tuple:
+    """
+    Greedy word wrap in one pass over the words.
+
+    Same breaks as measuring `line + word + " "` with stringWidth and breaking
+    once it reaches max_width, but each word is measured once and the line
+    width is kept as a running total. Stops after max_lines lines.
+    """
+    metrics = glyph_widths(font)
+    # Compare in 1/1000 em so the running total stays exact for Type 1 widths
+    limit = max_width * 1000.0 / size
+    space = metrics.char(" ")
+    lines = []
+    words = []
+    line_width = 0.0
+
+    for word in text.split():
+        word_width = metrics.text(word) + space
+        if line_width + word_width < limit:
+            words.append(word)
+            line_width += word_width
+            continue
+        if words:
+            lines.append(" ".join(words))
+            if max_lines is not None and len(lines) >= max_lines:
+                return tuple(lines)
+        words = [word]
+        line_width = word_width
+
+    if words and (max_lines is None or len(lines) < max_lines):
+        lines.append(" ".join(words))
+    return tuple(lines)
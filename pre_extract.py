@@ -0,0 +1,182 @@
+"""
+Deterministic extraction of measurements and drug mentions from a transcript.
+
+Blood pressure, heart rate, temperature, oxygen saturation, respiratory rate,
+weight, height and age follow a handful of patterns ("140/90", "79 kg",
+"١٨٢ سم", "pulse 88"), so they are pulled out with compiled regexes in a few
+milliseconds instead of waiting for the model. Drug names come from the
+medication catalogue's token automaton, which already knows brand, generic
+and Arabic names.
+
+The result is shown in the patient profile as soon as a transcript exists,
+and fields with one unambiguous reading are handed to the report prompt as
+hints the model checks against the conversation; its output stays the
+report. Ages and body measurements said about someone else ("my father died
+aged 62") and weight changes ("lost 5 kg") are not readings of the patient.
+"""
+import re
+
+from medication_catalogue import get_medication_catalogue
+
+
+# Arabic-Indic and Persian digits, Arabic decimal and thousands separators. One
+# character in, one out, so match positions still line up with the transcript.
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬", "0123456789" "0123456789" ".,")
+
+_NUMBER = r"(\d{1,3}(?:[.,]\d{1,2})?)"
+_GAP = r"[^\d\n]{0,20}?"  # label, "is", "of", "was", "كان" ... between a label and its value
+
+# A demographic said about someone else: "my father died aged 62", "her son weighs 30 kg"
+_THIRD_PARTY = re.compile(
+    r"\b(?:father|mother|dad|mum|mom|parents?|brother|sister|siblings?|sons?|daughters?|child(?:ren)?|kids?|baby|"
+    r"wife|husband|partner|grand(?:father|mother|pa|ma|son|daughter|child)|uncle|aunt|cousin|nephew|niece|"
+    r"friend|colleague|neighbou?r)\b"
+    # Arabic: "my father", "my mother", ...; may carry a prefix (وأبي) but not a suffix (أبيض)
+    r"|(?:أبي|ابي|أبوي|ابوي|والدي|والدتي|أمي|امي|أخي|اخي|أختي|اختي|ابني|ابنتي|بنتي|زوجي|زوجتي|جدي|جدتي"
+    r"|عمي|عمتي|خالي|خالتي|صديقي)(?![\u0621-\u064a])",
+    re.IGNORECASE,
+)
+# A change in weight rather than the weight: "lost 5 kg", "gained about 3 kilos", "5 kg heavier"
+_WEIGHT_CHANGE_BEFORE = re.compile(
+    r"(?:\b(?:lost|lose|losing|loss\s*of|gained|gain|gaining|put\s*on|dropped|down|up|by)"
+    r"|خسر|خسرت|نقص|نقصت|زاد|زادت|فقد|فقدت|نزل|نزلت)"
+    r"\s*(?:about|around|nearly|almost|over|roughly|another|حوالي|تقريبا|تقريباً)?\s*$",
+    re.IGNORECASE,
+)
+_WEIGHT_CHANGE_AFTER = re.compile(r"\s*(?:of\s*)?(?:weight\s*)?(?:loss|gain|lighter|heavier|less|more)\b", re.IGNORECASE)
+_CLAUSE_END = re.compile(r"[.!?;\n؛؟]")
+
+# (report section, field, pattern, unit formatter, plausible range)
+_PATTERNS = [
+    ("vital_signs", "blood_pressure", re.compile(
+        # Not part of a date (12/05/2024) or a decimal
+        r"(?<![\d/])(?<!\d[.,])(\d{2,3})\s*(?:/|\\|over|على)\s*(\d{2,3})(?![\d/]|[.,]\d)"
+        r"(?:\s*(?:mm\s*hg|mmhg|ملم\s*زئبق|مم\s*زئبق))?",
+        re.IGNORECASE,
+    ), None, None),
+    ("vital_signs", "heart_rate", re.compile(
+        rf"(?:heart\s*rate|pulse(?:\s*rate)?|\bhr\b|النبض|نبض|نبضات\s*القلب|ضربات\s*القلب){_GAP}(\d{{2,3}})"
+        r"|(\d{2,3})\s*(?:bpm|beats?\s*(?:per|a|/)\s*min(?:ute)?|نبضة|ضربة)",
+        re.IGNORECASE,
+    ), "{} bpm", (25, 250)),
+    ("vital_signs", "temperature", re.compile(
+        rf"(?:temperature|\btemp\b|fever\s*of|الحرارة|حرارة|حرارته|حرارتها){_GAP}{_NUMBER}"
+        rf"|{_NUMBER}\s*(?:°\s*c\b|degrees?\s*(?:celsius|c\b)|celsius|درجة\s*مئوية|درجة)",
+        re.IGNORECASE,
+    ), "{} °C", (34, 43)),
+    ("vital_signs", "oxygen_saturation", re.compile(
+        rf"(?:spo2|sp02|o2\s*sat(?:uration)?|oxygen(?:\s*saturation)?|\bsats?\b|saturation|تشبع(?:\s*الأكسجين)?|الأكسجين|الاكسجين){_GAP}(\d{{2,3}})\s*%?",
+        re.IGNORECASE,
+    ), "{}%", (50, 100)),
+    ("vital_signs", "respiratory_rate", re.compile(
+        rf"(?:respiratory\s*rate|resp(?:iration)?\s*rate|breathing\s*rate|\brr\b|معدل\s*التنفس|التنفس){_GAP}(\d{{1,2}})(?!\d)"
+        r"|(\d{1,2})\s*(?:breaths?\s*(?:per|a|/)\s*min(?:ute)?|نفس\s*في\s*الدقيقة)",
+        re.IGNORECASE,
+    ), "{} /min", (6, 60)),
+    ("demographics", "weight", re.compile(
+        rf"{_NUMBER}\s*(?:kg\b|kgs\b|kilo(?:gram)?s?\b|كيلو(?:غرام|جرام)?|كغم?|كجم)",
+        re.IGNORECASE,
+    ), "{} kg", (2, 350)),
+    ("demographics", "height", re.compile(
+        r"(\d{2,3})\s*(?:cm\b|centimet(?:er|re)s?\b|سم\b|سنتيمتر|سنتي|سانتي)"
+        r"|(\d[.,]\d{1,2})\s*(?:m\b|met(?:er|re)s?\b|متر)",
+        re.IGNORECASE,
+    ), None, None),
+    ("demographics", "age", re.compile(
+        r"(\d{1,3})\s*(?:-\s*)?(?:years?[\s-]*old|y/?o\b|yrs?[\s-]*old)"
+        rf"|(?:\baged?\b|عمري|عمره|عمرها|العمر|عمر){_GAP}(\d{{1,3}})",
+        re.IGNORECASE,
+    ), "{} years", (0, 120)),
+]
+
+
+def normalize_digits(text: str) -> str:
+    return (text or "").translate(_DIGITS)
+
+
+def _number(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def _format(value: str) -> str:
+    return value.replace(",", ".")
+
+
+def _about_patient(section: str, field: str, text: str, match) -> bool:
+    """False for demographics of a relative or third party, and for weight changes"""
+    if section != "demographics":
+        return True
+    before = text[max(0, match.start() - 80):match.start()]
+    if _THIRD_PARTY.search(_CLAUSE_END.split(before)[-1]):
+        return False
+    if field == "weight":
+        return not (_WEIGHT_CHANGE_BEFORE.search(before) or _WEIGHT_CHANGE_AFTER.match(text, match.end()))
+    return True
+
+
+def _reading(field: str, match, fmt, bounds):
+    """Formatted value for one match, or None when it's implausible (a date, a dose, ...)"""
+    if field == "blood_pressure":
+        systolic, diastolic = int(match.group(1)), int(match.group(2))
+        if 60 <= systolic <= 260 and 30 <= diastolic <= 160 and systolic > diastolic:
+            return f"{systolic}/{diastolic} mmHg"
+        return None
+    if field == "height":
+        if match.group(1):
+            return f"{match.group(1)} cm" if 40 <= int(match.group(1)) <= 230 else None
+        metres = _number(match.group(2))
+        return f"{round(metres * 100)} cm" if 0.4 <= metres <= 2.3 else None
+    value = next(group for group in match.groups() if group)
+    low, high = bounds
+    return fmt.format(_format(value)) if low <= _number(value) <= high else None
+
+
+def extract_measurements(transcript: str) -> dict:
+    """
+    {section: {field: [readings in order of appearance]}} for every pattern
+    that matched, e.g. {"vital_signs": {"blood_pressure": ["140/90 mmHg"]}}
+    """
+    text = normalize_digits(transcript)
+    found = {}
+    for section, field, pattern, fmt, bounds in _PATTERNS:
+        readings = []
+        for match in pattern.finditer(text):
+            if not _about_patient(section, field, text, match):
+                continue
+            reading = _reading(field, match, fmt, bounds)
+            if reading and reading not in readings:
+                readings.append(reading)
+        if readings:
+            found.setdefault(section, {})[field] = readings
+    return found
+
+
+def extract_medications(transcript: str, catalogue=None) -> list:
+    """Catalogue medications mentioned anywhere in the transcript, with stock status"""
+    catalogue = catalogue or get_medication_catalogue()
+    return [
+        {"name": entry["name"], "in_stock": entry["in_stock"], "alternative": None if entry["in_stock"] else entry["alternative"]}
+        for entry in catalogue.find_mentions(normalize_digits(transcript))
+    ]
+
+
+def pre_extract(transcript: str, catalogue=None) -> dict:
+    """{"measurements": extract_measurements(...), "medications": extract_medications(...)}"""
+    return {
+        "measurements": extract_measurements(transcript),
+        "medications": extract_medications(transcript, catalogue) if transcript else [],
+    }
+
+
+def prefilled_fields(extraction: dict) -> dict:
+    """
+    Hints for the report prompt: {section: {field: value}} for fields with
+    exactly one reading. A field read twice with different values (two blood
+    pressures, "5 kg" and "79 kg") is left for the model to interpret.
+    """
+    prefilled = {}
+    for section, fields in extraction["measurements"].items():
+        single = {field: readings[0] for field, readings in fields.items() if len(readings) == 1}
+        if single:
+            prefilled[section] = single
+    return prefilled
@@ -0,0 +1,176 @@
+"""
+Two-tier cache for generated medical reports.
+
+Reports are content-addressed: the key is a hash of the transcript, report
+language, model name and prompt version, so an unchanged consultation never
+hits the API twice. A small in-memory LRU serves reruns within a process and
+a SQLite file keeps results across server restarts.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_DIR = os.getenv("MEDNOTE_CACHE_DIR", ".mednote_cache")
+
+
+def report_cache_key(transcript: str, report_language: str, model: str, prompt_version: str) -> str:
+    """Content hash identifying one report generation request"""
+    payload = json.dumps(
+        [transcript.strip(), report_language.lower(), model, prompt_version],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    """In-memory LRU in front of a SQLite store, with TTL and size eviction"""
+
+    def __init__(
+        self,
+        path: str = None,
+        memory_entries: int = 128,
+        disk_entries: int = 5000,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "seconds_saved": 0.0,
+        }
+
+        self._db = None
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "reports.sqlite3")
+        if path:
+            try:
+                if path != ":memory:":
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS reports ("
+                    " key TEXT PRIMARY KEY,"
+                    " report TEXT NOT NULL,"
+                    " elapsed REAL NOT NULL,"
+                    " created_at REAL NOT NULL,"
+                    " accessed_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_reports_accessed ON reports (accessed_at)")
+                self._db.commit()
+            except sqlite3.Error:
+                # Read-only or full disk: fall back to the memory tier only
+                self._db = None
+
+    def get(self, key: str):
+        """Return a fresh copy of the cached report, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                payload, elapsed, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    self._stats["seconds_saved"] += elapsed
+                    return json.loads(payload)
+                del self._memory[key]
+                self._stats["evictions"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT report, elapsed, created_at FROM reports WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    payload, elapsed, created_at = row
+                    if now - created_at <= self.ttl_seconds:
+                        self._db.execute("UPDATE reports SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, payload, elapsed, created_at)
+                        self._stats["disk_hits"] += 1
+                        self._stats["seconds_saved"] += elapsed
+                        return json.loads(payload)
+                    self._db.execute("DELETE FROM reports WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["evictions"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, report: dict, elapsed: float = 0.0):
+        """Store a successfully generated report in both tiers"""
+        payload = json.dumps(report, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._remember(key, payload, elapsed, now)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO reports (key, report, elapsed, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, elapsed, now, now),
+                )
+                self._prune_disk(now)
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM reports")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus the generation time the cache has saved"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = (
+                self._db.execute("SELECT COUNT(*) FROM reports").fetchone()[0] if self._db is not None else 0
+            )
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, payload, elapsed, created_at):
+        self._memory[key] = (payload, elapsed, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _prune_disk(self, now):
+        expired = self._db.execute(
+            "DELETE FROM reports WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._db.execute(
+            "DELETE FROM reports WHERE key IN ("
+            " SELECT key FROM reports ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,),
+        ).rowcount
+        self._stats["evictions"] += max(expired, 0) + max(overflow, 0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportCache:
+    """Process-wide report cache shared by every Streamlit session"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ReportCache()
+    return _cache
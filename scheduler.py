@@ -0,0 +1,218 @@
+"""
+Process-wide scheduling of model API work across Streamlit sessions.
+
+Two layers keep a burst of doctors inside the account's rate limits:
+
+- `Scheduler` admits whole jobs (a transcription, a report generation) into
+  a bounded number of slots. Waiting jobs are queued per doctor and served
+  round-robin, so one doctor uploading ten recordings doesn't starve the
+  others, and callers can show their queue position while they wait.
+- `RateLimiter` holds token buckets for requests/min and tokens/min per
+  operation. The backend takes from it before every API request, including
+  the concurrent ones of parallel and map-reduce extraction and retries, so
+  load turns into waiting instead of 429s.
+
+Limits come from the environment (defaults match a tier-1 OpenAI account):
+    MEDNOTE_MAX_CONCURRENT_JOBS                        slots (8)
+    MEDNOTE_CHAT_RPM / MEDNOTE_CHAT_TPM                (500 / 200000)
+    MEDNOTE_TRANSCRIBE_RPM                             (50)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """`rate_per_minute` tokens refill continuously up to `capacity` (one minute's worth by default)"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now, possibly going into debt; returns how long the caller must wait"""
+        # Requests bigger than the bucket still go through, after a full refill
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets per operation; acquire() blocks until both allow the call"""
+
+    def __init__(self, limits: dict):
+        # limits: operation -> (requests_per_minute, tokens_per_minute or None)
+        self._buckets = {
+            operation: (TokenBucket(rpm), TokenBucket(tpm) if tpm else None)
+            for operation, (rpm, tpm) in limits.items()
+        }
+        self._lock = threading.Lock()
+        self._waits = {"waited": 0, "seconds_waited": 0.0}
+
+    def acquire(self, operation: str, tokens: int = 0) -> float:
+        buckets = self._buckets.get(operation)
+        if buckets is None:
+            return 0.0
+        requests, tpm = buckets
+        delay = requests.reserve(1)
+        if tpm is not None and tokens:
+            delay = max(delay, tpm.reserve(tokens))
+        if delay > 0:
+            with self._lock:
+                self._waits["waited"] += 1
+                self._waits["seconds_waited"] += delay
+            time.sleep(delay)
+        return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._waits)
+        for operation, (requests, tpm) in self._buckets.items():
+            stats[f"{operation}_requests_available"] = round(requests.available, 1)
+            if tpm is not None:
+                stats[f"{operation}_tokens_available"] = round(tpm.available)
+        return stats
+
+
+class _Ticket:
+    def __init__(self, owner: str, operation: str):
+        self.owner = owner
+        self.operation = operation
+        self.granted = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+class Scheduler:
+    """Bounded job slots, granted round-robin across doctors"""
+
+    def __init__(self, max_concurrent: int = 8):
+        self.max_concurrent = max_concurrent
+        self._queues = OrderedDict()   # owner -> deque of waiting tickets, in rotation order
+        self._running = 0
+        self._lock = threading.Lock()
+        self._stats = {"jobs": 0, "queued": 0, "max_queue": 0, "seconds_queued": 0.0}
+
+    @contextmanager
+    def slot(self, owner: str, operation: str = "job", on_wait=None, poll_interval: float = 0.5):
+        """
+        Hold one job slot for the duration of the block.
+
+        While queued, on_wait(position, waiting) is called every poll_interval
+        seconds; position 1 means next in line.
+        """
+        ticket = self._enqueue(owner, operation)
+        try:
+            while not ticket.granted.wait(poll_interval if on_wait else None):
+                on_wait(*self.position(ticket))
+            yield
+        finally:
+            self._release(ticket)
+
+    def _enqueue(self, owner: str, operation: str) -> _Ticket:
+        ticket = _Ticket(owner, operation)
+        with self._lock:
+            self._stats["jobs"] += 1
+            self._queues.setdefault(owner, deque()).append(ticket)
+            waiting = sum(len(q) for q in self._queues.values())
+            self._stats["max_queue"] = max(self._stats["max_queue"], waiting)
+            self._grant()
+            if not ticket.granted.is_set():
+                self._stats["queued"] += 1
+        return ticket
+
+    def _grant(self):
+        # Caller holds the lock. Serve the doctor at the front of the rotation,
+        # then move them to the back.
+        while self._running < self.max_concurrent and self._queues:
+            owner, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self._queues.pop(owner)
+            if queue:
+                self._queues[owner] = queue
+            self._running += 1
+            self._stats["seconds_queued"] += time.monotonic() - ticket.enqueued_at
+            ticket.granted.set()
+
+    def _release(self, ticket: _Ticket):
+        with self._lock:
+            if ticket.granted.is_set():
+                self._running -= 1
+            else:
+                # Abandoned while still queued (e.g. the session went away)
+                queue = self._queues.get(ticket.owner)
+                if queue and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        self._queues.pop(ticket.owner)
+            self._grant()
+
+    def position(self, ticket: _Ticket) -> tuple:
+        """(1-based place in line, total waiting) following the round-robin order"""
+        with self._lock:
+            if ticket.granted.is_set():
+                return 0, sum(len(q) for q in self._queues.values())
+            owners = list(self._queues)
+            queue = self._queues.get(ticket.owner, ())
+            index = list(queue).index(ticket) if ticket in queue else 0
+            rank = owners.index(ticket.owner) if ticket.owner in owners else 0
+            ahead = index
+            for i, owner in enumerate(owners):
+                if owner != ticket.owner:
+                    # Doctors earlier in the rotation get one more turn before ours
+                    ahead += min(len(self._queues[owner]), index + (1 if i < rank else 0))
+            return ahead + 1, sum(len(q) for q in self._queues.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "running": self._running,
+                "waiting": sum(len(q) for q in self._queues.values()),
+                "max_concurrent": self.max_concurrent,
+            }
+
+
+_scheduler = None
+_limiter = None
+_singleton_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Process-wide job scheduler shared by every Streamlit session"""
+    global _scheduler
+    if _scheduler is None:
+        with _singleton_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler(int(os.getenv("MEDNOTE_MAX_CONCURRENT_JOBS", 8)))
+    return _scheduler
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide API rate limiter shared by every backend call"""
+    global _limiter
+    if _limiter is None:
+        with _singleton_lock:
+            if _limiter is None:
+                _limiter = RateLimiter({
+                    "chat": (float(os.getenv("MEDNOTE_CHAT_RPM", 500)), float(os.getenv("MEDNOTE_CHAT_TPM", 200000))),
+                    "transcribe": (float(os.getenv("MEDNOTE_TRANSCRIBE_RPM", 50)), None),
+                })
+    return _limiter
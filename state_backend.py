@@ -0,0 +1,297 @@
+"""
+Shared store for the live state of open consultations.
+
+Streamlit keeps st.session_state in the process that serves the browser's
+websocket, so a restarted worker, or a reconnect that lands on another
+replica behind a load balancer, starts from an empty session. app.py writes
+the open consultation (transcript, report, language, doctor, job ids) here
+on every change and reads it back, keyed by the consultation id in the URL,
+when a session starts.
+
+Selection through MEDNOTE_STATE_BACKEND:
+    memory                  per-process dict (default; a single replica)
+    sqlite                  shared file in MEDNOTE_CACHE_DIR, or sqlite:///path/to/file
+    redis://[:pw@]host:port/db
+                            any server speaking the Redis protocol; the client
+                            here is a few dozen lines, no redis package needed.
+                            mock_redis_server.py is a local stand-in.
+
+Values are compact JSON, zlib-compressed when that makes them smaller, and
+expire MEDNOTE_STATE_TTL seconds (default a day) after the last write; the
+consultation store keeps the permanent record.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+import telemetry
+from report_cache import DEFAULT_CACHE_DIR
+
+
+DEFAULT_TTL_SECONDS = float(os.getenv("MEDNOTE_STATE_TTL", 24 * 3600))
+COMPRESS_ABOVE = 512  # bytes of JSON below which zlib's header outweighs the saving
+COMPRESS_LEVEL = 3    # within a few percent of level 6's size at a quarter of the time
+
+_JSON, _ZLIB = b"j", b"z"
+
+
+def pack(value: dict) -> bytes:
+    """Compact JSON, zlib-compressed when that pays off; the first byte says which"""
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) >= COMPRESS_ABOVE:
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(compressed) < len(data):
+            return _ZLIB + compressed
+    return _JSON + data
+
+
+def unpack(blob: bytes) -> dict:
+    tag, data = blob[:1], blob[1:]
+    if tag == _ZLIB:
+        data = zlib.decompress(data)
+    elif tag != _JSON:
+        raise ValueError(f"Unknown state encoding {tag!r}")
+    return json.loads(data)
+
+
+class StateBackend:
+    """Interface every state backend implements; values are JSON-compatible dicts"""
+
+    def get(self, key: str):
+        """The stored value, or None when missing or expired"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InProcessStateBackend(StateBackend):
+    """Packed values in a dict; visible to every session of this process only"""
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._values = OrderedDict()  # key -> (expires_at, packed), oldest write first
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._values.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return unpack(entry[1])
+
+    def set(self, key: str, value: dict):
+        packed = pack(value)
+        now = time.time()
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = (now + self.ttl_seconds, packed)
+            # Every entry lives for the same TTL, so the oldest write expires first
+            while self._values:
+                oldest = next(iter(self._values.values()))
+                if oldest[0] > now:
+                    break
+                self._values.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class SQLiteStateBackend(StateBackend):
+    """One SQLite file in WAL mode, shared by every process that opens it"""
+
+    def __init__(self, path: str = None, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, "session_state.sqlite3")
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM session_state WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM session_state WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return unpack(row[0]) if row else None
+
+    def set(self, key: str, value: dict):
+        packed = pack(value)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO session_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, packed, time.time() + self.ttl_seconds),
+            )
+            self._db.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM session_state WHERE key = ?", (key,))
+            self._db.commit()
+
+
+# =========================
+#   REDIS PROTOCOL (RESP2)
+# =========================
+class RedisError(Exception):
+    """An error reply from the server"""
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts += [b"$%d\r\n" % len(arg), arg, b"\r\n"]
+    return b"".join(parts)
+
+
+def read_reply(reader):
+    """One reply from a buffered binary stream; error replies come back as RedisError instances"""
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by the state server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        return RedisError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = reader.read(size + 2)
+        if len(data) != size + 2:
+            raise ConnectionError("Connection closed by the state server")
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        return None if size < 0 else [read_reply(reader) for _ in range(size)]
+    raise ConnectionError(f"Unexpected reply from the state server: {line[:40]!r}")
+
+
+class RedisStateBackend(StateBackend):
+    """GET/SET/DEL over one persistent connection to a Redis-protocol server"""
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 timeout: float = 2.0, prefix: str = "mednote:"):
+        parts = urlsplit(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._address = (parts.hostname or "127.0.0.1", parts.port or 6379)
+        self._password = unquote(parts.password) if parts.password else None
+        self._database = int(parts.path.strip("/") or 0)
+        self._timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection(self._address, timeout=self._timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock, self._reader = sock, sock.makefile("rb")
+        if self._password:
+            self._send("AUTH", self._password)
+        if self._database:
+            self._send("SELECT", self._database)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _send(self, *args):
+        self._sock.sendall(encode_command(*args))
+        reply = read_reply(self._reader)
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def command(self, *args):
+        """Run one command, reconnecting once if the connection has gone away"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(*args)
+                except OSError:
+                    # ConnectionError and socket timeouts included
+                    self._close()
+                    if attempt:
+                        raise
+
+    def get(self, key: str):
+        try:
+            blob = self.command("GET", self.prefix + key)
+        except OSError as e:
+            # Degrade to a fresh session rather than failing the page
+            telemetry.count("mednote_state_errors_total", operation="get", error=type(e).__name__)
+            return None
+        return unpack(blob) if blob is not None else None
+
+    def set(self, key: str, value: dict):
+        try:
+            self.command("SET", self.prefix + key, pack(value), "PX", int(self.ttl_seconds * 1000))
+        except OSError as e:
+            telemetry.count("mednote_state_errors_total", operation="set", error=type(e).__name__)
+
+    def delete(self, key: str):
+        try:
+            self.command("DEL", self.prefix + key)
+        except OSError as e:
+            telemetry.count("mednote_state_errors_total", operation="delete", error=type(e).__name__)
+
+
+def create_state_backend(spec: str) -> StateBackend:
+    """Backend for a MEDNOTE_STATE_BACKEND value"""
+    spec = (spec or "memory").strip()
+    if spec == "memory":
+        return InProcessStateBackend()
+    if spec == "sqlite":
+        return SQLiteStateBackend()
+    if spec.startswith("sqlite:///"):
+        return SQLiteStateBackend(spec[len("sqlite:///"):])
+    if spec.startswith("redis://"):
+        return RedisStateBackend(spec)
+    raise ValueError(f"Unknown MEDNOTE_STATE_BACKEND '{spec}' (memory, sqlite, sqlite:///path or redis://host:port/db)")
+
+
+_state_backend = None
+_state_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """Process-wide state backend chosen by MEDNOTE_STATE_BACKEND"""
+    global _state_backend
+    if _state_backend is None:
+        with _state_backend_lock:
+            if _state_backend is None:
+                _state_backend = create_state_backend(os.getenv("MEDNOTE_STATE_BACKEND", "memory"))
+    return _state_backend
@@ -1,16 +1,32 @@
 import json
 import os
-import streamlit as st
-from openai import OpenAI
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import telemetry
+from backends import get_backend
+from compact_output import alias_keys, alias_schema, expand_keys
+from json_stream import TopLevelJSONStream
+from medication_catalogue import get_medication_catalogue
+from pre_extract import pre_extract, prefilled_fields
+from transcript_chunking import CHUNK_TOKENS, TRANSCRIPT_TOKEN_BUDGET, estimate_tokens, split_transcript
+from report_cache import get_report_cache, report_cache_key
 
-# Initialize OpenAI client
-try:
-    api_key = st.secrets.get("OPENAI_API_KEY", "")
-except:
-    api_key = os.getenv("OPENAI_API_KEY", "")
 
-client = OpenAI(api_key=api_key) if api_key else None
+MODEL_NAME = "gpt-4o-mini"
+
+# Bump whenever the system prompt or the JSON schema changes so cached
+# reports produced by an older prompt are not served again.
+PROMPT_VERSION = "2024.12.4"
+
+# Compact output: short key aliases and only the fields that have content (see
+# compact_output.py). Opt in with MEDNOTE_OUTPUT_MODE=compact; reports then carry
+# empty fields where verbose ones say "Not documented" or "false".
+COMPACT_OUTPUT = os.getenv("MEDNOTE_OUTPUT_MODE", "verbose").lower() == "compact"
+
+# Sentinel section name yielded last by generate_report_stream with the full report
+REPORT_COMPLETE = "__report__"
 
 
 # Medication stock database
@@ -40,90 +56,54 @@ MEDICATION_STOCK = {
 }
 
 
+# Used to seed the catalogue when no medication file is configured
+MEDICATION_ALTERNATIVES = {
+    "amoxicillin": "azithromycin (macrolide antibiotic, broader coverage)",
+    "cephalexin": "azithromycin (if no allergy to macrolides)",
+    "empagliflozin": "dapagliflozin (same class SGLT2 inhibitor)",
+    "dapagliflozin": "empagliflozin (same class SGLT2 inhibitor)",
+    "liraglutide": "metformin + dietary modification",
+    "hydrochlorothiazide": "amlodipine (calcium channel blocker alternative)",
+}
+
+
+def _catalogue():
+    return get_medication_catalogue(fallback_rows=[
+        {"name": name, "in_stock": "1" if available else "0", "alternative": MEDICATION_ALTERNATIVES.get(name, "")}
+        for name, available in MEDICATION_STOCK.items()
+    ])
+
+
 def check_medication_stock(medication_name: str) -> dict:
     """Check medication stock and suggest alternatives"""
-    med_lower = medication_name.lower().strip()
-    
-    for stock_med, available in MEDICATION_STOCK.items():
-        if stock_med in med_lower or med_lower in stock_med:
-            if available:
-                return {"in_stock": True, "alternative": None}
-            else:
-                alternatives = {
-                    "amoxicillin": "azithromycin (macrolide antibiotic, broader coverage)",
-                    "cephalexin": "azithromycin (if no allergy to macrolides)",
-                    "empagliflozin": "dapagliflozin (same class SGLT2 inhibitor)",
-                    "dapagliflozin": "empagliflozin (same class SGLT2 inhibitor)",
-                    "liraglutide": "metformin + dietary modification",
-                    "hydrochlorothiazide": "amlodipine (calcium channel blocker alternative)",
-                }
-                alt = alternatives.get(stock_med, "consult pharmacist for equivalent medication")
-                return {"in_stock": False, "alternative": alt}
-    
-    return {"in_stock": True, "alternative": None}
-
-
-def generate_report(transcript: str, report_language: str = "english") -> dict:
-    """
-    Convert consultation transcript into comprehensive medical report.
-    AGGRESSIVE extraction - capture EVERYTHING from the conversation.
-    """
-    if not client:
-        return _empty_report("OpenAI API key not configured")
-    
-    if not transcript or not transcript.strip():
-        return _empty_report("Transcript was empty")
-    
-    # Language instruction
-    if report_language.lower() == "arabic":
-        lang_instruction = "Generate ALL report sections in Arabic (العربية)."
-    else:
-        lang_instruction = "Generate ALL report sections in English."
-    
-    system_msg = f"""You are an expert medical AI assistant. Your job is to extract EVERY piece of medical information from the consultation transcript.
-
-{lang_instruction}
+    return _catalogue().check(medication_name)
 
-CRITICAL INSTRUCTIONS:
-1. READ THE ENTIRE CONVERSATION CAREFULLY
-2. EXTRACT EVERY DETAIL - symptoms, measurements, medications, history
-3. DO NOT leave any section as "Not documented" unless truly not mentioned
-4. BE AGGRESSIVE in extraction - if something is implied, include it
-5. Capture EXACT values (BP readings, weight, height, ages, etc.)
-6. Note EVERY symptom mentioned, even briefly
-7. List ALL medications discussed (current and prescribed)
-8. Include patient's own words about symptoms
 
-MEDICAL KNOWLEDGE BASE:
-- Diabetes Type 2: Polydipsia, polyuria, fatigue, blurred vision → Metformin first-line
-- Hypertension: Headaches, dizziness → ACEi/ARB/CCB/Thiazide
-- Fatigue: Can be from dehydration, poor sleep, caffeine, anemia, thyroid, heart issues
-- Heat sensations: Can indicate anxiety, thyroid, hormones, or referred cardiac symptoms
+def pre_extract_transcript(transcript: str) -> dict:
+    """Measurements and catalogue drug mentions found locally (see pre_extract.py)"""
+    with telemetry.span("pre_extract", chars=len(transcript or "")):
+        return pre_extract(transcript, _catalogue())
 
-Output ONLY valid JSON with these exact keys:
 
-{{
-  "conversation_overview": {{
+# One JSON fragment per top-level report key, in the order the model should write them.
+# Kept as separate entries so subsets of the schema can be requested on their own.
+REPORT_SCHEMA = [
+    ("conversation_overview", '''  "conversation_overview": {
     "what_patient_said": "Brief summary of patient's main complaints in their own words",
     "what_doctor_observed": "Doctor's observations and clinical findings",
     "conversation_summary": "2-3 sentence overview of the entire consultation"
-  }},
-  
-  "patient_name": "Extract from conversation, otherwise 'Not documented'",
-  
-  "demographics": {{
+  }'''),
+    ("patient_name", '''  "patient_name": "Extract from conversation, otherwise 'Not documented'"'''),
+    ("demographics", '''  "demographics": {
     "age": "Extract if mentioned",
     "gender": "Extract if mentioned",
     "weight": "Extract with unit if mentioned (e.g., 79 kg)",
     "height": "Extract with unit if mentioned (e.g., 182 cm)",
     "contact": "Extract if mentioned"
-  }},
-  
-  "chief_complaint": "Main reason for visit - be specific",
-  
-  "history_of_present_illness": "DETAILED description including: onset, duration, severity, associated symptoms, aggravating/relieving factors, impact on daily life",
-  
-  "past_medical_history": {{
+  }'''),
+    ("chief_complaint", '''  "chief_complaint": "Main reason for visit - be specific"'''),
+    ("history_of_present_illness", '''  "history_of_present_illness": "DETAILED description including: onset, duration, severity, associated symptoms, aggravating/relieving factors, impact on daily life"'''),
+    ("past_medical_history", '''  "past_medical_history": {
     "diabetes": "true/false or details",
     "hypertension": "true/false or details",
     "asthma": "true/false or details",
@@ -135,97 +115,203 @@ Output ONLY valid JSON with these exact keys:
     "copd": "true/false or details",
     "cancer": "true/false or details",
     "other": "Any other conditions mentioned"
-  }},
-  
-  "past_surgical_history": "List any surgeries or 'None mentioned'",
-  
-  "current_medications": [
-    {{
+  }'''),
+    ("past_surgical_history", '''  "past_surgical_history": "List any surgeries or 'None mentioned'"'''),
+    ("current_medications", '''  "current_medications": [
+    {
       "name": "Medication name",
       "dose": "Dose if mentioned",
       "frequency": "How often if mentioned",
       "duration": "How long taking if mentioned"
-    }}
-  ],
-  
-  "allergies": {{
+    }
+  ]'''),
+    ("allergies", '''  "allergies": {
     "drug_allergies": ["List all mentioned allergies"],
     "reactions": ["Type of reaction for each"]
-  }},
-  
-  "vital_signs": {{
+  }'''),
+    ("vital_signs", '''  "vital_signs": {
     "blood_pressure": "Extract EXACT reading if mentioned (e.g., 140/90)",
     "heart_rate": "Extract if mentioned",
     "respiratory_rate": "Extract if mentioned",
     "temperature": "Extract if mentioned",
     "oxygen_saturation": "Extract if mentioned"
-  }},
-  
-  "physical_examination": "Document ALL examination findings mentioned. If none performed, say 'No physical examination documented in this conversation'",
-  
-  "lab_results": {{
+  }'''),
+    ("physical_examination", '''  "physical_examination": "Document ALL examination findings mentioned. If none performed, say 'No physical examination documented in this conversation'"'''),
+    ("lab_results", '''  "lab_results": {
     "mentioned": true/false,
     "details": "List any lab results discussed"
-  }},
-  
-  "social_history": {{
+  }'''),
+    ("social_history", '''  "social_history": {
     "smoking": "Extract if discussed",
     "alcohol": "Extract if discussed",
     "physical_activity": "Extract if discussed",
     "diet": "Extract if discussed (caffeine intake, eating habits, etc.)",
     "occupation": "Extract if mentioned",
     "sleep": "Extract sleep patterns if discussed"
-  }},
-  
-  "family_history": {{
+  }'''),
+    ("family_history", '''  "family_history": {
     "diabetes": "true/false or details",
     "hypertension": "true/false or details",
     "heart_disease": "true/false or details",
     "cancer": "true/false or details",
     "other": "Any other family conditions"
-  }},
-  
-  "clinical_assessment": {{
+  }'''),
+    ("clinical_assessment", '''  "clinical_assessment": {
     "suspected_diagnosis": "Primary diagnosis based on symptoms and clinical guidelines",
     "differential_diagnosis": ["List other possibilities"],
     "reasoning": "DETAILED explanation: What symptoms led to this diagnosis? What patterns match? Reference clinical guidelines."
-  }},
-  
-  "recommended_workup": [
+  }'''),
+    ("recommended_workup", '''  "recommended_workup": [
     "List specific tests/imaging needed (e.g., 'CBC to rule out anemia', 'TSH to check thyroid')"
-  ],
-  
-  "medication_plan": [
-    {{
+  ]'''),
+    ("medication_plan", '''  "medication_plan": [
+    {
       "name": "Medication name",
       "dose": "Specific dose and form",
       "frequency": "How often",
       "duration": "How long",
       "instructions": "Special instructions",
       "guideline_basis": "Why this medication per guidelines"
-    }}
-  ],
-  
-  "safety_checks": [
+    }
+  ]'''),
+    ("safety_checks", '''  "safety_checks": [
     "List important safety considerations (e.g., 'Monitor BP weekly', 'Check for side effects')"
-  ],
-  
-  "contraindications_checked": [
+  ]'''),
+    ("contraindications_checked", '''  "contraindications_checked": [
     "List what was checked (e.g., 'No pregnancy', 'No kidney disease', 'No drug allergies')"
-  ],
-  
-  "alternative_if_contraindicated": [
+  ]'''),
+    ("alternative_if_contraindicated", '''  "alternative_if_contraindicated": [
     "Alternative medications if first-line unavailable or contraindicated"
-  ],
-  
-  "follow_up": "Specific follow-up plan with timeline",
-  
-  "doctor_advisory_missing_questions": [
+  ]'''),
+    ("follow_up", '''  "follow_up": "Specific follow-up plan with timeline"'''),
+    ("doctor_advisory_missing_questions", '''  "doctor_advisory_missing_questions": [
     "Critical questions doctor should ask to complete assessment"
-  ],
-  
-  "patient_report": "Patient-friendly summary in SIMPLE language explaining: what's wrong, why it happened, what to do, what medications to take, when to come back, warning signs to watch for"
-}}
+  ]'''),
+    ("patient_report", '''  "patient_report": "Patient-friendly summary in SIMPLE language explaining: what's wrong, why it happened, what to do, what medications to take, when to come back, warning signs to watch for"'''),
+]
+
+
+# Independent slices of REPORT_SCHEMA that can be extracted in parallel requests
+SECTION_GROUPS = {
+    "presentation": [
+        "conversation_overview", "chief_complaint", "history_of_present_illness", "physical_examination",
+    ],
+    "history": [
+        "patient_name", "demographics", "past_medical_history", "past_surgical_history", "current_medications",
+        "allergies", "vital_signs", "lab_results", "social_history", "family_history",
+    ],
+    "assessment": [
+        "clinical_assessment", "recommended_workup", "follow_up", "doctor_advisory_missing_questions",
+    ],
+    "treatment": [
+        "medication_plan", "safety_checks", "contraindications_checked", "alternative_if_contraindicated",
+    ],
+    "patient_report": ["patient_report"],
+}
+
+
+# Facts a single part of a long transcript can contribute; assessment, plan and
+# patient summary are written once, in the reduce step, from the merged facts
+MAP_SECTIONS = [
+    "patient_name", "demographics", "chief_complaint", "history_of_present_illness", "past_medical_history",
+    "past_surgical_history", "current_medications", "allergies", "vital_signs", "physical_examination",
+    "lab_results", "social_history", "family_history", "medication_plan",
+]
+
+
+# Fields of each object section in REPORT_SCHEMA, so normalization can rebuild
+# the full shape from compact output that left empty fields out
+OBJECT_FIELDS = {
+    "conversation_overview": ["what_patient_said", "what_doctor_observed", "conversation_summary"],
+    "demographics": ["age", "gender", "weight", "height", "contact"],
+    "past_medical_history": [
+        "diabetes", "hypertension", "asthma", "heart_failure", "hypothyroidism", "hyperlipidemia",
+        "kidney_disease", "liver_disease", "copd", "cancer", "other",
+    ],
+    "allergies": ["drug_allergies", "reactions"],
+    "vital_signs": ["blood_pressure", "heart_rate", "respiratory_rate", "temperature", "oxygen_saturation"],
+    "lab_results": ["mentioned", "details"],
+    "social_history": ["smoking", "alcohol", "physical_activity", "diet", "occupation", "sleep"],
+    "family_history": ["diabetes", "hypertension", "heart_disease", "cancer", "other"],
+    "clinical_assessment": ["suspected_diagnosis", "differential_diagnosis", "reasoning"],
+}
+LIST_FIELDS = {"drug_allergies", "reactions", "differential_diagnosis"}
+
+OUTPUT_INSTRUCTIONS = {
+    False: "Output ONLY valid JSON with these exact keys:",
+    True: (
+        "Output ONLY minified JSON (no indentation or line breaks) using the short keys below.\n"
+        "Write ONLY fields that have content: leave out every field, object and list the consultation gives "
+        "nothing for, instead of writing \"Not documented\", \"None mentioned\", \"false\", \"\" or []. "
+        "For the history checklists (pmh, fh) include only the conditions that were discussed, "
+        "and write \"no\" for one the patient denies."
+    ),
+}
+
+
+# Schema wording that asks for a placeholder; compact output leaves such fields out instead
+COMPACT_SCHEMA_WORDING = [
+    ("Extract from conversation, otherwise 'Not documented'", "Extract from conversation"),
+    ("true/false or details", "details, or 'no' if denied"),
+    ("List any surgeries or 'None mentioned'", "List any surgeries"),
+    (". If none performed, say 'No physical examination documented in this conversation'", ""),
+]
+
+
+def _output_version(compact: bool) -> str:
+    """PROMPT_VERSION for cache keys; compact and verbose reports are cached apart"""
+    return PROMPT_VERSION + "+compact" if compact else PROMPT_VERSION
+
+
+def _build_schema(sections=None, compact: bool = False) -> str:
+    """Render the JSON schema for all report keys, or only the given ones"""
+    fragments = [fragment for key, fragment in REPORT_SCHEMA if sections is None or key in sections]
+    schema = "{\n" + ",\n  \n".join(fragments) + "\n}"
+    if not compact:
+        return schema
+    for verbose, wording in COMPACT_SCHEMA_WORDING:
+        schema = schema.replace(verbose, wording)
+    return alias_schema(schema)
+
+
+def _build_system_prompt(report_language: str, sections=None, compact: bool = False) -> str:
+    """Build the extraction system prompt for the requested report language"""
+    schema = _build_schema(sections, compact)
+    output_instruction = OUTPUT_INSTRUCTIONS[bool(compact)]
+    if compact:
+        completeness_rule = "DO NOT leave out any section the conversation touches on, even briefly"
+    else:
+        completeness_rule = 'DO NOT leave any section as "Not documented" unless truly not mentioned'
+    
+    # Language instruction
+    if report_language.lower() == "arabic":
+        lang_instruction = "Generate ALL report sections in Arabic (العربية)."
+    else:
+        lang_instruction = "Generate ALL report sections in English."
+    
+    system_msg = f"""You are an expert medical AI assistant. Your job is to extract EVERY piece of medical information from the consultation transcript.
+
+{lang_instruction}
+
+CRITICAL INSTRUCTIONS:
+1. READ THE ENTIRE CONVERSATION CAREFULLY
+2. EXTRACT EVERY DETAIL - symptoms, measurements, medications, history
+3. {completeness_rule}
+4. BE AGGRESSIVE in extraction - if something is implied, include it
+5. Capture EXACT values (BP readings, weight, height, ages, etc.)
+6. Note EVERY symptom mentioned, even briefly
+7. List ALL medications discussed (current and prescribed)
+8. Include patient's own words about symptoms
+
+MEDICAL KNOWLEDGE BASE:
+- Diabetes Type 2: Polydipsia, polyuria, fatigue, blurred vision → Metformin first-line
+- Hypertension: Headaches, dizziness → ACEi/ARB/CCB/Thiazide
+- Fatigue: Can be from dehydration, poor sleep, caffeine, anemia, thyroid, heart issues
+- Heat sensations: Can indicate anxiety, thyroid, hormones, or referred cardiac symptoms
+
+{output_instruction}
+
+{schema}
 
 EXAMPLES OF GOOD EXTRACTION:
 
@@ -240,71 +326,622 @@ GOOD: "Current medications: Lisinopril 10mg daily for hypertension (started 2 ye
 
 REMEMBER: Extract EVERYTHING. Be thorough. Don't miss details.
 """
+    return system_msg
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": f"CONSULTATION TRANSCRIPT (extract ALL information):\n\n{transcript}"},
-            ],
-            temperature=0.2,  # Lower temperature for more consistent extraction
+
+def _build_messages(transcript: str, report_language: str, sections=None, prefilled: dict = None,
+                    compact: bool = False) -> list:
+    user = f"CONSULTATION TRANSCRIPT (extract ALL information):\n\n{transcript}"
+    prefilled = {k: v for k, v in (prefilled or {}).items() if sections is None or k in sections}
+    if prefilled:
+        # Pattern matches, not facts: the model's output is what goes in the report
+        user += (
+            "\n\nMEASUREMENT HINTS (found in the transcript by pattern matching). Use a value only if it is "
+            "the patient's own current reading; correct it or leave it out if it belongs to someone else, "
+            "is a change rather than a reading, or the conversation says otherwise:\n"
+            + json.dumps(alias_keys(prefilled) if compact else prefilled, ensure_ascii=False)
         )
-        
-        raw = response.choices[0].message.content
-        
-        # Parse JSON
+    return [
+        {"role": "system", "content": _build_system_prompt(report_language, sections, compact)},
+        {"role": "user", "content": user},
+    ]
+
+
+def _parse_report_json(raw: str):
+    """Parse the model output as JSON, falling back to the outermost {...} block"""
+    with telemetry.span("parse", chars=len(raw or "")) as attrs:
         try:
-            data = json.loads(raw)
+            return json.loads(raw)
         except:
+            attrs["fallback"] = True
+            telemetry.count("mednote_parse_fallbacks_total")
             try:
                 start = raw.index("{")
                 end = raw.rindex("}") + 1
-                data = json.loads(raw[start:end])
+                return json.loads(raw[start:end])
             except:
-                return _empty_report(f"Failed to parse AI response")
+                attrs["failed"] = True
+                telemetry.count("mednote_parse_failures_total")
+                return None
+
+
+def _parse_output(raw: str, compact: bool):
+    """_parse_report_json, with compact-output aliases renamed back to report keys"""
+    data = _parse_report_json(raw)
+    return expand_keys(data) if compact and isinstance(data, dict) else data
+
+
+def _apply_stock_status(report: dict) -> dict:
+    """Attach current stock information to every prescribed medication"""
+    meds = report.get("medication_plan", []) or []
+    with telemetry.span("stock_check", medications=len(meds)):
+        stock = _catalogue().check_many([med.get("name", "") for med in meds])
+    for med, stock_info in zip(meds, stock):
+        med["stock_status"] = stock_info
+    return report
+
+
+def refresh_stock_status(report: dict) -> dict:
+    """Re-check stock for a finished report, e.g. one restored from a saved consultation"""
+    if not report or is_error_report(report):
+        return report
+    return _apply_stock_status(report)
+
+
+def _normalize_report(data: dict) -> dict:
+    """Ensure all report keys exist and check medication stock"""
+    medication_plan = data.get("medication_plan", []) or []
+    
+    report = {
+        "conversation_overview": data.get("conversation_overview", {}) or {},
+        "patient_name": data.get("patient_name", "Not documented") or "Not documented",
+        "demographics": data.get("demographics", {}) or {},
+        "chief_complaint": data.get("chief_complaint", "") or "",
+        "history_of_present_illness": data.get("history_of_present_illness", "") or "",
+        "past_medical_history": data.get("past_medical_history", {}) or {},
+        "past_surgical_history": data.get("past_surgical_history", "") or "",
+        "current_medications": data.get("current_medications", []) or [],
+        "allergies": data.get("allergies", {}) or {},
+        "vital_signs": data.get("vital_signs", {}) or {},
+        "physical_examination": data.get("physical_examination", "") or "",
+        "lab_results": data.get("lab_results", {}) or {},
+        "social_history": data.get("social_history", {}) or {},
+        "family_history": data.get("family_history", {}) or {},
+        "clinical_assessment": data.get("clinical_assessment", {}) or {},
+        "recommended_workup": data.get("recommended_workup", []) or [],
+        "medication_plan": medication_plan,
+        "safety_checks": data.get("safety_checks", []) or [],
+        "contraindications_checked": data.get("contraindications_checked", []) or [],
+        "alternative_if_contraindicated": data.get("alternative_if_contraindicated", []) or [],
+        "follow_up": data.get("follow_up", "") or "",
+        "doctor_advisory_missing_questions": data.get("doctor_advisory_missing_questions", []) or [],
+        "patient_report": data.get("patient_report", "") or "",
+        "patient_profile_updates": data.get("patient_profile_updates", {}) or {},
+    }
+    # Compact output leaves empty fields out; give every object section its full set of fields
+    for section, fields in OBJECT_FIELDS.items():
+        value = report[section]
+        if isinstance(value, dict):
+            shaped = {field: [] if field in LIST_FIELDS else False if field == "mentioned" else "" for field in fields}
+            shaped.update(value)
+            report[section] = shaped
+    return _apply_stock_status(report)
+
+
+def generate_report(transcript: str, report_language: str = "english", use_cache: bool = True,
+                    compact: bool = None) -> dict:
+    """
+    Convert consultation transcript into comprehensive medical report.
+    AGGRESSIVE extraction - capture EVERYTHING from the conversation.
+    
+    Successful reports are cached on (transcript, language, model, prompt version),
+    so regenerating an unchanged transcript skips the API call entirely.
+    `compact` defaults to COMPACT_OUTPUT; the returned report has the same shape either way.
+    """
+    compact = COMPACT_OUTPUT if compact is None else compact
+    if get_backend() is None:
+        return _empty_report("OpenAI API key not configured")
+    
+    if not transcript or not transcript.strip():
+        return _empty_report("Transcript was empty")
+    
+    cache = get_report_cache() if use_cache else None
+    key = report_cache_key(transcript, report_language, MODEL_NAME, _output_version(compact))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            # Stock levels change independently of the transcript
+            return _apply_stock_status(cached)
+    
+    # Too long for one request: extract in parallel chunks and merge
+    if estimate_tokens(transcript) > TRANSCRIPT_TOKEN_BUDGET:
+        return generate_report_map_reduce(transcript, report_language, use_cache=use_cache, compact=compact)
+    
+    started = time.perf_counter()
+    prefilled = prefilled_fields(pre_extract_transcript(transcript))
+
+    try:
+        raw = get_backend().chat(
+            _build_messages(transcript, report_language, prefilled=prefilled, compact=compact),
+            model=MODEL_NAME,
+            temperature=0.2,  # Lower temperature for more consistent extraction
+        ).text
+        
+        # Parse JSON
+        data = _parse_output(raw, compact)
+        if data is None:
+            return _empty_report(f"Failed to parse AI response")
+        
+        report = _normalize_report(data)
+        
+    except Exception as e:
+        return _empty_report(f"Error generating report: {str(e)}")
+    
+    if cache is not None:
+        cache.put(key, report, elapsed=time.perf_counter() - started)
+    return report
+
+
+def generate_report_stream(transcript: str, report_language: str = "english", use_cache: bool = True,
+                           compact: bool = None):
+    """
+    Streaming variant of generate_report.
+    
+    Yields (section, value) for each top-level report key as soon as the model
+    has finished writing it, then (REPORT_COMPLETE, report) with the same
+    normalized dict generate_report would have returned. In compact mode
+    sections with nothing to report are only in the final report.
+    """
+    compact = COMPACT_OUTPUT if compact is None else compact
+    if get_backend() is None:
+        yield REPORT_COMPLETE, _empty_report("OpenAI API key not configured")
+        return
+    
+    if not transcript or not transcript.strip():
+        yield REPORT_COMPLETE, _empty_report("Transcript was empty")
+        return
+    
+    cache = get_report_cache() if use_cache else None
+    key = report_cache_key(transcript, report_language, MODEL_NAME, _output_version(compact))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            report = _apply_stock_status(cached)
+            for section, value in report.items():
+                yield section, value
+            yield REPORT_COMPLETE, report
+            return
+    
+    if estimate_tokens(transcript) > TRANSCRIPT_TOKEN_BUDGET:
+        report = generate_report_map_reduce(transcript, report_language, use_cache=use_cache, compact=compact)
+        for section, value in report.items():
+            yield section, value
+        yield REPORT_COMPLETE, report
+        return
+    
+    started = time.perf_counter()
+    parser = TopLevelJSONStream()
+    prefilled = prefilled_fields(pre_extract_transcript(transcript))
+    
+    try:
+        stream = get_backend().chat_stream(
+            _build_messages(transcript, report_language, prefilled=prefilled, compact=compact),
+            model=MODEL_NAME,
+            temperature=0.2,
+        )
+        
+        for delta in stream:
+            for section, value in parser.feed(delta):
+                if compact:
+                    section, value = next(iter(expand_keys({section: value}).items()))
+                if section == "medication_plan" and isinstance(value, list):
+                    _apply_stock_status({"medication_plan": value})
+                yield section, value
+        
+        data = _parse_output(parser.text, compact)
+        if data is None:
+            yield REPORT_COMPLETE, _empty_report("Failed to parse AI response")
+            return
+        
+        report = _normalize_report(data)
         
-        # Check medication stock
-        medication_plan = data.get("medication_plan", []) or []
-        for med in medication_plan:
-            stock_info = check_medication_stock(med.get("name", ""))
-            med["stock_status"] = stock_info
+    except Exception as e:
+        yield REPORT_COMPLETE, _empty_report(f"Error generating report: {str(e)}")
+        return
+    
+    if cache is not None:
+        cache.put(key, report, elapsed=time.perf_counter() - started)
+    yield REPORT_COMPLETE, report
+
+
+def _extract_section_group(group: str, transcript: str, report_language: str, prefilled: dict = None,
+                           compact: bool = False):
+    """Run one SECTION_GROUPS request, returning (group, data or None, seconds)"""
+    started = time.perf_counter()
+    raw = get_backend().chat(
+        _build_messages(transcript, report_language, SECTION_GROUPS[group], prefilled, compact),
+        model=MODEL_NAME,
+        temperature=0.2,
+    ).text
+    data = _parse_output(raw, compact)
+    return group, data, time.perf_counter() - started
+
+
+def generate_report_parallel(
+    transcript: str,
+    report_language: str = "english",
+    max_workers: int = 5,
+    timings: dict = None,
+    use_cache: bool = True,
+    compact: bool = None,
+) -> dict:
+    """
+    Extract each of SECTION_GROUPS as its own concurrent request and merge the
+    results into the same dict shape generate_report returns.
+    
+    Wall-clock time tracks the slowest group rather than one long sequential
+    output. Pass a dict as `timings` to receive per-group and total seconds.
+    """
+    compact = COMPACT_OUTPUT if compact is None else compact
+    if timings is None:
+        timings = {}
+    
+    if get_backend() is None:
+        return _empty_report("OpenAI API key not configured")
+    
+    if not transcript or not transcript.strip():
+        return _empty_report("Transcript was empty")
+    
+    cache = get_report_cache() if use_cache else None
+    key = report_cache_key(transcript, report_language, MODEL_NAME, _output_version(compact) + "+groups")
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            timings["total"] = 0.0
+            return _apply_stock_status(cached)
+    
+    if estimate_tokens(transcript) > TRANSCRIPT_TOKEN_BUDGET:
+        return generate_report_map_reduce(
+            transcript, report_language, timings=timings, use_cache=use_cache, compact=compact
+        )
+    
+    started = time.perf_counter()
+    merged = {}
+    prefilled = prefilled_fields(pre_extract_transcript(transcript))
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [
+                pool.submit(
+                    telemetry.in_trace(_extract_section_group), group, transcript, report_language, prefilled, compact
+                )
+                for group in SECTION_GROUPS
+            ]
+            for future in futures:
+                group, data, elapsed = future.result()
+                timings[group] = elapsed
+                if data is None:
+                    return _empty_report(f"Failed to parse AI response ({group} sections)")
+                merged.update({k: v for k, v in data.items() if k in SECTION_GROUPS[group]})
         
-        # Ensure all keys exist
-        return {
-            "conversation_overview": data.get("conversation_overview", {}) or {},
-            "patient_name": data.get("patient_name", "Not documented") or "Not documented",
-            "demographics": data.get("demographics", {}) or {},
-            "chief_complaint": data.get("chief_complaint", "") or "",
-            "history_of_present_illness": data.get("history_of_present_illness", "") or "",
-            "past_medical_history": data.get("past_medical_history", {}) or {},
-            "past_surgical_history": data.get("past_surgical_history", "") or "",
-            "current_medications": data.get("current_medications", []) or [],
-            "allergies": data.get("allergies", {}) or {},
-            "vital_signs": data.get("vital_signs", {}) or {},
-            "physical_examination": data.get("physical_examination", "") or "",
-            "lab_results": data.get("lab_results", {}) or {},
-            "social_history": data.get("social_history", {}) or {},
-            "family_history": data.get("family_history", {}) or {},
-            "clinical_assessment": data.get("clinical_assessment", {}) or {},
-            "recommended_workup": data.get("recommended_workup", []) or [],
-            "medication_plan": medication_plan,
-            "safety_checks": data.get("safety_checks", []) or [],
-            "contraindications_checked": data.get("contraindications_checked", []) or [],
-            "alternative_if_contraindicated": data.get("alternative_if_contraindicated", []) or [],
-            "follow_up": data.get("follow_up", "") or "",
-            "doctor_advisory_missing_questions": data.get("doctor_advisory_missing_questions", []) or [],
-            "patient_report": data.get("patient_report", "") or "",
-            "patient_profile_updates": data.get("patient_profile_updates", {}) or {},
-        }
+        report = _normalize_report(merged)
         
     except Exception as e:
         return _empty_report(f"Error generating report: {str(e)}")
+    finally:
+        timings["total"] = time.perf_counter() - started
+    
+    if cache is not None:
+        cache.put(key, report, elapsed=timings["total"])
+    return report
+
+
+def _text_key(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _combine_text(current: str, value: str) -> str:
+    """
+    Join two chunks' text for one field, keeping each fact once: a value
+    already contained is dropped, one that contains the current text
+    ("45 years" after "45") replaces it.
+    """
+    # Whole words only: "45" is part of "45 years", not of "145"
+    current_key, value_key = f" {_text_key(current)} ", f" {_text_key(value)} "
+    if value_key in current_key:
+        return current
+    if current_key in value_key:
+        return value
+    return f"{current} {value}"
+
+
+def _combine_partials(merged: dict, partial: dict) -> dict:
+    """Fold one chunk's facts into the running merge: text is appended, lists de-duplicated"""
+    for key, value in partial.items():
+        if _is_placeholder(value):
+            continue
+        current = merged.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            _combine_partials(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            merge_report_updates(merged, {key: value})
+        elif isinstance(current, str) and isinstance(value, str) and not _is_placeholder(current):
+            merged[key] = _combine_text(current, value.strip())
+        else:
+            merged[key] = value
+    return merged
+
+
+def _extract_chunk(index: int, total: int, chunk: str, report_language: str, compact: bool = False):
+    started = time.perf_counter()
+    raw = get_backend().chat(
+        [
+            {"role": "system", "content": _build_system_prompt(report_language, MAP_SECTIONS, compact)},
+            {"role": "user", "content": (
+                f"CONSULTATION TRANSCRIPT, PART {index + 1} OF {total} "
+                f"(extract ALL information that appears in this part only):\n\n{chunk}"
+            )},
+        ],
+        model=MODEL_NAME,
+        temperature=0.2,
+    ).text
+    return index, _parse_output(raw, compact), time.perf_counter() - started
+
+
+def generate_report_map_reduce(
+    transcript: str,
+    report_language: str = "english",
+    chunk_tokens: int = CHUNK_TOKENS,
+    max_workers: int = 8,
+    timings: dict = None,
+    use_cache: bool = True,
+    compact: bool = None,
+) -> dict:
+    """
+    Report for transcripts too long for a single request.
+    
+    Map: the transcript is split on paragraph/speaker boundaries and each
+    chunk is extracted in parallel against the reduced MAP_SECTIONS schema.
+    Reduce: the partial JSONs are merged locally, then one request over the
+    merged facts (not the transcript) writes the full standard report.
+    """
+    compact = COMPACT_OUTPUT if compact is None else compact
+    if timings is None:
+        timings = {}
+    
+    if get_backend() is None:
+        return _empty_report("OpenAI API key not configured")
+    
+    cache = get_report_cache() if use_cache else None
+    key = report_cache_key(transcript, report_language, MODEL_NAME, _output_version(compact) + "+map-reduce")
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return _apply_stock_status(cached)
+    
+    started = time.perf_counter()
+    chunks = split_transcript(transcript, chunk_tokens)
+    partials = [None] * len(chunks)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [
+                pool.submit(telemetry.in_trace(_extract_chunk), i, len(chunks), chunk, report_language, compact)
+                for i, chunk in enumerate(chunks)
+            ]
+            for future in futures:
+                index, data, elapsed = future.result()
+                timings[f"chunk_{index + 1}"] = elapsed
+                partials[index] = data if isinstance(data, dict) else {}
+        
+        if not any(partials):
+            # Nothing to reduce; the model would only make a report up
+            return _empty_report(f"Failed to parse AI response for all {len(chunks)} parts of the transcript")
+        
+        merged = {}
+        for partial in partials:
+            _combine_partials(merged, partial)
+        
+        reduce_started = time.perf_counter()
+        raw = get_backend().chat(
+            [
+                {"role": "system", "content": _build_system_prompt(report_language, compact=compact)},
+                {"role": "user", "content": (
+                    f"FACTS EXTRACTED FROM A LONG CONSULTATION ({len(chunks)} parts, already merged). "
+                    f"Write the complete report from these facts:\n\n{_compact_report(merged)}"
+                )},
+            ],
+            model=MODEL_NAME,
+            temperature=0.2,
+        ).text
+        timings["reduce"] = time.perf_counter() - reduce_started
+        
+        # Reduce output wins; merged facts fill whatever it left out (or everything, if unusable)
+        data = _parse_output(raw, compact) or {}
+        for section, value in merged.items():
+            if _is_placeholder(data.get(section)):
+                data[section] = value
+        report = _normalize_report(data)
+        
+    except Exception as e:
+        return _empty_report(f"Error generating report: {str(e)}")
+    finally:
+        timings["total"] = time.perf_counter() - started
+    
+    if cache is not None:
+        cache.put(key, report, elapsed=timings["total"])
+    return report
+
+
+PLACEHOLDER_VALUES = {"", "not documented", "none mentioned", "not mentioned", "—"}
+
+
+def _is_placeholder(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in PLACEHOLDER_VALUES
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def _item_identity(item) -> str:
+    """Dedup key for list items: medications by name, everything else by text"""
+    if isinstance(item, dict):
+        if item.get("name"):
+            return str(item["name"]).strip().lower()
+        return json.dumps(item, sort_keys=True, ensure_ascii=False).lower()
+    return str(item).strip().lower()
+
+
+def _same_shape(current, value) -> bool:
+    """Whether `value` may replace or merge into `current`: both lists, both objects or both scalars"""
+    if current is None:
+        return True
+    def shape(v):
+        return list if isinstance(v, list) else dict if isinstance(v, dict) else str
+    return shape(current) is shape(value)
+
+
+def merge_report_updates(report: dict, updates: dict) -> dict:
+    """
+    Merge incremental updates into an existing report, in place.
+    
+    Lists gain only items not already present (medications matched by name,
+    an update to a known medication replaces its fields), nested dicts merge
+    key by key, and scalar fields are overwritten unless the update is empty
+    or a "Not documented" placeholder. An update whose shape doesn't match the
+    field (a string for a list, a list for a text field) is ignored.
+    """
+    for key, value in (updates or {}).items():
+        if _is_placeholder(value):
+            continue
+        current = report.get(key)
+        if not _same_shape(current, value):
+            continue
+        if isinstance(current, dict) and isinstance(value, dict):
+            merge_report_updates(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            index = {_item_identity(item): item for item in current}
+            for item in value:
+                if current and not _same_shape(current[0], item):
+                    continue
+                existing = index.get(_item_identity(item))
+                if existing is None:
+                    current.append(item)
+                    index[_item_identity(item)] = item
+                elif isinstance(existing, dict) and isinstance(item, dict):
+                    merge_report_updates(existing, item)
+        else:
+            report[key] = value
+    return report
+
+
+def is_error_report(report) -> bool:
+    """True for the _empty_report placeholder returned when generation fails"""
+    return bool(report) and bool(report.get("error"))
+
+
+def _has_content(report: dict) -> bool:
+    """False for missing reports and _empty_report error placeholders"""
+    if not report or is_error_report(report):
+        return False
+    return any(
+        not _is_placeholder(value)
+        for key, value in report.items()
+        if key not in ("chief_complaint", "patient_name", "patient_profile_updates")
+    )
+
+
+def _compact_report(report: dict) -> str:
+    """Serialize only the populated fields of a report, for use inside a prompt"""
+    def prune(value):
+        if isinstance(value, dict):
+            pruned = {k: prune(v) for k, v in value.items() if k != "stock_status"}
+            return {k: v for k, v in pruned.items() if not _is_placeholder(v)}
+        if isinstance(value, list):
+            return [prune(v) for v in value if not _is_placeholder(v)]
+        return value
+    
+    compact = prune({k: v for k, v in report.items() if k != "patient_profile_updates"})
+    return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+
+
+def _build_update_messages(report: dict, delta: str, report_language: str) -> list:
+    if report_language.lower() == "arabic":
+        lang_instruction = "Write ALL new or revised values in Arabic (العربية)."
+    else:
+        lang_instruction = "Write ALL new or revised values in English."
+    
+    system_msg = f"""You are an expert medical AI assistant keeping a structured consultation report up to date.
+The consultation is still in progress. You receive the CURRENT REPORT as JSON and a NEW TRANSCRIPT SEGMENT recorded after it.
+
+{lang_instruction}
+
+Output ONLY valid JSON of the form {{"patient_profile_updates": {{...}}}} where the inner object contains
+ONLY the report keys that the new segment adds to or changes, using exactly the key names and nesting of the CURRENT REPORT
+(or of the standard report keys if the section is not in it yet).
+
+RULES:
+1. For lists (medications, workup, safety checks, questions...) return ONLY the NEW items.
+2. To change a known medication, return it again with the same name and the revised fields.
+3. For text fields (history_of_present_illness, reasoning, follow_up, patient_report...) return the FULL revised text.
+4. Capture EXACT values (BP readings, weight, doses).
+5. If the new segment adds nothing, return {{"patient_profile_updates": {{}}}}.
+"""
+    return [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": f"CURRENT REPORT:\n{_compact_report(report)}\n\nNEW TRANSCRIPT SEGMENT:\n\n{delta}"},
+    ]
+
+
+def update_report(report: dict, transcript: str, cursor: int, report_language: str = "english"):
+    """
+    Bring an existing report up to date with transcript text appended after `cursor`.
+    
+    Only the new segment and a compact copy of the report are sent. Returns
+    (report, new_cursor); the model's raw changes are kept in
+    report["patient_profile_updates"]. Falls back to a full generate_report
+    when there is no usable previous report or the update cannot be parsed.
+    """
+    if not _has_content(report) or cursor <= 0 or cursor > len(transcript):
+        return generate_report(transcript, report_language), len(transcript)
+    
+    delta = transcript[cursor:].strip()
+    if not delta:
+        return report, cursor
+    
+    if get_backend() is None:
+        return report, cursor
+    
+    try:
+        raw = get_backend().chat(
+            _build_update_messages(report, delta, report_language),
+            model=MODEL_NAME,
+            temperature=0.2,
+        ).text
+        data = _parse_report_json(raw)
+    except Exception:
+        data = None
+    
+    if data is None:
+        return generate_report(transcript, report_language), len(transcript)
+    
+    updates = data.get("patient_profile_updates", data) if isinstance(data, dict) else None
+    if not isinstance(updates, dict):
+        # Valid JSON but not the object asked for: keep the report; the next update retries this segment
+        return report, cursor
+    merged = merge_report_updates(json.loads(json.dumps(report)), updates)
+    merged["patient_profile_updates"] = updates
+    return _apply_stock_status(merged), len(transcript)
 
 
 def _empty_report(error_msg: str) -> dict:
-    """Return empty report structure"""
+    """Return empty report structure; "error" marks it as a failure, chief_complaint shows the message"""
+    telemetry.count("mednote_report_errors_total")
     return {
+        "error": error_msg,
         "conversation_overview": {},
         "patient_name": "Not documented",
         "demographics": {},
@@ -0,0 +1,327 @@
+"""
+Per-stage tracing and metrics for transcription, report generation and exports.
+
+`span(stage)` times one stage of the pipeline (upload, transcribe, chat,
+parse, stock_check, pdf_render, ...). Spans nest within a thread, so every
+span of one job shares a trace id. Token usage, audio size and duration,
+parse fallbacks and API errors are counted alongside.
+
+Everything is recorded in memory, which costs a few microseconds per span,
+so it stays on in production. Output is opt-in through the environment:
+    MEDNOTE_TELEMETRY_LOG   "-" for stderr, or a file path: one JSON line per span
+    MEDNOTE_METRICS_PORT    serve Prometheus text metrics on http://0.0.0.0:PORT/metrics
+    MEDNOTE_METRICS_FILE    rewrite this file with the same text every 15 seconds
+                            (for node_exporter's textfile collector)
+"""
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+METRIC_HELP = {
+    "mednote_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage"),
+    "mednote_stage_errors_total": ("counter", "Stages that ended with an exception"),
+    "mednote_tokens_total": ("counter", "Model tokens reported by the API, by model and type"),
+    "mednote_audio_bytes_total": ("counter", "Audio bytes sent for transcription"),
+    "mednote_audio_seconds_total": ("counter", "Audio duration transcribed"),
+    "mednote_preprocess_bytes_total": ("counter", "Audio bytes into and out of preprocessing"),
+    "mednote_parse_fallbacks_total": ("counter", "Model outputs that needed the {...} extraction fallback"),
+    "mednote_parse_failures_total": ("counter", "Model outputs that could not be parsed as JSON"),
+    "mednote_report_errors_total": ("counter", "Reports returned with an error instead of content"),
+    "mednote_api_retries_total": ("counter", "Model API calls retried, by operation"),
+    "mednote_api_errors_total": ("counter", "Failed model API attempts, by operation and error"),
+    "mednote_state_errors_total": ("counter", "Shared session state reads and writes that failed"),
+}
+
+logger = logging.getLogger("mednote.telemetry")
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by metric name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """{"counters": {...}, "stages": {stage: {"count", "seconds"}}} for display and tests"""
+        with self._lock:
+            counters = {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in self._counters.items()
+            }
+            stages = {
+                dict(labels).get("stage", name): {"count": h.count, "seconds": round(h.sum, 6)}
+                for (name, labels), h in self._histograms.items()
+                if name == "mednote_stage_duration_seconds"
+            }
+        return {"counters": counters, "stages": stages}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = METRIC_HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {_sample(value)}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _sample(value) -> str:
+    """Exact sample value: integers as written, floats round-trip (":g" cut counters to 6 digits)"""
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+registry = MetricsRegistry()
+# (trace id, span id, attrs) of the innermost open span in this thread/task
+_current = contextvars.ContextVar("mednote_span", default=None)
+
+
+def _new_id() -> str:
+    return f"{random.getrandbits(32):08x}"
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time one pipeline stage. Yields the span's attribute dict; anything
+    added to it (or via annotate()) is written to the span's log line.
+    """
+    parent = _current.get()
+    span_id = _new_id()
+    token = _current.set((parent[0] if parent else span_id, span_id, attrs))
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        record_span(stage, time.perf_counter() - started, error=error, span_id=span_id, **attrs)
+
+
+def record_span(stage: str, seconds: float, error: str = None, span_id: str = None, **attrs):
+    """
+    Record a stage timed by the caller, as a child of the current span.
+    For work that can't sit inside a `with` block, such as a generator
+    that yields streamed output.
+    """
+    registry.observe("mednote_stage_duration_seconds", seconds, stage=stage)
+    if error:
+        registry.inc("mednote_stage_errors_total", stage=stage, error=error)
+    if logger.isEnabledFor(logging.INFO):
+        parent = _current.get()
+        span_id = span_id or _new_id()
+        record = {
+            "ts": round(time.time(), 3),
+            "event": "span",
+            "trace": parent[0] if parent else span_id,
+            "span": span_id,
+            "parent": parent[1] if parent else None,
+            "stage": stage,
+            "ms": round(seconds * 1000, 3),
+            "status": "error" if error else "ok",
+            **({"error": error} if error else {}),
+            **attrs,
+        }
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def timed(stage: str):
+    """Decorator: run the whole function inside span(stage)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_trace(fn):
+    """
+    Wrap fn to run in a copy of the caller's context, so spans it opens on
+    a worker thread (ThreadPoolExecutor.submit) join the caller's trace
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def annotate(**attrs):
+    """Attach attributes to the innermost open span, if any"""
+    current = _current.get()
+    if current is not None:
+        current[2].update(attrs)
+
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    """Token usage as reported by the API response"""
+    if prompt_tokens:
+        registry.inc("mednote_tokens_total", prompt_tokens, model=model, type="prompt")
+    if completion_tokens:
+        registry.inc("mednote_tokens_total", completion_tokens, model=model, type="completion")
+
+
+def record_audio(size_bytes: int = None, seconds: float = None):
+    if size_bytes:
+        registry.inc("mednote_audio_bytes_total", size_bytes)
+    if seconds:
+        registry.inc("mednote_audio_seconds_total", seconds)
+
+
+def count(name: str, amount: float = 1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+# =========================
+#   EXPORTERS
+# =========================
+def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """Serve /metrics from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mednote-metrics", daemon=True).start()
+    return server
+
+
+def write_metrics_file(path: str):
+    """Atomically replace `path` with the current metrics"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render_prometheus())
+    os.replace(tmp, path)
+
+
+def _write_metrics_periodically(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError:
+            logger.warning("could not write metrics file %s", path)
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def init_telemetry():
+    """Start the exporters configured in the environment; safe to call on every script run"""
+    global _started
+    if _started:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+        log_target = os.getenv("MEDNOTE_TELEMETRY_LOG")
+        if log_target:
+            handler = logging.StreamHandler(sys.stderr) if log_target == "-" else logging.FileHandler(log_target)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+        port = os.getenv("MEDNOTE_METRICS_PORT")
+        if port:
+            try:
+                start_metrics_server(int(port))
+            except OSError as e:
+                logger.warning("metrics server not started on port %s: %s", port, e)
+
+        path = os.getenv("MEDNOTE_METRICS_FILE")
+        if path:
+            threading.Thread(
+                target=_write_metrics_periodically, args=(path, 15.0), name="mednote-metrics-file", daemon=True
+            ).start()
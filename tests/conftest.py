@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+# Caches, the consultation store and file-backed state go to a scratch directory
+os.environ.setdefault("MEDNOTE_CACHE_DIR", tempfile.mkdtemp(prefix="mednote-tests-"))
+
+import pytest
+
+from backends import ChatResult, LLMBackend, set_backend
+
+
+class ScriptedBackend(LLMBackend):
+    """Answers every chat with reply(messages) and keeps the messages it was sent"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    def chat(self, messages, model, temperature=0.2):
+        self.requests.append(messages)
+        return ChatResult(self.reply(messages))
+
+    def chat_stream(self, messages, model, temperature=0.2):
+        yield self.chat(messages, model, temperature).text
+
+    def transcribe(self, file, model="whisper-1", language="ar"):
+        return "Doctor: What brings you in today?"
+
+
+@pytest.fixture
+def scripted_backend():
+    """Install a ScriptedBackend for the test: scripted_backend(lambda messages: '{...}')"""
+    def install(reply):
+        backend = ScriptedBackend(reply)
+        set_backend(backend)
+        return backend
+    yield install
+    set_backend(None)
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+import uuid
+
+from streamlit.testing.v1 import AppTest
+
+import jobs
+from conftest import REPO
+from state_backend import get_state_backend
+
+
+APP = os.path.join(REPO, "app.py")
+
+
+def test_jobs_unknown_to_a_fresh_job_manager_are_reported(monkeypatch):
+    # The session comes back on a replica (or restarted worker) that never ran its jobs
+    monkeypatch.setattr(jobs, "_manager", jobs.JobManager(path=":memory:"))
+    consultation_id = uuid.uuid4().hex
+    get_state_backend().set(consultation_id, {
+        "id": consultation_id,
+        "doctor": "Dr. Nayef",
+        "transcript": "Doctor: What brings you in today?",
+        "report": None,
+        "language": "english",
+        "state": {
+            "transcription_jobs": ["a1b2c3d4e5f6"],
+            "transcribed": 0,
+            "report_job": "9a8b7c6d5e4f",
+            "report_applied": None,
+        },
+    })
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.query_params["c"] = consultation_id
+    at.run()
+
+    assert not at.exception
+    assert at.session_state.full_transcript == "Doctor: What brings you in today?"
+    assert at.session_state.transcribed == 1
+    assert at.session_state.report_applied == "9a8b7c6d5e4f"
+    assert "lost" in at.session_state.job_errors["transcribe"]
+    assert "lost" in at.session_state.job_errors["report"]
+    shown = [error.value for error in at.error]
+    assert any("record it again" in message for message in shown)
+    assert any("generate it again" in message for message in shown)
+    # The lost jobs are settled in the shared state, so the next replica doesn't report them again
+    assert get_state_backend().get(consultation_id)["state"]["transcribed"] == 1
+
+
+def test_partial_transcript_of_a_running_job_is_shown(monkeypatch):
+    manager = jobs.JobManager(path=":memory:", max_workers=1)
+    monkeypatch.setattr(jobs, "_manager", manager)
+    release = threading.Event()
+
+    def long_transcription(ctx):
+        ctx.stage("transcribe")
+        ctx.partial("transcript", "Doctor: What brings you in today?")
+        release.wait(10)
+        return {"transcript": "Doctor: What brings you in today? Patient: Headaches."}
+
+    job_id = manager.submit("transcribe", "Dr. Nayef", jobs.TRANSCRIPTION_STAGES, long_transcription)
+    while not manager.get(job_id)["partial"]:
+        time.sleep(0.01)
+    consultation_id = uuid.uuid4().hex
+    get_state_backend().set(consultation_id, {
+        "id": consultation_id, "doctor": "Dr. Nayef", "transcript": "", "report": None, "language": "english",
+        "state": {"transcription_jobs": [job_id], "transcribed": 0},
+    })
+
+    try:
+        at = AppTest.from_file(APP, default_timeout=60)
+        at.query_params["c"] = consultation_id
+        at.run()
+        assert "Doctor: What brings you in today?" in [text.value for text in at.text]
+        assert at.session_state.transcribed == 0
+    finally:
+        release.set()
@@ -0,0 +1,33 @@
+import os
+import uuid
+
+from streamlit.testing.v1 import AppTest
+
+import summarizer
+from conftest import REPO
+from state_backend import get_state_backend
+
+
+APP = os.path.join(REPO, "app.py")
+
+
+def test_transcript_extraction_runs_once_per_transcript(monkeypatch):
+    calls = []
+    extract = summarizer.pre_extract_transcript
+    monkeypatch.setattr(summarizer, "pre_extract_transcript", lambda transcript: calls.append(transcript) or extract(transcript))
+    consultation_id = uuid.uuid4().hex
+    get_state_backend().set(consultation_id, {
+        "id": consultation_id, "doctor": "Dr. Nayef", "transcript": "Patient: my BP was 140/90.", "report": None,
+        "language": "english", "state": {},
+    })
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.query_params["c"] = consultation_id
+    at.run()
+    at.run()
+    assert calls == ["Patient: my BP was 140/90."]
+    assert "**BP:** 140/90 mmHg" in [markdown.value for markdown in at.markdown]
+
+    at.session_state.full_transcript += "\n\nPatient: pulse 88."
+    at.run()
+    assert len(calls) == 2
@@ -0,0 +1,25 @@
+import asyncio
+import json
+
+from batch_reports import generate_reports_batch
+
+
+def reply(messages):
+    transcript = messages[-1]["content"]
+    if "list reply" in transcript:
+        return '[{"chief_complaint": "Cough"}]'
+    if "string plan" in transcript:
+        return json.dumps({"chief_complaint": "Cough", "medication_plan": "amoxicillin 500 mg"})
+    return json.dumps({"chief_complaint": "Fatigue", "medication_plan": [{"name": "metformin", "dose": "500 mg"}]})
+
+
+def test_non_object_reply_fails_only_its_own_item(scripted_backend):
+    scripted_backend(reply)
+    transcripts = ["Doctor: first patient", "Doctor: list reply", "Doctor: string plan", "Doctor: last patient"]
+    reports = asyncio.run(generate_reports_batch(transcripts, use_cache=False, compact=False))
+
+    assert [report["chief_complaint"] for report in reports[::3]] == ["Fatigue", "Fatigue"]
+    assert reports[0]["medication_plan"][0]["stock_status"]["in_stock"] is True
+    for failed in reports[1:3]:
+        assert failed["chief_complaint"].startswith("Error generating report")
+        assert failed["medication_plan"] == []
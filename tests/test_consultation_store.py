@@ -0,0 +1,14 @@
+from consultation_store import ConsultationStore
+from summarizer import _empty_report
+
+
+def test_error_report_is_not_indexed_as_a_consultation(tmp_path):
+    store = ConsultationStore(str(tmp_path / "consultations.sqlite3"))
+    store.save("c1", "Dr. Nayef", "Doctor: How are you feeling?", _empty_report("Error generating report: timeout"))
+    store.flush()
+
+    saved = store.get("c1")
+    assert saved["patient_name"] == ""
+    assert saved["report"]["error"] == "Error generating report: timeout"
+    assert store.search("generating") == []
+    assert [row["id"] for row in store.search("feeling")] == ["c1"]
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+
+import jobs
+from state_backend import SQLiteStateBackend
+
+
+def wait(manager, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] not in jobs.ACTIVE:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_report_job_stages_are_the_work_done(scripted_backend):
+    scripted_backend(lambda messages: json.dumps({"chief_complaint": "Fatigue", "medication_plan": [{"name": "metformin"}]}))
+    manager = jobs.JobManager(path=":memory:", max_workers=1)
+    job = wait(manager, manager.submit(
+        "report", "Dr. Nayef", jobs.REPORT_STAGES, jobs._generate, "Doctor: tired lately?", "english", "parallel", None, 0,
+    ))
+
+    assert job["status"] == "done"
+    assert list(job["stages"]) == ["queued", "extract"]
+    assert all(stage["status"] == "done" for stage in job["stages"].values())
+    # The new report's stock was checked while it was normalized
+    assert job["result"]["report"]["medication_plan"][0]["stock_status"]["in_stock"] is True
+
+
+def test_transcription_job_uploads_within_transcribe(scripted_backend):
+    scripted_backend(lambda messages: "{}")
+    manager = jobs.JobManager(path=":memory:", max_workers=1)
+    job = wait(manager, manager.submit(
+        "transcribe", "Dr. Nayef", jobs.TRANSCRIPTION_STAGES, jobs._transcribe, b"\0" * 64, "segment.webm", "ar",
+    ))
+
+    assert job["status"] == "done"
+    assert list(job["stages"]) == ["queued", "preprocess", "transcribe"]
+    assert job["result"]["transcript"] == "Doctor: What brings you in today?"
+
+
+def test_restarting_replica_leaves_live_replicas_jobs_alone(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = jobs.JobManager(path=path, max_workers=1)
+    release = threading.Event()
+
+    def slow(ctx):
+        ctx.stage("extract")
+        release.wait(10)
+        return {}
+
+    job_id = first.submit("report", "Dr. Nayef", jobs.REPORT_STAGES, slow)
+    try:
+        # Another replica on the same cache dir (re)starts while the job runs
+        second = jobs.JobManager(path=path, max_workers=1)
+        assert second.get(job_id)["status"] in jobs.ACTIVE
+
+        # The first replica stops heartbeating: its job can never finish
+        second._db.execute("UPDATE instances SET heartbeat_at = 0 WHERE id = ?", (first.instance_id,))
+        second._db.commit()
+        orphaned = second.get(job_id)
+        assert orphaned["status"] == "failed"
+        assert "restart" in orphaned["error"]
+        assert jobs.JobManager(path=path).get(job_id)["status"] == "failed"
+    finally:
+        release.set()
+
+
+def test_job_on_another_host_is_polled_through_shared_state(tmp_path):
+    shared = SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+    # Separate job databases: replicas on two hosts, sharing only the state backend
+    running_on = jobs.JobManager(path=":memory:", max_workers=1, shared=shared)
+    polled_from = jobs.JobManager(path=":memory:", max_workers=1, shared=shared)
+    step, release = threading.Event(), threading.Event()
+
+    def long_transcription(ctx):
+        ctx.stage("transcribe")
+        ctx.partial("transcript", "Doctor: hello")
+        ctx.progress(1, 2, "1/2 segments")
+        step.set()
+        release.wait(10)
+        return {"transcript": "Doctor: hello. Patient: hi."}
+
+    job_id = running_on.submit("transcribe", "Dr. Nayef", jobs.TRANSCRIPTION_STAGES, long_transcription)
+    assert step.wait(10)
+    job = polled_from.get(job_id)
+    assert job["status"] == "running"
+    assert job["stages"]["transcribe"]["done"] == 1
+    assert job["partial"] == {"transcript": "Doctor: hello"}
+
+    release.set()
+    job = wait(polled_from, job_id)
+    assert job["status"] == "done"
+    assert job["result"]["transcript"] == "Doctor: hello. Patient: hi."
+
+
+def test_job_of_a_stopped_host_is_failed(tmp_path):
+    shared = SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+    polled_from = jobs.JobManager(path=":memory:", shared=shared)
+    job = {
+        "id": "a1b2c3d4e5f6", "kind": "report", "owner": "Dr. Nayef", "instance": "0123456789ab",
+        "status": "running", "error": None, "created_at": time.time(), "updated_at": time.time(),
+    }
+    shared.set(jobs.JOB_KEY + job["id"], job)
+    shared.set(jobs.INSTANCE_KEY + job["instance"], {"heartbeat_at": time.time() - 2 * jobs.STALE_SECONDS})
+
+    assert polled_from.get(job["id"])["status"] == "failed"
+
+
+
+def test_cached_report_progress_stays_within_bounds(scripted_backend, monkeypatch):
+    scripted_backend(lambda messages: json.dumps({"chief_complaint": "Fatigue"}))
+    fractions = []
+    monkeypatch.setattr(jobs.JobContext, "progress", lambda self, done, total, detail="": fractions.append(done / total))
+    manager = jobs.JobManager(path=":memory:", max_workers=1)
+    transcript = "Doctor: tired lately? Patient: yes, for two weeks."
+    # The second run is a cache hit, which streams every key of the stored report
+    for _ in range(2):
+        job_id = manager.submit(
+            "report", "Dr. Nayef", jobs.REPORT_STAGES, jobs._generate, transcript, "english", "stream", None, 0,
+        )
+        assert wait(manager, job_id)["status"] == "done"
+    assert max(fractions) == 1.0
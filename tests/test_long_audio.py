@@ -0,0 +1,34 @@
+import io
+import wave
+
+from long_audio import SEGMENT_MAX_BYTES, split_audio
+
+WHISPER_LIMIT_BYTES = 25 * 1024 * 1024
+
+
+def wav(seconds: float, sample_rate: int = 44100, channels: int = 2) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(b"\0" * int(seconds * sample_rate) * channels * 2)
+    return buffer.getvalue()
+
+
+def test_browser_wav_segments_fit_the_upload_limit():
+    # 7 minutes of 44.1 kHz stereo: a 300 s segment of this would be ~53 MB
+    segments = split_audio(wav(420), "consultation.wav")
+    assert len(segments) > 2
+    assert all(len(segment) <= SEGMENT_MAX_BYTES < WHISPER_LIMIT_BYTES for segment in segments)
+    with wave.open(io.BytesIO(segments[0]), "rb") as first:
+        assert (first.getframerate(), first.getnchannels()) == (44100, 2)
+
+
+def test_small_format_keeps_time_based_segments():
+    segments = split_audio(wav(620, sample_rate=16000, channels=1), "consultation.wav")
+    durations = []
+    for segment in segments:
+        with wave.open(io.BytesIO(segment), "rb") as part:
+            durations.append(part.getnframes() / part.getframerate())
+    assert durations[:2] == [300, 300]
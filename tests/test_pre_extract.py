@@ -0,0 +1,43 @@
+from pre_extract import extract_measurements, pre_extract, prefilled_fields
+
+
+def demographics(transcript: str) -> dict:
+    return extract_measurements(transcript).get("demographics", {})
+
+
+def test_reads_patient_measurements():
+    found = extract_measurements("BP 140/90, pulse 88. I'm 45 years old and weigh 79 kg, height 182 cm.")
+    assert found["vital_signs"] == {"blood_pressure": ["140/90 mmHg"], "heart_rate": ["88 bpm"]}
+    assert found["demographics"] == {"weight": ["79 kg"], "height": ["182 cm"], "age": ["45 years"]}
+
+
+def test_reads_arabic_digits():
+    assert demographics("عمري ٤٥ سنة ووزني ٧٩ كيلو") == {"weight": ["79 kg"], "age": ["45 years"]}
+
+
+def test_weight_change_is_not_a_weight():
+    assert demographics("He lost 5 kg over the summer and now weighs 79 kg.") == {"weight": ["79 kg"]}
+    assert demographics("I've gained about 3 kilos, I'm 82 kg now") == {"weight": ["82 kg"]}
+    assert demographics("She is 4 kg heavier than last year") == {}
+    assert demographics("وزني ٧٩ كيلو وخسرت ٥ كيلو") == {"weight": ["79 kg"]}
+
+
+def test_relative_age_is_not_the_patient_age():
+    assert demographics("My father died aged 62.") == {}
+    assert demographics("My mother is 70 years old.") == {}
+    assert demographics("I'm 52 years old. My father died aged 62.") == {"age": ["52 years"]}
+    assert demographics("عمري ٤٥ سنة وأبي عمره ٧٠") == {"age": ["45 years"]}
+
+
+def test_relative_weight_is_not_the_patient_weight():
+    assert demographics("My son weighs 30 kg.") == {}
+
+
+def test_prefills_only_single_readings():
+    extraction = pre_extract("BP was 140/90, then 150/95 on the second reading. Weight 79 kg.")
+    assert prefilled_fields(extraction) == {"demographics": {"weight": "79 kg"}}
+
+
+def test_no_prefill_for_negative_cases():
+    extraction = pre_extract("He lost 5 kg. My father died aged 62 and my mother is 70 years old.")
+    assert prefilled_fields(extraction) == {}
@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+import summarizer
+
+
+def test_measurement_hints_are_not_forced_into_the_report(scripted_backend):
+    backend = scripted_backend(lambda messages: json.dumps({"chief_complaint": "Fatigue", "demographics": {"weight": "79 kg"}}))
+    report = summarizer.generate_report("Patient weighs 79 kg and is tired.", use_cache=False, compact=False)
+
+    prompt = backend.requests[0][-1]["content"]
+    assert "MEASUREMENT HINTS" in prompt and '"79 kg"' in prompt
+    assert "Leave these fields out" not in prompt
+    assert report["demographics"]["weight"] == "79 kg"
+    assert report["demographics"]["age"] == ""
+
+
+def test_model_output_wins_over_hints(scripted_backend):
+    scripted_backend(lambda messages: json.dumps({"chief_complaint": "Check-up", "demographics": {}}))
+    report = summarizer.generate_report("Weight 79 kg.", use_cache=False, compact=False)
+    assert report["demographics"]["weight"] == ""
+
+
+def test_error_reports_skip_the_stock_check(monkeypatch):
+    report = summarizer._empty_report("Error generating report: timeout")
+    assert summarizer.is_error_report(report)
+    assert not summarizer._has_content(report)
+
+    def stock_check(report):
+        raise AssertionError("stock checked for an error report")
+
+    monkeypatch.setattr(summarizer, "_apply_stock_status", stock_check)
+    assert summarizer.refresh_stock_status(report) is report
+
+
+def test_compact_schema_does_not_ask_for_placeholders():
+    schema = summarizer._build_schema(compact=True)
+    for placeholder in ("Not documented", "None mentioned", "true/false or details", "No physical examination"):
+        assert placeholder not in schema
+    assert "Not documented" in summarizer._build_schema(compact=False)
+
+
+def test_verbose_output_is_the_default(scripted_backend):
+    if os.getenv("MEDNOTE_OUTPUT_MODE"):
+        pytest.skip("MEDNOTE_OUTPUT_MODE is set")
+    assert summarizer.COMPACT_OUTPUT is False
+    backend = scripted_backend(lambda messages: json.dumps({"chief_complaint": "Fatigue"}))
+    summarizer.generate_report("Doctor: tired lately?", use_cache=False)
+    assert '"past_medical_history": {' in backend.requests[0][0]["content"]
+
+
+def _previous_report():
+    return summarizer._normalize_report({
+        "chief_complaint": "Fatigue",
+        "history_of_present_illness": "Tired for two weeks.",
+        "current_medications": [{"name": "metformin", "dose": "500 mg"}],
+        "recommended_workup": ["HbA1c"],
+    })
+
+
+def test_update_with_non_object_reply_keeps_the_report(scripted_backend):
+    report = _previous_report()
+    transcript = "Doctor: tired lately?\n\nPatient: also thirsty."
+    for reply in ('["thirst"]', '"no changes"', '{"patient_profile_updates": ["thirst"]}'):
+        scripted_backend(lambda messages: reply)
+        updated, cursor = summarizer.update_report(report, transcript, len("Doctor: tired lately?"))
+        assert updated is report
+        assert cursor == len("Doctor: tired lately?")
+
+
+def test_merge_ignores_updates_of_the_wrong_shape():
+    report = _previous_report()
+    summarizer.merge_report_updates(report, {
+        "current_medications": "metformin 1000 mg",
+        "recommended_workup": ["Fasting glucose", {"test": "lipids"}],
+        "chief_complaint": ["Fatigue", "thirst"],
+        "history_of_present_illness": "Tired for two weeks, now thirsty.",
+    })
+    assert report["current_medications"] == [{"name": "metformin", "dose": "500 mg"}]
+    assert report["recommended_workup"] == ["HbA1c", "Fasting glucose"]
+    assert report["chief_complaint"] == "Fatigue"
+    assert report["history_of_present_illness"] == "Tired for two weeks, now thirsty."
+
+
+def test_map_reduce_without_any_parsed_part_skips_the_reduce_call(scripted_backend):
+    backend = scripted_backend(lambda messages: "Sorry, I can't help with that.")
+    transcript = "\n\n".join(f"Doctor: question {i}?\nPatient: answer {i}." for i in range(40))
+    report = summarizer.generate_report_map_reduce(transcript, chunk_tokens=100, use_cache=False, compact=False)
+
+    assert summarizer.is_error_report(report)
+    assert "Failed to parse" in report["error"]
+    assert len(backend.requests) > 1
+    assert all("FACTS EXTRACTED" not in messages[-1]["content"] for messages in backend.requests)
+
+
+def test_overlapping_partials_keep_each_fact_once():
+    merged = {}
+    for partial in (
+        {"demographics": {"age": "45"}, "chief_complaint": "Headache for 3 days."},
+        {"demographics": {"age": "45 years"}, "chief_complaint": "headache for 3 days"},
+        {"demographics": {"age": "45"}, "chief_complaint": "Blurred vision since yesterday."},
+    ):
+        summarizer._combine_partials(merged, partial)
+
+    assert merged["demographics"]["age"] == "45 years"
+    assert merged["chief_complaint"] == "Headache for 3 days. Blurred vision since yesterday."
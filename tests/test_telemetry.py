@@ -0,0 +1,12 @@
+from telemetry import MetricsRegistry
+
+
+def test_large_counters_are_exported_exactly():
+    registry = MetricsRegistry()
+    registry.inc("mednote_audio_bytes_total", 12_345_681)
+    registry.inc("mednote_audio_seconds_total", 1_234_567.25)
+    registry.inc("mednote_audio_seconds_total", 0.5)
+
+    lines = registry.render_prometheus().splitlines()
+    assert "mednote_audio_bytes_total 12345681" in lines
+    assert "mednote_audio_seconds_total 1234567.75" in lines
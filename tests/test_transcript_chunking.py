@@ -0,0 +1,26 @@
+import importlib
+import sys
+
+import transcript_chunking
+
+
+def test_encoding_is_not_loaded_at_import(monkeypatch):
+    loads = []
+
+    class FakeTiktoken:
+        @staticmethod
+        def get_encoding(name):
+            loads.append(name)
+            raise OSError("offline")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", FakeTiktoken)
+    module = importlib.reload(transcript_chunking)
+    try:
+        assert loads == []
+        assert module.estimate_tokens("Doctor: hello there") == len("Doctor: hello there") // 3 + 1
+        module.estimate_tokens("Patient: hi")
+        # Loaded once on the first count, then cached (here: the failure, so no retry per call)
+        assert loads == ["o200k_base"]
+    finally:
+        monkeypatch.undo()
+        importlib.reload(transcript_chunking)
@@ -0,0 +1,33 @@
+import time
+from email.utils import formatdate
+
+from transport import backoff_delay, retry_after
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _Error(Exception):
+    def __init__(self, retry_after_value):
+        super().__init__("429 Too Many Requests")
+        self.response = _Response({"retry-after": retry_after_value})
+
+
+def test_retry_after_seconds_and_http_date():
+    assert retry_after(_Error("7")) == 7.0
+    in_ten = formatdate(time.time() + 10, usegmt=True)
+    assert 8 <= retry_after(_Error(in_ten)) <= 10
+
+
+def test_naive_http_date_is_utc():
+    # "-0000" parses to a naive datetime; it must not be read as local time
+    in_ten = formatdate(time.time() + 10).rsplit(" ", 1)[0] + " -0000"
+    assert 8 <= retry_after(_Error(in_ten)) <= 10
+
+
+def test_malformed_retry_after_falls_back_to_backoff():
+    error = _Error("soon, maybe")
+    assert retry_after(error) is None
+    assert 0 <= backoff_delay(2, 1.0, 60.0, error) <= 4.0
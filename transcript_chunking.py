@@ -0,0 +1,79 @@
+"""
+Token budgeting and chunking for long consultation transcripts.
+
+Token counts use tiktoken when it is installed and a character-based estimate
+otherwise. The encoding is loaded on the first count, not at import: on a
+cold machine tiktoken downloads its BPE file, which should not hold up app
+startup (or hang it until the network times out when offline). Transcripts are split on paragraph breaks first, then on speaker
+turns / lines, and only as a last resort inside a line, so every chunk holds
+whole exchanges between doctor and patient wherever possible.
+"""
+import functools
+import os
+import re
+
+
+# gpt-4o-mini has a 128k context; leave room for the system prompt and the report itself
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("MEDNOTE_TRANSCRIPT_TOKEN_BUDGET", "90000"))
+CHUNK_TOKENS = int(os.getenv("MEDNOTE_CHUNK_TOKENS", "8000"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟۔])\s+")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """tiktoken's o200k_base encoding, or None when tiktoken is missing or can't load it"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count for `text` (exact with tiktoken, estimated without)"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # ~4 chars/token for English, denser for Arabic; err on the high side
+    return len(text) // 3 + 1
+
+
+def _pieces(text: str, max_tokens: int) -> list:
+    """Break text into units no larger than max_tokens, coarsest boundary first"""
+    for pattern in (r"\n\s*\n", r"\n", None):
+        parts = re.split(pattern, text) if pattern else _SENTENCE_END.split(text)
+        if all(estimate_tokens(part) <= max_tokens for part in parts):
+            return [part for part in parts if part.strip()]
+
+    # A single sentence larger than a chunk: cut on words
+    words = text.split()
+    step = max(1, len(words) * max_tokens // max(estimate_tokens(text), 1))
+    return [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+
+
+def split_transcript(text: str, max_tokens: int = CHUNK_TOKENS) -> list:
+    """Greedily pack whole paragraphs/turns into chunks of at most max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for part in text.split("\n\n"):
+        units = [part] if estimate_tokens(part) <= max_tokens else _pieces(part, max_tokens)
+        for unit in units:
+            unit_tokens = estimate_tokens(unit)
+            if current and current_tokens + unit_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+        # Paragraph breaks are preferred cut points
+        if current:
+            current[-1] += "\n"
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
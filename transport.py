@@ -0,0 +1,297 @@
+"""
+HTTP transport policy for model API calls.
+
+One pooled keep-alive HTTP client per backend, per-operation timeouts (a
+transcription upload may take minutes, a chat completion should not),
+jittered exponential backoff on 429/5xx/connection errors that honours
+Retry-After, and a circuit breaker that fails fast while the upstream is
+down instead of making every request wait out its timeout.
+
+Tunable from the environment:
+    MEDNOTE_HTTP_MAX_CONNECTIONS / MEDNOTE_HTTP_MAX_KEEPALIVE   pool size (20 / 10)
+    MEDNOTE_TIMEOUT_CHAT / _CHAT_STREAM / _TRANSCRIBE           read timeouts in seconds
+    MEDNOTE_HTTP_MAX_RETRIES                                    retries per call (3)
+    MEDNOTE_BREAKER_FAILURES / MEDNOTE_BREAKER_RESET            breaker threshold and cool-down
+"""
+import email.utils
+import os
+import random
+import sys
+import threading
+import time
+from datetime import timezone
+
+import telemetry
+
+
+CONNECT_TIMEOUT = 5.0
+OPERATION_TIMEOUTS = {
+    "chat": float(os.getenv("MEDNOTE_TIMEOUT_CHAT", 90)),
+    # Longest gap between streamed chunks
+    "chat_stream": float(os.getenv("MEDNOTE_TIMEOUT_CHAT_STREAM", 30)),
+    "transcribe": float(os.getenv("MEDNOTE_TIMEOUT_TRANSCRIBE", 600)),
+}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors and dropped connections are worth another try"""
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception):
+    """Seconds the server asked us to wait, from Retry-After (seconds or HTTP date), or None"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Malformed date: fall back to our own backoff rather than hide the API error
+        return None
+    if parsed.tzinfo is None:
+        # "-0000" dates parse naive; HTTP dates are always GMT
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float, error: Exception = None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one"""
+    requested = retry_after(error) if error is not None else None
+    if requested is not None:
+        return min(requested, max_delay)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets one trial call through (half-open):
+    success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class TransportMetrics:
+    """Thread-safe counters for requests, retries, failures and pool usage"""
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._operations = {}
+
+    def _op(self, operation: str) -> dict:
+        return self._operations.setdefault(operation, {
+            "requests": 0, "retries": 0, "failures": 0, "rejected": 0, "seconds": 0.0,
+        })
+
+    def started(self, operation: str):
+        with self._lock:
+            self._op(operation)["requests"] += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def finished(self, operation: str, elapsed: float, failed: bool):
+        with self._lock:
+            self._in_flight -= 1
+            op = self._op(operation)
+            op["seconds"] += elapsed
+            if failed:
+                op["failures"] += 1
+
+    def count(self, operation: str, field: str):
+        with self._lock:
+            self._op(operation)[field] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            operations = {name: dict(op) for name, op in self._operations.items()}
+            return {
+                "pool_size": self.pool_size,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "pool_utilization": round(self._in_flight / self.pool_size, 3) if self.pool_size else 0.0,
+                "requests": sum(op["requests"] for op in operations.values()),
+                "retries": sum(op["retries"] for op in operations.values()),
+                "failures": sum(op["failures"] for op in operations.values()),
+                "rejected": sum(op["rejected"] for op in operations.values()),
+                "operations": operations,
+            }
+
+
+def _http_module():
+    # The HTTP library the installed openai SDK is built on (httpx, or its
+    # successor in newer SDK releases), so pool and timeout objects match it
+    from openai import DefaultHttpxClient
+
+    return sys.modules[DefaultHttpxClient.__mro__[1].__module__.partition(".")[0]]
+
+
+class Transport:
+    """Retry, timeout and circuit-breaker policy around SDK calls, plus the pooled HTTP clients"""
+
+    def __init__(
+        self,
+        max_connections: int = None,
+        max_keepalive: int = None,
+        max_retries: int = None,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        breaker: CircuitBreaker = None,
+    ):
+        self.max_connections = max_connections or int(os.getenv("MEDNOTE_HTTP_MAX_CONNECTIONS", 20))
+        self.max_keepalive = max_keepalive or int(os.getenv("MEDNOTE_HTTP_MAX_KEEPALIVE", 10))
+        self.max_retries = int(os.getenv("MEDNOTE_HTTP_MAX_RETRIES", 3)) if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("MEDNOTE_BREAKER_FAILURES", 5)),
+            reset_timeout=float(os.getenv("MEDNOTE_BREAKER_RESET", 30)),
+        )
+        self.metrics = TransportMetrics(self.max_connections)
+
+    def _limits(self):
+        return _http_module().Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=30.0,
+        )
+
+    def http_client(self):
+        """Keep-alive pooled client for the sync SDK client"""
+        from openai import DefaultHttpxClient
+
+        return DefaultHttpxClient(limits=self._limits(), timeout=self.timeout("chat"))
+
+    def async_http_client(self):
+        from openai import DefaultAsyncHttpxClient
+
+        return DefaultAsyncHttpxClient(limits=self._limits(), timeout=self.timeout("chat"))
+
+    def timeout(self, operation: str):
+        read = OPERATION_TIMEOUTS[operation]
+        return _http_module().Timeout(read, connect=CONNECT_TIMEOUT)
+
+    def _check_breaker(self, operation: str):
+        if not self.breaker.allow():
+            self.metrics.count(operation, "rejected")
+            telemetry.count("mednote_api_errors_total", operation=operation, error="UpstreamUnavailable")
+            raise UpstreamUnavailable(
+                f"Model API unavailable after repeated failures; try again in about {self.breaker.reset_timeout:g}s"
+            )
+
+    def _record(self, error: Exception):
+        # Client errors (bad request, auth) say nothing about upstream health
+        if error is None:
+            self.breaker.record_success()
+        elif is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def call(self, operation: str, fn, before_retry=None, before_attempt=None):
+        """
+        Run fn() with retries. before_attempt() runs ahead of every attempt
+        (e.g. to wait for a rate limiter), before_retry() ahead of each retry
+        (e.g. to rewind an upload).
+        """
+        attempt = 0
+        while True:
+            self._check_breaker(operation)
+            if before_attempt is not None:
+                before_attempt()
+            if attempt:
+                self.metrics.count(operation, "retries")
+                telemetry.count("mednote_api_retries_total", operation=operation)
+            self.metrics.started(operation)
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                self.metrics.finished(operation, time.perf_counter() - started, failed=True)
+                telemetry.count("mednote_api_errors_total", operation=operation, error=type(e).__name__)
+                self._record(e)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay, e))
+                attempt += 1
+                if before_retry is not None:
+                    before_retry()
+                continue
+            self.metrics.finished(operation, time.perf_counter() - started, failed=False)
+            self._record(None)
+            return result
+
+    async def acall(self, operation: str, coro_fn):
+        """One attempt of an async call under the breaker; async callers own their retries"""
+        self._check_breaker(operation)
+        self.metrics.started(operation)
+        started = time.perf_counter()
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            self.metrics.finished(operation, time.perf_counter() - started, failed=True)
+            telemetry.count("mednote_api_errors_total", operation=operation, error=type(e).__name__)
+            self._record(e)
+            raise
+        self.metrics.finished(operation, time.perf_counter() - started, failed=False)
+        self._record(None)
+        return result